@@ -2,527 +2,786 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
-from flask_moment import Moment
 import logging
-from logging import Formatter, FileHandler
-from flask_wtf import FlaskForm
-from forms import *
-from models import *
-from config import *
-from datetime import datetime
 import sys
+from datetime import date, datetime, timedelta
+from logging import Formatter, FileHandler
 
-#----------------------------------------------------------------------------#
-# Filters
-#----------------------------------------------------------------------------#
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(str(value)) # forcing convert to string before parse to avoid an error
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
-
-app.jinja_env.filters['datetime'] = format_datetime
-
-#----------------------------------------------------------------------------#
-# Controllers
-#----------------------------------------------------------------------------#
+import click
+import dateutil.parser
+from flask import Flask, render_template, request, flash, redirect, url_for, abort, make_response
+from flask_migrate import Migrate
+from flask_moment import Moment
 
-@app.route('/')
-def index():
-  return render_template('pages/home.html')
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, SHOW_DURATION
+from statements import venue_areas, artists_page, refresh_upcoming_counts, search, calendar, month_range, \
+  ARTIST_SORTS
+from unit_of_work import UnitOfWork, release, render, render_json
+from fragments import FragmentCache, invalidate, load_versions
+from datetimes import format_datetime, stored_datetime
+import geo
+import partitions
+import purges
+import recommendations
+import rollups
+from scheduling import book, free_slots, DoubleBooking, AVAILABILITY_MAX_RANGE
+
+moment = Moment()
+migrate = Migrate()
 
 #----------------------------------------------------------------------------#
-# Venues
+# App Factory
+# importing this module has no side effect, the app and its extensions are
+# bound by create_app(): `flask run` and gunicorn 'app:create_app()' call it
 #----------------------------------------------------------------------------#
-@app.route('/venues')
-def venues():
-  # first grouping by city and state of all venues avaliables
-  groups_city_and_state = db.session.query(Venue.city, Venue.state).group_by(Venue.city, Venue.state).order_by(Venue.state).all()
-
-  areas = []
-
-  # looping through all city and states for get individual venues attributes
-  for city, state in groups_city_and_state:
-      venues_filtered = Venue.query.filter_by(city=city,state=state).all()
 
-      venues = []
-
-      for venue in venues_filtered:
-          num_upcoming_shows = venue.artists.filter(Show.start_time > datetime.now()).count()
-
-          venues.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": num_upcoming_shows
-          })
-
-      areas.append({
+def create_app(test_config=None):
+  app = Flask(__name__)
+  app.config.from_object('config')
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+
+  db.init_app(app)
+  UnitOfWork(app)
+  FragmentCache(app)
+  moment.init_app(app)
+  migrate.init_app(app, db)
+  app.jinja_env.filters['datetime'] = format_datetime
+
+  #----------------------------------------------------------------------------#
+  # Controllers
+  #----------------------------------------------------------------------------#
+
+  @app.route('/')
+  def index():
+    return render('pages/home.html')
+
+  #----------------------------------------------------------------------------#
+  # Venues
+  #----------------------------------------------------------------------------#
+  @app.route('/venues')
+  def venues():
+    # venues grouped by city and state with their upcoming shows, the
+    # grouped query is baked (see statements.py)
+    areas = venue_areas(datetime.now())
+    load_versions('venues')
+
+    return render('pages/venues.html', areas=areas)
+
+  @app.route('/venues/search', methods=['GET', 'POST'])
+  def search_venues():
+    search_term = request.values.get('search_term', '')
+    page = max(1, request.args.get('page', 1, type=int))
+
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    # and "San Francisco, CA" the venues of San Francisco, see statements.py
+    venues = search(Venue, search_term, datetime.now(), page)
+
+    results = {
+      "count": venues.total,
+      "data": venues.items,
+      "pages": venues
+    }
+    return render('pages/search_venues.html', results=results, search_term=search_term)
+
+  @app.route('/venues/nearby')
+  def nearby_venues():
+    # nearest first, from the spatial index, see geo.py
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius = request.args.get('radius', app.config['NEARBY_RADIUS'], type=float)
+    if lat is None or lng is None or not -90 <= lat <= 90 or not -180 <= lng <= 180 \
+            or not 0 < radius <= app.config['NEARBY_MAX_RADIUS']:
+        abort(400)
+
+    venues = geo.nearby(lat, lng, radius)
+
+    return render_json({
+      "venues": [{
+        "id": id,
+        "name": name,
         "city": city,
         "state": state,
-        "venues": venues
-      })
-
-  return render_template('pages/venues.html', areas=areas)
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-  search_term = request.form.get('search_term', '')
-
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  # using ilike: https://docs.sqlalchemy.org/en/13/orm/internals.html#sqlalchemy.orm.PropComparator.ilike
-  venues = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-
-  for venue in venues:
-      venue.num_upcoming_shows = venue.artists.filter(Show.start_time > datetime.now()).count()
-
-  results = {
-    "count": len(venues),
-    "data": venues
-  }
-  return render_template('pages/search_venues.html', results=results, search_term=search_term)
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  venue = Venue.query.get(venue_id)
-  if venue == None:
-      abort(404)
-
-  # converting back separating genres with the comma
-  venue.genres = venue.genres.split(",")
-
-  # source: https://stackoverflow.com/questions/17868743/doing-datetime-comparisons-in-filter-sqlalchemy
-  upcoming_shows = db.session.query(
-    Artist.id.label("artist_id"),
-    Artist.name.label("artist_name"),
-    Artist.image_link.label("artist_image_link"),
-    Show.start_time.label("start_time"),
-  ).filter_by(id=venue_id).join(Artist.venues).filter(Show.start_time > datetime.now()).all()
-
-  past_shows = db.session.query(
-    Artist.id.label("artist_id"),
-    Artist.name.label("artist_name"),
-    Artist.image_link.label("artist_image_link"),
-    Show.start_time.label("start_time"),
-  ).filter_by(id=venue_id).join(Artist.venues).filter(Show.start_time < datetime.now()).all()
-
-  venue.upcoming_shows = upcoming_shows
-  venue.past_shows = past_shows
-  venue.upcoming_shows_count = len(venue.upcoming_shows)
-  venue.past_shows_count = len(venue.past_shows)
-
-  return render_template('pages/show_venue.html', venue=venue)
-
-#----------------------------------------------------------------------------#
-# Create Venue
-#----------------------------------------------------------------------------#
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-  form = VenueForm()
-  return render_template('forms/new_venue.html', form=form)
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-  error = False
-  body = {}
-  try:
-      name = request.form.get('name')
-      city = request.form.get('city')
-      state = request.form.get('state')
-      address = request.form.get('address')
-      phone = request.form.get('phone', None)
-      image_link = request.form.get('image_link')
-
-      # using getlist to get all multiple select fields
-      # source https://stackoverflow.com/a/12502681
-      genres = request.form.getlist('genres')
-      facebook_link = request.form.get('facebook_link', None)
-      website = request.form.get('website', None)
-      seeking_talent = bool(request.form.get('seeking_talent', False))
-      seeking_description = request.form.get('seeking_description', None)
-
-      # concatened genres list into string separated with ","
-      genres = ','.join(genres)
-
-      venue = Venue(name=name,city=city,state=state,address=address,phone=phone,
-                   genres=genres,image_link=image_link,facebook_link=facebook_link,
-                   website=website,seeking_talent=seeking_talent,seeking_description=seeking_description)
-      db.session.add(venue)
-      db.session.commit()
-      body['name'] = venue.name
-  except:
-      error=True
-      body['name'] = request.form.get('name')
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-      flash('An error occurred. Venue ' + body['name'] + ' could not be listed.')
-  else:
-      flash('Venue ' + body['name'] + ' was successfully listed!')
-
-  return render_template('pages/home.html')
-
-#----------------------------------------------------------------------------#
-# Delete Venue
-#----------------------------------------------------------------------------#
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-  error = False
-  venue_name = ""
-  try:
-      venue_name = Venue.query.get(venue_id).name
-      Venue.query.filter_by(id=venue_id).delete()
-      db.session.commit()
-  except:
-      error = True
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-    flash('An error occurred. Venue ' + venue_name + ' could not be deleted.')
-  else:
-    flash('Venue ' + venue_name + ' was successfully deleted!')
-
-  return redirect(url_for('index'), code=200)
-
-#----------------------------------------------------------------------------#
-# Edit Venue
-#----------------------------------------------------------------------------#
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-  venue = Venue.query.get(venue_id)
-  if venue == None:
-      abort(404)
-
-  venue.genres = venue.genres.split(',')
-
-  form = VenueForm(obj=venue)
-
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-  error = False
-  try:
-      name = request.form.get('name')
-      city = request.form.get('city')
-      state = request.form.get('state')
-      address = request.form.get('address')
-      phone = request.form.get('phone', None)
-      image_link = request.form.get('image_link')
-      genres = request.form.getlist('genres')
-      facebook_link = request.form.get('facebook_link', None)
-      website = request.form.get('website', None)
-      seeking_talent = bool(request.form.get('seeking_talent', False))
-      seeking_description = request.form.get('seeking_description', None)
-
-      # concatened genres list into string separated with ","
-      genres = ','.join(genres)
-
-      venue = Venue.query.get(venue_id)
-      venue.name = name
-      venue.city = city
-      venue.state = state
-      venue.address = address
-      venue.phone = phone
-      venue.genres = genres
-      venue.image_link = image_link
-      venue.facebook_link = facebook_link
-      venue.website = website
-      venue.seeking_talent = seeking_talent
-      venue.seeking_description = seeking_description
-
-      db.session.commit()
-  except:
-      error=True
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-      flash('An error occurred. Venue could not be updated.')
-  else:
-      flash('Venue was successfully updated!')
-
-  return redirect(url_for('show_venue', venue_id=venue_id))
-
-#----------------------------------------------------------------------------#
-# Artists
-#----------------------------------------------------------------------------#
-@app.route('/artists')
-def artists():
-  artists = Artist.query.order_by(Artist.id).all()
-  return render_template('pages/artists.html', artists=artists)
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-  search_term = request.form.get('search_term', '')
-  artists = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-
-  for artist in artists:
-      artist.num_upcoming_shows = artists.venues.filter(Show.start_time > datetime.now()).count()
-
-  results = {
-    "count": len(venues),
-    "data": venues
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=search_term)
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  artist = Artist.query.get(artist_id)
-  if artist == None:
-      abort(404)
-
-  # converting back separating genres with the comma
-  artist.genres = artist.genres.split(",")
-
-  upcoming_shows = db.session.query(
-    Artist.id.label("venue_id"),
-    Artist.name.label("venue_name"),
-    Artist.image_link.label("venue_image_link"),
-    Show.start_time.label("start_time"),
-  ).filter_by(id=artist_id).join(Venue.artists).filter(Show.start_time > datetime.now()).all()
-
-  past_shows = db.session.query(
-    Artist.id.label("venue_id"),
-    Artist.name.label("venue_name"),
-    Artist.image_link.label("venue_image_link"),
-    Show.start_time.label("start_time"),
-  ).filter_by(id=artist_id).join(Venue.artists).filter(Show.start_time < datetime.now()).all()
-
-  artist.upcoming_shows = upcoming_shows
-  artist.past_shows = past_shows
-  artist.upcoming_shows_count = len(artist.upcoming_shows)
-  artist.past_shows_count = len(artist.past_shows)
-
-  return render_template('pages/show_artist.html', artist=artist)
-
-#----------------------------------------------------------------------------#
-# Create Artists
-#----------------------------------------------------------------------------#
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-  form = ArtistForm()
-  return render_template('forms/new_artist.html', form=form)
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-  error = False
-  body = {}
-  try:
-      name = request.form.get('name')
-      city = request.form.get('city')
-      state = request.form.get('state')
-      phone = request.form.get('phone', None)
-      image_link = request.form.get('image_link')
-
-      genres = request.form.getlist('genres')
-      facebook_link = request.form.get('facebook_link', None)
-      website = request.form.get('website', None)
-      seeking_venue = bool(request.form.get('seeking_venue', False))
-      seeking_description = request.form.get('seeking_description', None)
-
-      # concatened genres list into string separated with ","
-      genres = ','.join(genres)
-
-      artist = Artist(
-        name=name,
-        city=city,
-        state=state,
-        phone=phone,
-        genres=genres,
-        image_link=image_link,
-        facebook_link=facebook_link,
-        website=website,
-        seeking_venue=seeking_venue,
-        seeking_description=seeking_description
+        "distance_km": round(distance, 3)
+      } for id, name, city, state, distance in venues]
+    })
+
+  @app.route('/venues/<int:venue_id>')
+  def show_venue(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue == None or venue.deleted_at is not None:
+        abort(404)
+
+    # converting back separating genres with the comma
+    # only displayed, detached so the list of genres is never flushed
+    db.session.expunge(venue)
+    venue.genres = venue.genres.split(",")
+
+    # source: https://stackoverflow.com/questions/17868743/doing-datetime-comparisons-in-filter-sqlalchemy
+    now = datetime.now()
+    shows = db.session.query(
+      Artist.id.label("artist_id"),
+      Artist.name.label("artist_name"),
+      Artist.image_link.label("artist_image_link"),
+      Show.start_time.label("start_time"),
+    ).join(Show, Show.artist_id == Artist.id).filter(Show.venue_id == venue_id, Artist.deleted_at.is_(None)).order_by(Show.start_time).all()
+
+    venue.upcoming_shows = [show for show in shows if show.start_time > now]
+    venue.past_shows = [show for show in shows if show.start_time < now]
+    venue.upcoming_shows_count = len(venue.upcoming_shows)
+    venue.past_shows_count = len(venue.past_shows)
+    # the cached shows section expires when the next show starts
+    venue.next_show = venue.upcoming_shows[0].start_time if venue.upcoming_shows else None
+    # precomputed by `flask build-recommendations`
+    venue.similar_venues = recommendations.recommended('venue_venue', venue_id, Venue)
+    load_versions('venue', venue_id)
+
+    return render('pages/show_venue.html', venue=venue)
+
+  @app.route('/venues/<int:venue_id>/availability')
+  def venue_availability(venue_id):
+    if db.session.query(Venue.id).filter_by(id=venue_id, deleted_at=None).scalar() is None:
+        abort(404)
+
+    # free slots of the venue between start and end (a week from today by
+    # default) long enough for a show, see scheduling.py. The bounds given
+    # with an UTC offset are compared as stored (datetimes.py)
+    try:
+        start = stored_datetime(dateutil.parser.parse(request.args['start'])) if 'start' in request.args \
+            else datetime.combine(datetime.today(), datetime.min.time())
+        end = stored_datetime(dateutil.parser.parse(request.args['end'])) if 'end' in request.args \
+            else start + timedelta(days=7)
+        min_duration = timedelta(minutes=request.args.get(
+            'min_minutes', SHOW_DURATION.total_seconds() // 60, type=int))
+    except (ValueError, OverflowError):
+        abort(400)
+    if not start < end <= start + AVAILABILITY_MAX_RANGE or min_duration <= timedelta(0):
+        abort(400)
+
+    slots = free_slots(venue_id, start, end, min_duration)
+
+    return render_json({
+      "venue_id": venue_id,
+      "start": start.isoformat(),
+      "end": end.isoformat(),
+      "free": [{"start": slot_start.isoformat(), "end": slot_end.isoformat()}
+               for slot_start, slot_end in slots]
+    })
+
+  #----------------------------------------------------------------------------#
+  # Create Venue
+  #----------------------------------------------------------------------------#
+  @app.route('/venues/create', methods=['GET'])
+  def create_venue_form():
+    form = VenueForm()
+    return render('forms/new_venue.html', form=form)
+
+  @app.route('/venues/create', methods=['POST'])
+  def create_venue_submission():
+    error = False
+    body = {}
+    try:
+        name = request.form.get('name')
+        city = request.form.get('city')
+        state = request.form.get('state')
+        address = request.form.get('address')
+        phone = request.form.get('phone', None)
+        image_link = request.form.get('image_link')
+
+        # using getlist to get all multiple select fields
+        # source https://stackoverflow.com/a/12502681
+        genres = request.form.getlist('genres')
+        facebook_link = request.form.get('facebook_link', None)
+        website = request.form.get('website', None)
+        seeking_talent = bool(request.form.get('seeking_talent', False))
+        seeking_description = request.form.get('seeking_description', None)
+
+        # concatened genres list into string separated with ","
+        genres = ','.join(genres)
+
+        venue = Venue(name=name,city=city,state=state,address=address,phone=phone,
+                     genres=genres,image_link=image_link,facebook_link=facebook_link,
+                     website=website,seeking_talent=seeking_talent,seeking_description=seeking_description)
+        db.session.add(venue)
+        invalidate('venues')
+        release()
+        body['name'] = venue.name
+    except:
+        error=True
+        body['name'] = request.form.get('name')
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+        flash('An error occurred. Venue ' + body['name'] + ' could not be listed.')
+    else:
+        flash('Venue ' + body['name'] + ' was successfully listed!')
+
+    return render('pages/home.html')
+
+  #----------------------------------------------------------------------------#
+  # Delete Venue
+  #----------------------------------------------------------------------------#
+  @app.route('/venues/<venue_id>', methods=['DELETE'])
+  def delete_venue(venue_id):
+    error = False
+    venue_name = ""
+    try:
+        venue_name = Venue.query.filter_by(id=venue_id, deleted_at=None).one().name
+        now = datetime.now()
+        artist_ids = [artist_id for artist_id, in db.session.query(Show.artist_id)
+                      .filter(Show.venue_id == venue_id, Show.start_time > now).distinct()]
+        # hidden now with its upcoming shows, the past ones are deleted by
+        # `flask purge-deleted` (purges.py)
+        purges.soft_delete('venue', int(venue_id), now)
+        refresh_upcoming_counts(now, artist_ids)
+        # the artist pages list the shows of the venue
+        invalidate('venue', int(venue_id))
+        invalidate('venues')
+        invalidate('artist')
+        release()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+      flash('An error occurred. Venue ' + venue_name + ' could not be deleted.')
+    else:
+      flash('Venue ' + venue_name + ' was successfully deleted!')
+
+    return redirect(url_for('index'), code=200)
+
+  #----------------------------------------------------------------------------#
+  # Edit Venue
+  #----------------------------------------------------------------------------#
+  @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+  def edit_venue(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue == None or venue.deleted_at is not None:
+        abort(404)
+
+    # only displayed, detached so the list of genres is never flushed
+    db.session.expunge(venue)
+    venue.genres = venue.genres.split(',')
+
+    form = VenueForm(obj=venue)
+
+    return render('forms/edit_venue.html', form=form, venue=venue)
+
+  @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+  def edit_venue_submission(venue_id):
+    error = False
+    try:
+        name = request.form.get('name')
+        city = request.form.get('city')
+        state = request.form.get('state')
+        address = request.form.get('address')
+        phone = request.form.get('phone', None)
+        image_link = request.form.get('image_link')
+        genres = request.form.getlist('genres')
+        facebook_link = request.form.get('facebook_link', None)
+        website = request.form.get('website', None)
+        seeking_talent = bool(request.form.get('seeking_talent', False))
+        seeking_description = request.form.get('seeking_description', None)
+
+        # concatened genres list into string separated with ","
+        genres = ','.join(genres)
+
+        venue = Venue.query.get(venue_id)
+        if (venue.address, venue.city, venue.state) != (address, city, state):
+            # located again by the next `flask geocode-venues`
+            venue.latitude = venue.longitude = None
+        if (venue.city, venue.state) != (city, state):
+            # the shows of the venue move to its new city in the rollups
+            with rollups.tracking(venue_id=venue_id):
+                venue.city = city
+                venue.state = state
+        venue.name = name
+        venue.address = address
+        venue.phone = phone
+        venue.genres = genres
+        venue.image_link = image_link
+        venue.facebook_link = facebook_link
+        venue.website = website
+        venue.seeking_talent = seeking_talent
+        venue.seeking_description = seeking_description
+
+        invalidate('venue', venue_id)
+        invalidate('venues')
+        invalidate('artist')
+        release()
+    except:
+        error=True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+        flash('An error occurred. Venue could not be updated.')
+    else:
+        flash('Venue was successfully updated!')
+
+    return redirect(url_for('show_venue', venue_id=venue_id))
+
+  #----------------------------------------------------------------------------#
+  # Artists
+  #----------------------------------------------------------------------------#
+  @app.route('/artists')
+  def artists():
+    # one page of the listing, sorted by name or by upcoming shows and read
+    # from the indexes after the cursor, see statements.py
+    sort = request.args.get('sort', 'name')
+    if sort not in ARTIST_SORTS:
+        abort(400)
+    filters = {name: request.args.get(name, '').strip() or None
+               for name in ('city', 'state', 'genre')}
+    cursor = request.args.get('cursor')
+
+    try:
+        artists, next_cursor = artists_page(sort, cursor, **filters)
+    except ValueError:
+        abort(400)
+
+    next_page = None
+    if next_cursor is not None:
+        next_page = url_for('artists', sort=sort, cursor=next_cursor, **filters)
+
+    # the JSON variant feeds the infinite scroll of the page, both variants
+    # share the URL so the response varies on Accept
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        response = render_json({
+          "artists": [artist._asdict() for artist in artists],
+          "next_cursor": next_cursor,
+          "next_page": next_page
+        })
+    else:
+        listing = dict(filters, sort=sort, key=(sort, filters['city'], filters['state'], filters['genre'], cursor))
+        load_versions('artists')
+        response = make_response(render('pages/artists.html', artists=artists, listing=listing, next_page=next_page))
+
+    response.vary.add('Accept')
+    return response
+
+  @app.route('/artists/search', methods=['GET', 'POST'])
+  def search_artists():
+    search_term = request.values.get('search_term', '')
+    page = max(1, request.args.get('page', 1, type=int))
+
+    # by name or by "city, state", with the upcoming shows of every hit
+    artists = search(Artist, search_term, datetime.now(), page)
+
+    results = {
+      "count": artists.total,
+      "data": artists.items,
+      "pages": artists
+    }
+    return render('pages/search_artists.html', results=results, search_term=search_term)
+
+  @app.route('/artists/<int:artist_id>')
+  def show_artist(artist_id):
+    artist = Artist.query.get(artist_id)
+    if artist == None or artist.deleted_at is not None:
+        abort(404)
+
+    # converting back separating genres with the comma
+    # only displayed, detached so the list of genres is never flushed
+    db.session.expunge(artist)
+    artist.genres = artist.genres.split(",")
+
+    now = datetime.now()
+    shows = db.session.query(
+      Venue.id.label("venue_id"),
+      Venue.name.label("venue_name"),
+      Venue.image_link.label("venue_image_link"),
+      Show.start_time.label("start_time"),
+    ).join(Show, Show.venue_id == Venue.id).filter(Show.artist_id == artist_id, Venue.deleted_at.is_(None)).order_by(Show.start_time).all()
+
+    artist.upcoming_shows = [show for show in shows if show.start_time > now]
+    artist.past_shows = [show for show in shows if show.start_time < now]
+    artist.upcoming_shows_count = len(artist.upcoming_shows)
+    artist.past_shows_count = len(artist.past_shows)
+    # the cached shows section expires when the next show starts
+    artist.next_show = artist.upcoming_shows[0].start_time if artist.upcoming_shows else None
+    # precomputed by `flask build-recommendations`
+    artist.similar_artists = recommendations.recommended('artist_artist', artist_id, Artist)
+    artist.recommended_venues = recommendations.recommended('artist_venue', artist_id, Venue)
+    load_versions('artist', artist_id)
+
+    return render('pages/show_artist.html', artist=artist)
+
+  #----------------------------------------------------------------------------#
+  # Create Artists
+  #----------------------------------------------------------------------------#
+  @app.route('/artists/create', methods=['GET'])
+  def create_artist_form():
+    form = ArtistForm()
+    return render('forms/new_artist.html', form=form)
+
+  @app.route('/artists/create', methods=['POST'])
+  def create_artist_submission():
+    error = False
+    body = {}
+    try:
+        name = request.form.get('name')
+        city = request.form.get('city')
+        state = request.form.get('state')
+        phone = request.form.get('phone', None)
+        image_link = request.form.get('image_link')
+
+        genres = request.form.getlist('genres')
+        facebook_link = request.form.get('facebook_link', None)
+        website = request.form.get('website', None)
+        seeking_venue = bool(request.form.get('seeking_venue', False))
+        seeking_description = request.form.get('seeking_description', None)
+
+        # concatened genres list into string separated with ","
+        genres = ','.join(genres)
+
+        artist = Artist(
+          name=name,
+          city=city,
+          state=state,
+          phone=phone,
+          genres=genres,
+          image_link=image_link,
+          facebook_link=facebook_link,
+          website=website,
+          seeking_venue=seeking_venue,
+          seeking_description=seeking_description
+        )
+        db.session.add(artist)
+        invalidate('artists')
+        release()
+        body['name'] = artist.name
+    except:
+        error=True
+        body['name'] = request.form.get('name')
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+        flash('An error occurred. Artist ' + body['name'] + ' could not be listed.')
+    else:
+        flash('Artist ' + body['name'] + ' was successfully listed!')
+
+    return render('pages/home.html')
+
+  #----------------------------------------------------------------------------#
+  # Edit Artists
+  #----------------------------------------------------------------------------#
+  @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+  def edit_artist(artist_id):
+    artist = Artist.query.get(artist_id)
+    if artist == None or artist.deleted_at is not None:
+       abort(404)
+
+    # only displayed, detached so the list of genres is never flushed
+    db.session.expunge(artist)
+    artist.genres = artist.genres.split(',')
+
+    form = ArtistForm(obj=artist)
+
+    return render('forms/edit_artist.html', form=form, artist=artist)
+
+  @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+  def edit_artist_submission(artist_id):
+    error = False
+    try:
+        name = request.form.get('name')
+        city = request.form.get('city')
+        state = request.form.get('state')
+        phone = request.form.get('phone', None)
+        image_link = request.form.get('image_link')
+        genres = request.form.getlist('genres')
+        facebook_link = request.form.get('facebook_link', None)
+        website = request.form.get('website', None)
+        seeking_venue = bool(request.form.get('seeking_venue', False))
+        seeking_description = request.form.get('seeking_description', None)
+
+        # concatened genres list into string separated with ","
+        genres = ','.join(genres)
+
+        artist = Artist.query.get(artist_id)
+        if artist.genres != genres:
+            # the shows of the artist are counted in its new genres
+            with rollups.tracking(artist_id=artist_id):
+                artist.genres = genres
+        artist.name = name
+        artist.city = city
+        artist.state = state
+        artist.phone = phone
+        artist.image_link = image_link
+        artist.facebook_link = facebook_link
+        artist.website = website
+        artist.seeking_venue = seeking_venue
+        artist.seeking_description = seeking_description
+
+        invalidate('artist', artist_id)
+        invalidate('artists')
+        invalidate('venue')
+        release()
+    except:
+        error=True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+        flash('An error occurred. Artist could not be updated.')
+    else:
+        flash('Artist was successfully updated!')
+
+    return redirect(url_for('show_artist', artist_id=artist_id))
+
+  #----------------------------------------------------------------------------#
+  # Delete Artists
+  #----------------------------------------------------------------------------#
+  @app.route('/artist/<artist_id>', methods=['DELETE'])
+  def delete_artist(artist_id):
+    error = False
+    artist_name = ""
+    try:
+        artist_name = Artist.query.filter_by(id=artist_id, deleted_at=None).one().name
+        # hidden now with its upcoming shows, the past ones are deleted by
+        # `flask purge-deleted` (purges.py)
+        purges.soft_delete('artist', int(artist_id), datetime.now())
+        # the venue pages list the shows of the artist
+        invalidate('artist', int(artist_id))
+        invalidate('artists')
+        invalidate('venue')
+        release()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if error:
+      flash('An error occurred. Artist ' + artist_name + ' could not be deleted.')
+    else:
+      flash('Artist ' + artist_name + ' was successfully deleted!')
+
+    return redirect(url_for('index'), code=200)
+
+  #  Calendars
+  #  ----------------------------------------------------------------
+
+  def calendar_response(year, month, **where):
+    if not 1 <= month <= 12 or not 1 <= year < 9999:
+        abort(404)
+
+    start, end = month_range(year, month)
+    response = render_json({
+      "year": year,
+      "month": month,
+      "days": calendar(start, end, **where)
+    })
+
+    # a past month does not change anymore, the current and next ones do
+    past = end <= datetime.now()
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['CALENDAR_MAX_AGE_PAST' if past else 'CALENDAR_MAX_AGE']
+    return response
+
+  @app.route('/venues/<int:venue_id>/calendar/<int:year>/<int:month>')
+  def venue_calendar(venue_id, year, month):
+    if db.session.query(Venue.id).filter_by(id=venue_id, deleted_at=None).scalar() is None:
+        abort(404)
+    return calendar_response(year, month, venue_id=venue_id)
+
+  @app.route('/artists/<int:artist_id>/calendar/<int:year>/<int:month>')
+  def artist_calendar(artist_id, year, month):
+    if db.session.query(Artist.id).filter_by(id=artist_id, deleted_at=None).scalar() is None:
+        abort(404)
+    return calendar_response(year, month, artist_id=artist_id)
+
+  @app.route('/cities/<state>/<city>/calendar/<int:year>/<int:month>')
+  def city_calendar(state, city, year, month):
+    return calendar_response(year, month, city=city, state=state)
+
+  #  Stats
+  #  ----------------------------------------------------------------
+
+  @app.route('/stats')
+  def stats():
+    year = request.args.get('year', date.today().year, type=int)
+    if not 1 <= year < 9999:
+        abort(400)
+    filters = {name: request.args.get(name, '').strip() or None
+               for name in ('genre', 'state', 'city')}
+
+    # only the rollups are read, the shows are counted by rollups.py
+    stats = rollups.stats(year, **filters)
+
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        response = render_json(dict(stats, **filters))
+    else:
+        response = make_response(render('pages/stats.html', stats=stats, filters=filters))
+
+    response.vary.add('Accept')
+    return response
+
+  #  Shows
+  #  ----------------------------------------------------------------
+
+  @app.route('/shows')
+  def shows():
+    upcoming = Show.query.filter(Show.start_time > datetime.now()).all()
+    shows = []
+
+    for show in upcoming:
+        shows.append({
+          "venue_id": show.venue.id,
+          "venue_name": show.venue.name,
+          "artist_id": show.artist.id,
+          "artist_name": show.artist.name,
+          "artist_image_link": show.artist.image_link,
+          "start_time": show.start_time
+        })
+
+    return render('pages/shows.html', shows=shows)
+
+  @app.route('/shows/create')
+  def create_shows():
+    # renders form. do not touch. | OK! I will not! :)
+    form = ShowForm()
+    return render('forms/new_show.html', form=form)
+
+  @app.route('/shows/create', methods=['POST'])
+  def create_show_submission():
+    error = False
+    booked = None
+    try:
+        artist_id = int(request.form.get('artist_id'))
+        venue_id = int(request.form.get('venue_id'))
+        start_time = dateutil.parser.parse(request.form.get('start_time'))
+        duration = request.form.get('duration', type=int)
+        duration = timedelta(minutes=duration) if duration else SHOW_DURATION
+
+        if db.session.query(Venue.id).filter_by(id=venue_id, deleted_at=None).scalar() is None or \
+           db.session.query(Artist.id).filter_by(id=artist_id, deleted_at=None).scalar() is None:
+            raise LookupError('the venue or the artist does not exist')
+
+        # refused when the venue or the artist is already booked at that time
+        book(artist_id, venue_id, start_time, duration)
+        rollups.record(start_time, venue_id, artist_id)
+        refresh_upcoming_counts(datetime.now(), [artist_id])
+        invalidate('venue', venue_id)
+        invalidate('artist', artist_id)
+        invalidate('artists')
+        release()
+    except DoubleBooking as booking:
+        error = True
+        if booking.show is None:
+            booked = 'artist or the venue'
+        else:
+            booked = 'venue' if booking.show.venue_id == venue_id else 'artist'
+        db.session.rollback()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    if booked:
+        flash('Show could not be listed, the ' + booked + ' is already booked at that time.')
+    elif error:
+        flash('An error occurred. Show could not be listed.')
+    else:
+        flash('Show was successfully listed!')
+
+    return render('pages/home.html')
+
+  #  Commands
+  #  ----------------------------------------------------------------
+
+  @app.cli.command('refresh-upcoming')
+  def refresh_upcoming_command():
+    """Count again the upcoming shows of the artists (run it hourly)."""
+    updated = refresh_upcoming_counts(datetime.now())
+    db.session.commit()
+    click.echo('{} artists updated'.format(updated))
+
+  @app.cli.command('geocode-venues')
+  @click.option('--gazetteer', type=click.Path(exists=True, dir_okay=False),
+                default=geo.GAZETTEER)
+  @click.option('--all', 'everything', is_flag=True,
+                help='locate the venues that have coordinates too')
+  @click.option('--batch-size', type=int, default=geo.GEOCODE_BATCH_SIZE)
+  def geocode_venues_command(gazetteer, everything, batch_size):
+    """Set the coordinates of the venues from a gazetteer file."""
+    located, missing = geo.geocode_venues(
+      geo.load_gazetteer(gazetteer), everything, batch_size)
+    db.session.commit()
+    click.echo('{} venues located, {} not found'.format(located, missing))
+
+  @app.cli.command('build-recommendations')
+  @click.option('--top-k', type=int, default=recommendations.TOP_K)
+  @click.option('--engine', type=click.Choice(['scipy', 'python']), default=None)
+  def build_recommendations_command(top_k, engine):
+    """Recompute the similar artists and venues (run it nightly)."""
+    counts = recommendations.build(top_k, engine)
+    db.session.commit()
+    for kind, count in counts.items():
+        click.echo('{} {} rows'.format(kind, count))
+
+  @app.cli.command('rebuild-rollups')
+  def rebuild_rollups_command():
+    """Count again the shows per day, city and genre of the attached months (run it nightly)."""
+    rows = rollups.rebuild(rollups.attached_since())
+    db.session.commit()
+    click.echo('{} rollups'.format(rows))
+
+  @app.cli.command('purge-deleted')
+  @click.option('--batch-size', type=int, default=purges.PURGE_BATCH_SIZE,
+                help='shows deleted per transaction')
+  @click.option('--max-batches', type=int, default=None)
+  @click.option('--pause', type=float, default=0,
+                help='seconds between two batches')
+  def purge_deleted_command(batch_size, max_batches, pause):
+    """Delete the deleted venues and artists with their shows, in batches."""
+    finished, deleted = purges.run(batch_size, max_batches, pause)
+    click.echo('{} shows deleted, {} venues or artists purged'.format(deleted, finished))
+
+  @app.cli.command('partition-shows')
+  @click.option('--ahead', type=int, default=None, help='months created ahead')
+  @click.option('--keep', type=int, default=None, help='months kept, 0 for all')
+  @click.option('--archive-schema', default=partitions.ARCHIVE_SCHEMA)
+  @click.option('--drop', is_flag=True, help='drop the old months')
+  def partition_shows_command(ahead, keep, archive_schema, drop):
+    """Create the next monthly partitions of shows, detach the old ones."""
+    try:
+        created, detached = partitions.maintain(
+          db.engine, date.today(),
+          app.config['SHOWS_PARTITIONS_AHEAD'] if ahead is None else ahead,
+          app.config['SHOWS_PARTITIONS_KEEP'] if keep is None else keep,
+          None if drop else archive_schema)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    for month in created:
+        click.echo('created ' + partitions.partition_name(month))
+    for name in detached:
+        click.echo(('dropped ' if drop else 'archived ') + name)
+
+  @app.errorhandler(404)
+  def not_found_error(error):
+      return render_template('errors/404.html'), 404
+
+  @app.errorhandler(500)
+  def server_error(error):
+      return render_template('errors/500.html'), 500
+
+
+  if not app.debug:
+      file_handler = FileHandler('error.log')
+      file_handler.setFormatter(
+          Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
       )
-      db.session.add(artist)
-      db.session.commit()
-      body['name'] = artist.name
-  except:
-      error=True
-      body['name'] = request.form.get('name')
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-      flash('An error occurred. Artist ' + body['name'] + ' could not be listed.')
-  else:
-      flash('Artist ' + body['name'] + ' was successfully listed!')
-
-  return render_template('pages/home.html')
+      app.logger.setLevel(logging.INFO)
+      file_handler.setLevel(logging.INFO)
+      app.logger.addHandler(file_handler)
+      app.logger.info('errors')
 
-#----------------------------------------------------------------------------#
-# Edit Artists
-#----------------------------------------------------------------------------#
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-  artist = Artist.query.get(artist_id)
-  if artist == None:
-     abort(404)
-
-  artist.genres = artist.genres.split(',')
-
-  form = ArtistForm(obj=artist)
-
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-  error = False
-  try:
-      name = request.form.get('name')
-      city = request.form.get('city')
-      state = request.form.get('state')
-      phone = request.form.get('phone', None)
-      image_link = request.form.get('image_link')
-      genres = request.form.getlist('genres')
-      facebook_link = request.form.get('facebook_link', None)
-      website = request.form.get('website', None)
-      seeking_venue = bool(request.form.get('seeking_venue', False))
-      seeking_description = request.form.get('seeking_description', None)
-
-      # concatened genres list into string separated with ","
-      genres = ','.join(genres)
-
-      artist = Artist.query.get(artist_id)
-      artist.name = name
-      artist.city = city
-      artist.state = state
-      artist.phone = phone
-      artist.genres = genres
-      artist.image_link = image_link
-      artist.facebook_link = facebook_link
-      artist.website = website
-      artist.seeking_venue = seeking_venue
-      artist.seeking_description = seeking_description
-
-      db.session.commit()
-  except:
-      error=True
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-      flash('An error occurred. Artist could not be updated.')
-  else:
-      flash('Artist was successfully updated!')
-
-  return redirect(url_for('show_artist', artist_id=artist_id))
-
-#----------------------------------------------------------------------------#
-# Delete Artists
-#----------------------------------------------------------------------------#
-@app.route('/artist/<artist_id>', methods=['DELETE'])
-def delete_artist(artist_id):
-  error = False
-  artist_name = ""
-  try:
-      artist_name = Artist.query.get(artist_id).name
-      Artist.query.filter_by(id=artist_id).delete()
-      db.session.commit()
-  except:
-      error = True
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-    flash('An error occurred. Artist ' + artist_name + ' could not be deleted.')
-  else:
-    flash('Artist ' + artist_name + ' was successfully deleted!')
-
-  return redirect(url_for('index'), code=200)
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-  upcoming = Show.query.filter(Show.start_time > datetime.now()).all()
-  shows = []
-
-  for show in upcoming:
-      shows.append({
-        "venue_id": show.venue.id,
-        "venue_name": show.venue.name,
-        "artist_id": show.artist.id,
-        "artist_name": show.artist.name,
-        "artist_image_link": show.artist.image_link,
-        "start_time": show.start_time
-      })
-
-  return render_template('pages/shows.html', shows=shows)
-
-@app.route('/shows/create')
-def create_shows():
-  # renders form. do not touch. | OK! I will not! :)
-  form = ShowForm()
-  return render_template('forms/new_show.html', form=form)
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-  error = False
-  try:
-      artist_id = request.form.get('artist_id')
-      venue_id = request.form.get('venue_id')
-      start_time = request.form.get('start_time')
-
-      show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
-      db.session.add(show)
-      db.session.commit()
-  except:
-      error = True
-      db.session.rollback()
-      print(sys.exc_info())
-  finally:
-      db.session.close()
-
-  if error:
-      flash('An error occurred. Show could not be listed.')
-  else:
-      flash('Show was successfully listed!')
-
-  return render_template('pages/home.html')
-
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
-
-@app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
-
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+  return app
 
 #----------------------------------------------------------------------------#
 # Launch
@@ -530,11 +789,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -1,8 +1,4 @@
 import os
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_moment import Moment
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
 
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
@@ -12,14 +8,29 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 
 # Connect to the database
-SQLALCHEMY_DATABASE_URI = 'postgresql://app_user@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+  'DATABASE_URL', 'postgresql://app_user@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
+# rendered page sections (fragments.py): entries kept per process and the
+# seconds an entry is served at most
+FRAGMENT_CACHE_SIZE = 1000
+FRAGMENT_MAX_AGE = 60
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# show times are stored naive in DATETIME_TIMEZONE and formatted in the
+# DATETIME_LOCALE (datetimes.py)
+DATETIME_LOCALE = 'en_US'
+DATETIME_TIMEZONE = 'UTC'
+
+# seconds the month calendars may be cached, the past months do not change
+CALENDAR_MAX_AGE = 60
+CALENDAR_MAX_AGE_PAST = 86400
+
+# monthly partitions of shows on Postgres (partitions.py): months created
+# ahead and months kept before the current one (0 keeps every month)
+SHOWS_PARTITIONS_AHEAD = 12
+SHOWS_PARTITIONS_KEEP = 36
+
+# nearby venues (geo.py): default and largest radius of a search, in km
+NEARBY_RADIUS = 25
+NEARBY_MAX_RADIUS = 500
@@ -0,0 +1,69 @@
+'''
+Test fixtures
+    fyyur has no dump, the schema and generated rows (benchmarks.datagen,
+    a fixed seed) are loaded once per run in a template database, every
+    pytest-xdist worker tests against its own copy and every test runs in a
+    SAVEPOINT rolled back at its end.
+    TEST_DATABASE_URL picks the database server, a temporary SQLite database
+    by default:
+
+    TEST_DATABASE_URL=postgresql://app_user@localhost:5432/fyyur_test pytest -n auto
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.datagen import generate  # noqa: E402
+from models import db  # noqa: E402
+
+ROWS = 200
+SEED = 1
+
+
+def pytest_configure(config):
+    fixtures.configure(config, db.metadata, name='fyyur',
+                       rows=generate('fyyur', ROWS, SEED))
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    fixtures.configure_node(node)
+
+
+def pytest_unconfigure(config):
+    fixtures.unconfigure(config)
+
+
+@pytest.fixture(scope='session')
+def database_url(request):
+    url = fixtures.worker_database(request.config)
+    os.environ['TEST_DATABASE_URL'] = url
+    yield url
+    fixtures.drop_database(url)
+
+
+@pytest.fixture(scope='session')
+def engine(database_url):
+    engine = fixtures.test_engine(database_url)
+    yield engine
+    engine.dispose()
+
+
+# flask_sqlalchemy sessions need an application, built once per worker
+@pytest.fixture(scope='session')
+def flask_app(database_url):
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    db.app = app
+    return app
+
+
+@pytest.fixture(autouse=True)
+def rollback(flask_app, engine):
+    with fixtures.rollback_session(db, engine) as session:
+        yield session
@@ -0,0 +1,105 @@
+#----------------------------------------------------------------------------#
+# Datetime formatting
+# the `datetime` Jinja filter. The show times are native datetimes, they are
+# formatted without the string round trip (str + dateutil parse), the babel
+# pattern and locale are compiled once per (format, locale) and the formatted
+# strings are memoized in a bounded LRU (a page lists the same show times
+# over and over).
+# The show times are stored naive in DATETIME_TIMEZONE, a visitor sees them in
+# the timezone of its `timezone` cookie (an IANA name, set by the browser),
+# as stored when there is none.
+#----------------------------------------------------------------------------#
+from datetime import date, datetime
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import get_timezone, parse_pattern
+from flask import current_app, g, has_request_context, request
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+CACHE_SIZE = 4096
+
+
+'''
+compiled(format, locale)
+    the babel pattern and locale of a format name (full, medium) or pattern
+'''
+
+
+@lru_cache(maxsize=64)
+def compiled(format, locale):
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=64)
+def timezone(name):
+    try:
+        return get_timezone(name)
+    except LookupError:
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format(value, format, locale, stored_in, shown_in):
+    pattern, locale = compiled(format, locale)
+    if shown_in is not None:
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone(stored_in))
+        value = value.astimezone(timezone(shown_in))
+    return pattern.apply(value, locale)
+
+
+'''
+user_timezone()
+    the timezone the visitor asked for, None to show the times as stored.
+    Looked up once per request
+'''
+
+
+def user_timezone():
+    if not has_request_context():
+        return None
+
+    if 'timezone' not in g:
+        name = request.cookies.get('timezone')
+        g.timezone = name if name and timezone(name) is not None else None
+    return g.timezone
+
+
+'''
+stored_datetime(value)
+    value as stored: a datetime with an UTC offset is converted to the naive
+    time of DATETIME_TIMEZONE, a naive one is already in it
+'''
+
+
+def stored_datetime(value):
+    if value.tzinfo is None:
+        return value
+
+    stored_in = current_app.config.get('DATETIME_TIMEZONE', 'UTC')
+    return value.astimezone(timezone(stored_in)).replace(tzinfo=None)
+
+
+'''
+format_datetime(value, format='medium', locale=None, tz=None)
+    value is a datetime or a date (strings are still parsed), format a name
+    of FORMATS or a babel pattern, tz the timezone to show the value in
+'''
+
+
+def format_datetime(value, format='medium', locale=None, tz=None):
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    elif not isinstance(value, datetime) and isinstance(value, date):
+        value = datetime(value.year, value.month, value.day)
+
+    config = current_app.config
+    return _format(value, format,
+                   locale or config.get('DATETIME_LOCALE', 'en_US'),
+                   config.get('DATETIME_TIMEZONE', 'UTC'),
+                   tz or user_timezone())
@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# Fragment cache
+# rendered sections of the venue and artist pages and of their listings, kept
+# in a bounded LRU per process. A fragment is keyed by the entity and the
+# version of its data. The versions are rows of fragment_versions shared by
+# every worker: the create, edit and delete handlers of app.py bump them
+# (invalidate) in the transaction of the change, and the page handlers read
+# them (load_versions) before the unit of work ends, so every worker misses
+# the next render once the change is committed. FRAGMENT_MAX_AGE bounds the
+# age of an entry, and a fragment listing upcoming shows expires when the
+# first of them starts (it becomes a past show).
+#
+#   load_versions('venue', venue_id)
+#   ...
+#   {% call fragment('venue', venue.id, 'shows', venue.next_show) %}
+#     ...
+#   {% endcall %}
+#----------------------------------------------------------------------------#
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import g
+from markupsafe import Markup
+from sqlalchemy.dialects.postgresql import insert
+
+from datetimes import user_timezone
+from models import db, FragmentVersion
+
+# the subject_id of the version of a whole kind
+EVERY = 0
+
+
+class FragmentCache:
+    def __init__(self, app=None):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = 1000
+        self.max_age = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', 1000)
+        self.max_age = app.config.get('FRAGMENT_MAX_AGE', 60)
+        app.extensions['fragments'] = self
+        app.jinja_env.globals['fragment'] = self.fragment
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    '''
+    fragment(kind, id, section, expires=None, caller=None)
+        the Jinja call block: the cached markup of the section, or the body
+        of the block rendered and cached until expires (a datetime) or for
+        max_age seconds
+    '''
+
+    def fragment(self, kind, id, section, expires=None, caller=None):
+        # the show times are rendered in the timezone of the visitor
+        key = (kind, id, section, user_timezone()) + version(kind, id)
+        markup = self.get(key)
+        if markup is not None:
+            self.hits += 1
+            return markup
+
+        self.misses += 1
+        markup = Markup(caller())
+        ttl = self.max_age
+        if expires is not None:
+            ttl = min(ttl, (expires - datetime.now()).total_seconds())
+        if ttl > 0:
+            self.set(key, markup, ttl)
+
+        return markup
+
+
+'''
+load_versions(kind, id=None)
+    reads the versions a fragment of the entity depends on, its own and the
+    one of its kind (invalidate('artist') invalidates every artist page), in
+    the transaction of the request. Kept for the rendering in g
+'''
+
+
+def load_versions(kind, id=None):
+    subjects = {EVERY, EVERY if id is None else id}
+    found = dict(db.session.query(FragmentVersion.subject_id,
+                                  FragmentVersion.version)
+                 .filter(FragmentVersion.kind == kind,
+                         FragmentVersion.subject_id.in_(subjects)))
+    versions = g.setdefault('fragment_versions', {})
+    versions[(kind, id)] = (found.get(EVERY, 0),
+                            0 if id is None else found.get(id, 0))
+    return versions[(kind, id)]
+
+
+# the versions loaded by the handler, read now when it did not load them
+def version(kind, id=None):
+    loaded = g.get('fragment_versions', {}).get((kind, id))
+    return loaded if loaded is not None else load_versions(kind, id)
+
+
+'''
+invalidate(kind, id=None)
+    bumps the version of the entity, or of its whole kind, in the current
+    transaction: committed with the change it invalidates
+'''
+
+
+def invalidate(kind, id=None):
+    subject_id = EVERY if id is None else id
+    if db.session.get_bind().dialect.name == 'postgresql':
+        statement = insert(FragmentVersion.__table__).values(
+            kind=kind, subject_id=subject_id, version=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['kind', 'subject_id'],
+            set_={'version': FragmentVersion.version + 1}))
+        return
+
+    updated = FragmentVersion.query.filter_by(
+        kind=kind, subject_id=subject_id) \
+        .update({FragmentVersion.version: FragmentVersion.version + 1},
+                synchronize_session=False)
+    if not updated:
+        db.session.bulk_insert_mappings(FragmentVersion, [{
+            'kind': kind, 'subject_id': subject_id, 'version': 1}])
@@ -0,0 +1,161 @@
+#----------------------------------------------------------------------------#
+# Geo
+# venues have a latitude and a longitude, filled offline by
+# `flask geocode-venues` from a gazetteer file (data/gazetteer.csv by
+# default: city,state,latitude,longitude, an address column makes it match
+# the address first). The nearby venues are a nearest neighbours query:
+#   - Postgres: earth_box() of the earthdistance extension over the GiST
+#     index of ll_to_earth(latitude, longitude) (migrations), ordered by
+#     earth_distance()
+#   - elsewhere: the bounding box of the radius over the (latitude, longitude)
+#     index, the exact great circle distances computed here
+#----------------------------------------------------------------------------#
+import csv
+import math
+import os
+
+from sqlalchemy import and_, func, or_
+
+from models import db, Venue
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                         'gazetteer.csv')
+EARTH_RADIUS_KM = 6371.0
+NEARBY_LIMIT = 50
+GEOCODE_BATCH_SIZE = 1000
+
+
+def normalize(*parts):
+    return tuple(' '.join(part.split()).lower() for part in parts)
+
+
+'''
+load_gazetteer(path=GAZETTEER)
+    {(address, city, state) or (city, state): (latitude, longitude)}, the
+    keys normalized (case and spaces)
+'''
+
+
+def load_gazetteer(path=GAZETTEER):
+    places = {}
+    with open(path, newline='', encoding='utf-8') as stream:
+        for row in csv.DictReader(stream):
+            point = (float(row['latitude']), float(row['longitude']))
+            if row.get('address'):
+                places[normalize(row['address'], row['city'],
+                                 row['state'])] = point
+            else:
+                places[normalize(row['city'], row['state'])] = point
+    return places
+
+
+def locate(places, address, city, state):
+    return places.get(normalize(address or '', city, state)) or \
+        places.get(normalize(city, state))
+
+
+'''
+geocode_venues(places, everything=False, batch_size=GEOCODE_BATCH_SIZE)
+    sets the coordinates of the venues without (all of them with
+    everything), a batch of venues per flush, returns the number of venues
+    located and not found
+'''
+
+
+def geocode_venues(places, everything=False, batch_size=GEOCODE_BATCH_SIZE):
+    located = missing = 0
+    last_id = 0
+    while True:
+        venues = db.session.query(
+            Venue.id, Venue.address, Venue.city, Venue.state) \
+            .filter(Venue.id > last_id)
+        if not everything:
+            venues = venues.filter(Venue.latitude.is_(None))
+        venues = venues.order_by(Venue.id).limit(batch_size).all()
+        if not venues:
+            break
+
+        updates = []
+        for id, address, city, state in venues:
+            point = locate(places, address, city, state)
+            if point is None:
+                missing += 1
+                continue
+            updates.append({'id': id, 'latitude': point[0],
+                            'longitude': point[1]})
+        db.session.bulk_update_mappings(Venue, updates)
+        db.session.flush()
+        located += len(updates)
+        last_id = venues[-1].id
+
+    return located, missing
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * \
+        math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or abs(lat) + delta_lat >= 90:
+        delta_lng = 180.0
+    else:
+        delta_lng = min(180.0, math.degrees(
+            radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (max(-90.0, lat - delta_lat), min(90.0, lat + delta_lat),
+            lng - delta_lng, lng + delta_lng)
+
+
+def _in_box(lat, lng, radius_km):
+    south, north, west, east = bounding_box(lat, lng, radius_km)
+    latitude = Venue.latitude.between(south, north)
+    if east - west >= 360:
+        return latitude
+    # across the antimeridian the box is two ranges of longitude
+    if west < -180:
+        longitude = or_(Venue.longitude >= west + 360,
+                        Venue.longitude <= east)
+    elif east > 180:
+        longitude = or_(Venue.longitude >= west,
+                        Venue.longitude <= east - 360)
+    else:
+        longitude = Venue.longitude.between(west, east)
+    return and_(latitude, longitude)
+
+
+'''
+nearby(lat, lng, radius_km, limit=NEARBY_LIMIT)
+    the (id, name, city, state, distance_km) of the venues within radius_km,
+    nearest first
+'''
+
+
+def nearby(lat, lng, radius_km, limit=NEARBY_LIMIT):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        center = func.ll_to_earth(lat, lng)
+        location = func.ll_to_earth(Venue.latitude, Venue.longitude)
+        distance = func.earth_distance(center, location)
+        rows = db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, distance) \
+            .filter(func.earth_box(center, radius_km * 1000).op('@>')(location),
+                    distance <= radius_km * 1000,
+                    Venue.deleted_at.is_(None)) \
+            .order_by(distance, Venue.id).limit(limit)
+        return [(id, name, city, state, meters / 1000)
+                for id, name, city, state, meters in rows]
+
+    rows = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude,
+        Venue.longitude).filter(_in_box(lat, lng, radius_km),
+                                Venue.deleted_at.is_(None))
+    venues = []
+    for id, name, city, state, latitude, longitude in rows:
+        distance = distance_km(lat, lng, latitude, longitude)
+        if distance <= radius_km:
+            venues.append((id, name, city, state, distance))
+    venues.sort(key=lambda venue: (venue[4], venue[0]))
+    return venues[:limit]
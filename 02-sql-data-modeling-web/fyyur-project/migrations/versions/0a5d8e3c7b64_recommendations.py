@@ -0,0 +1,31 @@
+"""recommendations: top-K neighbours of the artists and venues
+
+Revision ID: 0a5d8e3c7b64
+Revises: f4a6c3e9d812
+Create Date: 2026-10-19 19:26:14.073385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a5d8e3c7b64'
+down_revision = 'f4a6c3e9d812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recommendations',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('object_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'subject_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('recommendations')
@@ -0,0 +1,29 @@
+"""fragment_versions: versions of the cached fragments shared by the workers
+
+Revision ID: 2d7f4b9e6c18
+Revises: 9c4f2e6a1b75
+Create Date: 2026-10-19 23:12:41.530297
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7f4b9e6c18'
+down_revision = '9c4f2e6a1b75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fragment_versions',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'subject_id')
+    )
+
+
+def downgrade():
+    op.drop_table('fragment_versions')
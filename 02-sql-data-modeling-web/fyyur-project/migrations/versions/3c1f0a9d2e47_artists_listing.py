@@ -0,0 +1,45 @@
+"""artists listing: upcoming shows count and the indexes of the keyset pages
+
+Revision ID: 3c1f0a9d2e47
+Revises: 7694efe54d5e
+Create Date: 2026-10-19 10:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a9d2e47'
+down_revision = '7694efe54d5e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('artists', sa.Column('upcoming_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+    op.execute(
+        "UPDATE artists SET upcoming_shows_count = "
+        "(SELECT count(*) FROM shows WHERE shows.artist_id = artists.id "
+        "AND shows.start_time > CURRENT_TIMESTAMP)")
+
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'])
+    op.create_index('ix_artists_upcoming_shows_count_id', 'artists',
+                    ['upcoming_shows_count', 'id'])
+    op.create_index('ix_artists_state_city', 'artists', ['state', 'city'])
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'])
+    # genre filter, genres_contain() of statements.py
+    op.create_index('ix_artists_genres', 'artists',
+                    [sa.text("string_to_array(genres, ',')")],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_artists_state_city', table_name='artists')
+    op.drop_index('ix_artists_upcoming_shows_count_id', table_name='artists')
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_column('artists', 'upcoming_shows_count')
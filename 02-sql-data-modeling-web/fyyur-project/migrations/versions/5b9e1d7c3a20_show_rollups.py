@@ -0,0 +1,49 @@
+"""show_rollups: shows per day, city and genre
+
+Revision ID: 5b9e1d7c3a20
+Revises: 0a5d8e3c7b64
+Create Date: 2026-10-19 20:41:37.502918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9e1d7c3a20'
+down_revision = '0a5d8e3c7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('show_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('shows', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'state', 'city', 'genre')
+    )
+    op.create_index('ix_show_rollups_genre_day', 'show_rollups',
+                    ['genre', 'day'])
+
+    # the same counts as `flask rebuild-rollups` (rollups.py): every genre of
+    # the artist and '' for the totals
+    op.execute("""
+        INSERT INTO show_rollups (day, state, city, genre, shows)
+        SELECT date(shows.start_time), venues.state, venues.city,
+               genres.genre, count(*)
+        FROM shows
+        JOIN venues ON venues.id = shows.venue_id
+        JOIN artists ON artists.id = shows.artist_id
+        CROSS JOIN LATERAL (
+            SELECT DISTINCT trim(genre) AS genre
+            FROM unnest(string_to_array(artists.genres, ',') || ''::text) AS genre
+        ) AS genres
+        GROUP BY 1, 2, 3, 4""")
+
+
+def downgrade():
+    op.drop_index('ix_show_rollups_genre_day', table_name='show_rollups')
+    op.drop_table('show_rollups')
@@ -0,0 +1,37 @@
+"""search: pg_trgm indexes on the names and "city, state" of venues and artists
+
+Revision ID: 8e2b7c4d1f90
+Revises: 3c1f0a9d2e47
+Create Date: 2026-10-19 11:40:05.917233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b7c4d1f90'
+down_revision = '3c1f0a9d2e47'
+branch_labels = None
+depends_on = None
+
+# matching() of statements.py, the expressions must be the same
+INDEXES = [
+    ('ix_{}_name_trgm', 'name'),
+    ('ix_{}_city_state_trgm', "(city || ', ' || state)"),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        for name, expression in INDEXES:
+            op.create_index(name.format(table), table,
+                            [sa.text('{} gin_trgm_ops'.format(expression))],
+                            postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        for name, expression in INDEXES:
+            op.drop_index(name.format(table), table_name=table)
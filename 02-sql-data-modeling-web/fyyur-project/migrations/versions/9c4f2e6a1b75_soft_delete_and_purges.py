@@ -0,0 +1,40 @@
+"""venues, artists: deleted_at, purges: progress of the purges
+
+Revision ID: 9c4f2e6a1b75
+Revises: 5b9e1d7c3a20
+Create Date: 2026-10-19 21:33:05.268114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f2e6a1b75'
+down_revision = '5b9e1d7c3a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('artists', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table('purges',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('requested_at', sa.DateTime(), nullable=False),
+    sa.Column('shows_deleted', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('batches', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('kind', 'subject_id')
+    )
+
+
+def downgrade():
+    # the venues and artists still waiting for their purge are deleted, their
+    # shows with them (ondelete cascade)
+    op.execute('DELETE FROM venues WHERE deleted_at IS NOT NULL')
+    op.execute('DELETE FROM artists WHERE deleted_at IS NOT NULL')
+    op.drop_table('purges')
+    op.drop_column('artists', 'deleted_at')
+    op.drop_column('venues', 'deleted_at')
@@ -0,0 +1,44 @@
+"""shows: end time and exclusion constraints against double bookings
+
+Revision ID: b51d0e6a9c23
+Revises: 8e2b7c4d1f90
+Create Date: 2026-10-19 14:05:48.330912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b51d0e6a9c23'
+down_revision = '8e2b7c4d1f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the listed shows last SHOW_DURATION (models.py)
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute("UPDATE shows SET end_time = start_time + interval '2 hours'")
+    op.alter_column('shows', 'end_time', nullable=False)
+    op.create_check_constraint('ck_shows_duration', 'shows',
+                               'end_time > start_time')
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'])
+
+    # fails on the double bookings already listed, they have to be moved
+    # (or their end time shortened) first
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE shows ADD CONSTRAINT ex_shows_{0}_during '
+            'EXCLUDE USING gist ({0} WITH =, '
+            "tsrange(start_time, end_time, '[)') WITH &&)".format(column))
+
+
+def downgrade():
+    for column in ('venue_id', 'artist_id'):
+        op.drop_constraint('ex_shows_{}_during'.format(column), 'shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    op.drop_constraint('ck_shows_duration', 'shows', type_='check')
+    op.drop_column('shows', 'end_time')
@@ -0,0 +1,23 @@
+"""calendars: venues of a city
+
+Revision ID: d93a4f17b6e8
+Revises: b51d0e6a9c23
+Create Date: 2026-10-19 15:21:09.664051
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93a4f17b6e8'
+down_revision = 'b51d0e6a9c23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state_city', 'venues', ['state', 'city'])
+
+
+def downgrade():
+    op.drop_index('ix_venues_state_city', table_name='venues')
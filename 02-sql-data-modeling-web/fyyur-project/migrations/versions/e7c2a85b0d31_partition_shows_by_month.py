@@ -0,0 +1,131 @@
+"""shows: range partitioned by month of start_time
+
+Revision ID: e7c2a85b0d31
+Revises: d93a4f17b6e8
+Create Date: 2026-10-19 16:48:52.117640
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c2a85b0d31'
+down_revision = 'd93a4f17b6e8'
+branch_labels = None
+depends_on = None
+
+# months created ahead of the current one, `flask partition-shows` keeps
+# creating them afterwards (partitions.py)
+AHEAD = 12
+# months created before the current one (SHOWS_PARTITIONS_KEEP), the older
+# shows, a typo in 1900 as well as the real ones, stay in shows_default
+KEEP = 36
+
+EXCLUSION = (
+    'ALTER TABLE {0} ADD CONSTRAINT ex_{0}_{1}_during '
+    'EXCLUDE USING gist ({1} WITH =, '
+    "tsrange(start_time, end_time, '[)') WITH &&)")
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_month(month):
+    name = 'shows_y{:04d}m{:02d}'.format(month.year, month.month)
+    op.execute(
+        "CREATE TABLE {} PARTITION OF shows FOR VALUES FROM ('{}') TO ('{}')"
+        .format(name, month.isoformat(), add_months(month, 1).isoformat()))
+    for column in ('venue_id', 'artist_id'):
+        op.execute(EXCLUSION.format(name, column))
+
+
+def upgrade():
+    op.execute('ALTER TABLE shows RENAME TO shows_legacy')
+    op.execute('ALTER INDEX shows_pkey RENAME TO shows_legacy_pkey')
+    op.execute('ALTER TABLE shows_legacy DROP CONSTRAINT ex_shows_venue_id_during')
+    op.execute('ALTER TABLE shows_legacy DROP CONSTRAINT ex_shows_artist_id_during')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows_legacy')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows_legacy')
+
+    # the partition key is part of the primary key, the ids still come from
+    # the same sequence
+    op.execute("""
+        CREATE TABLE shows (
+            id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+            venue_id integer REFERENCES venues (id) ON DELETE CASCADE,
+            artist_id integer REFERENCES artists (id) ON DELETE CASCADE,
+            start_time timestamp without time zone NOT NULL,
+            end_time timestamp without time zone NOT NULL,
+            CONSTRAINT ck_shows_duration CHECK (end_time > start_time),
+            CONSTRAINT shows_pkey PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)""")
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'])
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'])
+
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+    for column in ('venue_id', 'artist_id'):
+        op.execute(EXCLUSION.format('shows_default', column))
+
+    today = date.today()
+    current = date(today.year, today.month, 1)
+    last = add_months(current, AHEAD)
+    first = op.get_bind().execute(
+        'SELECT min(start_time) FROM shows_legacy').scalar()
+    month = date(first.year, first.month, 1) if first else current
+    month = min(max(month, add_months(current, -KEEP)), current)
+    while month <= last:
+        create_month(month)
+        month = add_months(month, 1)
+
+    op.execute(
+        'INSERT INTO shows (id, venue_id, artist_id, start_time, end_time) '
+        'SELECT id, venue_id, artist_id, start_time, end_time '
+        'FROM shows_legacy')
+    op.drop_table('shows_legacy')
+
+
+def downgrade():
+    # the partitions detached to the archive schema are not brought back
+    op.execute('ALTER TABLE shows RENAME TO shows_partitioned')
+    op.execute('ALTER INDEX shows_pkey RENAME TO shows_partitioned_pkey')
+    op.drop_index('ix_shows_artist_id_start_time',
+                  table_name='shows_partitioned')
+    op.drop_index('ix_shows_venue_id_start_time',
+                  table_name='shows_partitioned')
+
+    op.create_table('shows',
+    sa.Column('id', sa.Integer(), nullable=False,
+              server_default=sa.text("nextval('shows_id_seq')")),
+    sa.Column('venue_id', sa.Integer(), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=True),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('end_time > start_time', name='ck_shows_duration'),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['venue_id'], ['venues.id'], ondelete='cascade'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    op.execute(
+        'INSERT INTO shows (id, venue_id, artist_id, start_time, end_time) '
+        'SELECT id, venue_id, artist_id, start_time, end_time '
+        'FROM shows_partitioned')
+    op.execute('DROP TABLE shows_partitioned CASCADE')
+
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'])
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'])
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE shows ADD CONSTRAINT ex_shows_{0}_during '
+            'EXCLUDE USING gist ({0} WITH =, '
+            "tsrange(start_time, end_time, '[)') WITH &&)".format(column))
@@ -0,0 +1,36 @@
+"""venues: coordinates and their spatial index
+
+Revision ID: f4a6c3e9d812
+Revises: e7c2a85b0d31
+Create Date: 2026-10-19 18:02:37.548201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a6c3e9d812'
+down_revision = 'e7c2a85b0d31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_venues_latitude_longitude', 'venues',
+                    ['latitude', 'longitude'])
+
+    # nearby() of geo.py, earth_box() @> ll_to_earth() uses this index
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+    op.execute('CREATE INDEX ix_venues_earth ON venues '
+               'USING gist (ll_to_earth(latitude, longitude))')
+
+
+def downgrade():
+    op.drop_index('ix_venues_earth', table_name='venues')
+    op.drop_index('ix_venues_latitude_longitude', table_name='venues')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
@@ -8,14 +8,41 @@
 # source: https://stackoverflow.com/questions/38654624/flask-sqlalchemy-many-to-many-relationship-new-attribute
 # SQLAlchemy docs about Association Object: https://docs.sqlalchemy.org/en/14/orm/basic_relationships.html#association-object
 #----------------------------------------------------------------------------#
-from config import *
+from collections import namedtuple
+from datetime import timedelta
+from flask_sqlalchemy import SQLAlchemy
 
+# the request is committed once and its session removed before the template
+# is rendered (unit_of_work.py), the instances keep their loaded state
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+# a show lasts SHOW_DURATION unless its end is given, and SHOW_MAX_DURATION at
+# most: the overlap checks of scheduling.py scan that far back
+SHOW_DURATION = timedelta(hours=2)
+SHOW_MAX_DURATION = timedelta(hours=12)
+
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + SHOW_DURATION
+
+# on Postgres shows is partitioned by month of start_time (migrations,
+# partitions.py), its primary key is (id, start_time)
 class Show(db.Model):
     __tablename__ = 'shows'
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete="cascade"))
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete="cascade"))
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+
+    # the shows of an artist and of a venue by time (artist pages,
+    # upcoming_shows_count, overlaps), the exclusion constraints refusing
+    # double bookings are in the migrations (Postgres only)
+    __table_args__ = (
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.CheckConstraint('end_time > start_time', name='ck_shows_duration'),
+    )
 
     venue = db.relationship("Venue", back_populates="artists")
     artist = db.relationship("Artist", back_populates="venues")
@@ -39,8 +66,21 @@ class Venue(db.Model):
 
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500), nullable=True)
+    # filled by `flask geocode-venues` (geo.py)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    # set by a delete, the venue is hidden until `flask purge-deleted` removes
+    # it with its past shows (purges.py)
+    deleted_at = db.Column(db.DateTime, nullable=True)
     artists = db.relationship("Show", back_populates="venue", lazy="dynamic")
 
+    # the venues of a city (city calendars) and around a point (nearby
+    # venues, the GiST index of Postgres is in the migrations)
+    __table_args__ = (
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_latitude_longitude', 'latitude', 'longitude'),
+    )
+
     def __repr__(self):
         return f'<Venue {self.id} | {self.city} | {self.state} | {self.name} | {self.genres} | {self.seeking_talent}>'
 
@@ -61,7 +101,99 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500), nullable=True)
 
+    # denormalized for the listing sorted by upcoming shows, counted again
+    # when a show is listed and by `flask refresh-upcoming` (statements.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    # set by a delete, the artist is hidden until `flask purge-deleted`
+    # removes it with its past shows (purges.py)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
     venues = db.relationship("Show", back_populates="artist", lazy="dynamic")
 
+    # the keyset orders and the filters of the listing (see statements.py),
+    # the genres have a GIN index on Postgres (migrations)
+    __table_args__ = (
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_upcoming_shows_count_id',
+                 'upcoming_shows_count', 'id'),
+        db.Index('ix_artists_state_city', 'state', 'city'),
+    )
+
     def __repr__(self):
         return f'<Artist {self.id} | {self.name}>'
+
+# the top-K neighbours precomputed by `flask build-recommendations`
+# (recommendations.py), a kind per panel:
+#   artist_artist  similar artists of an artist
+#   artist_venue   venues that book artists like the artist
+#   venue_venue    similar venues of a venue
+# object_id is an artist or a venue id depending on the kind, the rows of a
+# deleted artist or venue are skipped by recommended() until the next build
+class Recommendation(db.Model):
+    __tablename__ = 'recommendations'
+
+    kind = db.Column(db.String(20), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    object_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<Recommendation {self.kind} | {self.subject_id} | {self.rank} | {self.object_id}>'
+
+# the number of shows per day, city of the venue and genre of the artist,
+# kept up to date with the shows and rebuilt by `flask rebuild-rollups`
+# (rollups.py). A show counts once per genre and once under the genre ''
+# (every genre), the totals of the /stats page
+class ShowRollup(db.Model):
+    __tablename__ = 'show_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+    # the days of a genre (primary key: the days of every genre)
+    __table_args__ = (
+        db.Index('ix_show_rollups_genre_day', 'genre', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<ShowRollup {self.day} | {self.city} | {self.state} | {self.genre} | {self.shows}>'
+
+# a deleted venue or artist waiting for `flask purge-deleted` (purges.py),
+# the progress of the purge is committed with every batch of shows deleted
+class Purge(db.Model):
+    __tablename__ = 'purges'
+
+    kind = db.Column(db.String(20), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    requested_at = db.Column(db.DateTime, nullable=False)
+    shows_deleted = db.Column(db.Integer, nullable=False, default=0,
+                              server_default='0')
+    batches = db.Column(db.Integer, nullable=False, default=0,
+                        server_default='0')
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Purge {self.kind} | {self.subject_id} | {self.shows_deleted} | {self.finished_at}>'
+
+# the versions of the cached page fragments (fragments.py), shared by the
+# workers: a row per venue or artist (kind, id) and per kind (subject_id 0),
+# bumped in the transaction of every change they invalidate
+class FragmentVersion(db.Model):
+    __tablename__ = 'fragment_versions'
+
+    kind = db.Column(db.String(20), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<FragmentVersion {self.kind} | {self.subject_id} | {self.version}>'
+
+# light records for the listing pages, only the columns the templates render
+# are selected so the long descriptions are never loaded
+ArtistSummary = namedtuple('ArtistSummary', [
+    'id', 'name', 'city', 'state', 'num_upcoming_shows'])
@@ -0,0 +1,133 @@
+#----------------------------------------------------------------------------#
+# Show partitions
+# on Postgres `shows` is range partitioned by month of start_time (see the
+# migrations): shows_y2035m01 holds [2035-01-01, 2035-02-01), shows_default
+# whatever falls outside of the created months. The queries bounded on
+# start_time (upcoming shows, calendars, overlaps) only scan the partitions
+# of their range. `flask partition-shows` keeps the months ahead created and
+# detaches the old ones, moved to the archive schema (or dropped):
+#
+#   flask partition-shows --ahead 12 --keep 36
+#
+# The double bookings are refused per partition by the exclusion constraints
+# of every month, a show crossing midnight at the end of a month is only
+# checked by scheduling.py.
+#----------------------------------------------------------------------------#
+import re
+from datetime import date
+
+PARENT = 'shows'
+DEFAULT = 'shows_default'
+NAME = re.compile(r'^shows_y(\d{4})m(\d{2})$')
+ARCHIVE_SCHEMA = 'archive'
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'shows_y{:04d}m{:02d}'.format(month.year, month.month)
+
+
+def partition_month(name):
+    match = NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+'''
+plan(existing, today, ahead, keep)
+    the months to create (the current one and `ahead` after it) and the
+    partitions to detach (ending `keep` months or more before the current
+    one, 0 keeps everything) given the names of the existing partitions
+'''
+
+
+def plan(existing, today, ahead, keep):
+    current = date(today.year, today.month, 1)
+    months = {partition_month(name) for name in existing} - {None}
+
+    create = [month for month in (add_months(current, offset)
+                                  for offset in range(ahead + 1))
+              if month not in months]
+    detach = []
+    if keep:
+        oldest = add_months(current, -keep)
+        detach = [partition_name(month) for month in sorted(months)
+                  if month < oldest]
+
+    return create, detach
+
+
+def existing_partitions(connection):
+    return [name for name, in connection.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = %s", (PARENT,))]
+
+
+'''
+create_partition(connection, month)
+    creates the partition of the month with its exclusion constraints, the
+    shows of the month waiting in the default partition are moved into it
+'''
+
+
+def create_partition(connection, month):
+    name = partition_name(month)
+    bounds = (month.isoformat(), add_months(month, 1).isoformat())
+
+    connection.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+        PARENT, DEFAULT))
+    connection.execute(
+        "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')"
+        .format(name, PARENT, *bounds))
+    for column in ('venue_id', 'artist_id'):
+        connection.execute(
+            'ALTER TABLE {0} ADD CONSTRAINT ex_{0}_{1}_during '
+            'EXCLUDE USING gist ({1} WITH =, '
+            "tsrange(start_time, end_time, '[)') WITH &&)".format(name, column))
+    connection.execute(
+        'WITH moved AS (DELETE FROM {} WHERE start_time >= %s '
+        'AND start_time < %s RETURNING *) '
+        'INSERT INTO {} SELECT * FROM moved'.format(DEFAULT, PARENT), bounds)
+    connection.execute('ALTER TABLE {} ATTACH PARTITION {} DEFAULT'.format(
+        PARENT, DEFAULT))
+
+
+def detach_partition(connection, name, archive_schema=ARCHIVE_SCHEMA):
+    connection.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+        PARENT, name))
+    if archive_schema is None:
+        connection.execute('DROP TABLE {}'.format(name))
+    else:
+        connection.execute('CREATE SCHEMA IF NOT EXISTS {}'.format(
+            archive_schema))
+        connection.execute('ALTER TABLE {} SET SCHEMA {}'.format(
+            name, archive_schema))
+
+
+'''
+maintain(engine, today, ahead=12, keep=36, archive_schema=ARCHIVE_SCHEMA)
+    applies the plan in one transaction, returns the created months and the
+    detached partitions. archive_schema None drops the detached partitions
+'''
+
+
+def maintain(engine, today, ahead=12, keep=36, archive_schema=ARCHIVE_SCHEMA):
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError('shows is only partitioned on Postgres')
+
+    with engine.begin() as connection:
+        create, detach = plan(existing_partitions(connection), today,
+                              ahead, keep)
+        for month in create:
+            create_partition(connection, month)
+        for name in detach:
+            detach_partition(connection, name, archive_schema)
+
+    return create, detach
@@ -0,0 +1,112 @@
+#----------------------------------------------------------------------------#
+# Purges
+# deleting a venue or an artist only hides it (deleted_at) and cancels its
+# upcoming shows, a handful read from the (venue_id, start_time) or
+# (artist_id, start_time) index, and records a purge. Its past shows, years
+# of them for an old venue, are deleted afterwards by
+#
+#   flask purge-deleted --batch-size 1000
+#
+# a batch of shows per transaction, the venue or artist row last once it has
+# no show left. The progress of a purge (shows deleted, batches) is
+# committed with each batch: an interrupted run starts again from the shows
+# left, and on Postgres concurrent runs skip the purges locked by another.
+#----------------------------------------------------------------------------#
+import time
+from datetime import datetime
+
+from models import db, Artist, Purge, Show, Venue
+import rollups
+
+PURGE_BATCH_SIZE = 1000
+
+# the model and the shows column of every kind of purge
+KINDS = {
+    'venue': (Venue, Show.venue_id),
+    'artist': (Artist, Show.artist_id),
+}
+
+
+'''
+soft_delete(kind, subject_id, now)
+    hides the venue or artist (kind), deletes its shows after now and
+    records its purge, in the current transaction. Returns the number of
+    shows cancelled
+'''
+
+
+def soft_delete(kind, subject_id, now):
+    model, shows = KINDS[kind]
+    model.query.filter_by(id=subject_id).update(
+        {model.deleted_at: now}, synchronize_session=False)
+
+    upcoming = (shows == subject_id, Show.start_time > now)
+    with rollups.tracking(*upcoming):
+        cancelled = Show.query.filter(*upcoming) \
+            .delete(synchronize_session=False)
+    db.session.add(Purge(kind=kind, subject_id=subject_id, requested_at=now))
+    db.session.flush()
+    return cancelled
+
+
+'''
+purge_batch(purge, now, batch_size=PURGE_BATCH_SIZE)
+    deletes the next batch of shows of the purge, or the venue or artist
+    once none is left, and commits with the progress. Returns the number of
+    shows deleted
+'''
+
+
+def purge_batch(purge, now, batch_size=PURGE_BATCH_SIZE):
+    model, shows = KINDS[purge.kind]
+    ids = [id for id, in db.session.query(Show.id)
+           .filter(shows == purge.subject_id)
+           .order_by(Show.id).limit(batch_size)]
+
+    if ids:
+        batch = Show.id.in_(ids)
+        with rollups.tracking(batch):
+            deleted = Show.query.filter(batch) \
+                .delete(synchronize_session=False)
+        purge.shows_deleted += deleted
+        purge.batches += 1
+    else:
+        deleted = 0
+        model.query.filter_by(id=purge.subject_id) \
+            .delete(synchronize_session=False)
+        purge.finished_at = now
+
+    db.session.commit()
+    return deleted
+
+
+def pending():
+    return Purge.query.filter(Purge.finished_at.is_(None)) \
+        .order_by(Purge.requested_at, Purge.kind, Purge.subject_id) \
+        .with_for_update(skip_locked=True).first()
+
+
+'''
+run(batch_size=PURGE_BATCH_SIZE, max_batches=None, pause=0)
+    purges the deleted venues and artists, oldest first, until none is left
+    or after max_batches batches, sleeping pause seconds between two. Returns
+    the number of purges finished and of shows deleted
+'''
+
+
+def run(batch_size=PURGE_BATCH_SIZE, max_batches=None, pause=0):
+    batches = finished = deleted = 0
+    while max_batches is None or batches < max_batches:
+        if batches and pause:
+            time.sleep(pause)
+        purge = pending()
+        if purge is None:
+            db.session.rollback()
+            break
+
+        deleted += purge_batch(purge, datetime.now(), batch_size)
+        if purge.finished_at is not None:
+            finished += 1
+        batches += 1
+
+    return finished, deleted
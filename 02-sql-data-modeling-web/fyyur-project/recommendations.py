@@ -0,0 +1,218 @@
+#----------------------------------------------------------------------------#
+# Recommendations
+# the shows make a sparse artist x venue matrix (1 + log of the number of
+# shows of the artist at the venue), read in one grouped pass. A batch job
+# (`flask build-recommendations`, nightly) computes from it:
+#   - the cosine similarity of the artists (rows) and of the venues (columns)
+#   - the venues that book artists like an artist: the venues of its top-K
+#     similar artists weighted by their similarity, minus its own venues
+# and stores the top-K of every artist and venue in `recommendations`, the
+# artist and venue pages only read that table. NumPy/SciPy sparse matrices
+# are used when installed, the same computation in plain Python otherwise.
+#----------------------------------------------------------------------------#
+import heapq
+import math
+from collections import defaultdict
+
+from sqlalchemy import func
+
+from models import db, Recommendation, Show
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:  # numpy and scipy are optional, fallback to plain Python
+    numpy = sparse = None
+
+TOP_K = 10
+INSERT_BATCH_SIZE = 5000
+# scores are compared rounded, both engines rank the ties the same way
+PRECISION = 9
+
+
+def plays():
+    rows = db.session.query(
+        Show.artist_id, Show.venue_id, func.count(Show.id)) \
+        .filter(Show.artist_id.isnot(None), Show.venue_id.isnot(None)) \
+        .group_by(Show.artist_id, Show.venue_id)
+    return [(artist_id, venue_id, 1.0 + math.log(count))
+            for artist_id, venue_id, count in rows]
+
+
+def _ranked(scores, top_k):
+    return heapq.nlargest(top_k, ((id, round(score, PRECISION))
+                                  for id, score in scores.items()),
+                          key=lambda item: (item[1], -item[0]))
+
+
+'''
+Plain Python engine, the vectors are dicts and the co-occurrences come from
+an inverted index (the artists of a venue, the venues of an artist)
+'''
+
+
+def _cosine_neighbours(vectors, top_k):
+    norms = {id: math.sqrt(sum(w * w for w in vector.values()))
+             for id, vector in vectors.items()}
+    index = defaultdict(list)
+    for id, vector in vectors.items():
+        for feature, w in vector.items():
+            index[feature].append((id, w))
+
+    neighbours = {}
+    for id, vector in vectors.items():
+        dots = defaultdict(float)
+        for feature, w in vector.items():
+            for other, other_w in index[feature]:
+                if other != id:
+                    dots[other] += w * other_w
+        neighbours[id] = _ranked({
+            other: dot / (norms[id] * norms[other])
+            for other, dot in dots.items()}, top_k)
+    return neighbours
+
+
+def _compute_python(plays, top_k):
+    artists = defaultdict(dict)
+    venues = defaultdict(dict)
+    for artist_id, venue_id, w in plays:
+        artists[artist_id][venue_id] = w
+        venues[venue_id][artist_id] = w
+
+    similar_artists = _cosine_neighbours(artists, top_k)
+    artist_venues = {}
+    for artist_id, similar in similar_artists.items():
+        scores = defaultdict(float)
+        for other, similarity in similar:
+            for venue_id, w in artists[other].items():
+                if venue_id not in artists[artist_id]:
+                    scores[venue_id] += similarity * w
+        artist_venues[artist_id] = _ranked(scores, top_k)
+
+    return {
+        'artist_artist': similar_artists,
+        'artist_venue': artist_venues,
+        'venue_venue': _cosine_neighbours(venues, top_k),
+    }
+
+
+'''
+NumPy/SciPy engine, the same computation on CSR matrices
+'''
+
+
+def _cosine(matrix):
+    norms = numpy.sqrt(numpy.asarray(matrix.multiply(matrix).sum(axis=1))
+                       .ravel())
+    normalized = sparse.diags(1.0 / norms) @ matrix
+    similarity = (normalized @ normalized.T).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    return similarity
+
+
+def _top_rows(matrix, ids, top_k):
+    rows = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns = ids[matrix.indices[start:end]]
+        scores = numpy.round(matrix.data[start:end], PRECISION)
+        order = numpy.lexsort((columns, -scores))[:top_k]
+        rows.append([(int(columns[i]), float(scores[i])) for i in order])
+    return rows
+
+
+def _compute_sparse(plays, top_k):
+    artist_ids = numpy.array(sorted({play[0] for play in plays}))
+    venue_ids = numpy.array(sorted({play[1] for play in plays}))
+    artist_index = {id: index for index, id in enumerate(artist_ids)}
+    venue_index = {id: index for index, id in enumerate(venue_ids)}
+
+    matrix = sparse.csr_matrix((
+        [w for _, _, w in plays],
+        ([artist_index[artist_id] for artist_id, _, _ in plays],
+         [venue_index[venue_id] for _, venue_id, _ in plays])),
+        shape=(len(artist_ids), len(venue_ids)))
+
+    similar = _top_rows(_cosine(matrix), artist_ids, top_k)
+    # the top-K similar artists as a matrix, times their venues
+    top = sparse.csr_matrix((
+        [score for row in similar for _, score in row],
+        ([index for index, row in enumerate(similar) for _ in row],
+         [artist_index[id] for row in similar for id, _ in row])),
+        shape=(len(artist_ids), len(artist_ids)))
+    scores = (top @ matrix).tocsr()
+    scores = (scores - scores.multiply(matrix > 0)).tocsr()
+    scores.eliminate_zeros()
+
+    return {
+        'artist_artist': dict(zip(artist_ids.tolist(), similar)),
+        'artist_venue': dict(zip(artist_ids.tolist(),
+                                 _top_rows(scores, venue_ids, top_k))),
+        'venue_venue': dict(zip(venue_ids.tolist(), _top_rows(
+            _cosine(matrix.T.tocsr()), venue_ids, top_k))),
+    }
+
+
+'''
+compute(plays, top_k=TOP_K, engine=None)
+    {kind: {subject id: [(object id, score), ...]}} of the plays, engine is
+    'scipy' or 'python' (the fastest available by default)
+'''
+
+
+def compute(plays, top_k=TOP_K, engine=None):
+    if engine is None:
+        engine = 'python' if sparse is None else 'scipy'
+    if not plays:
+        return {kind: {} for kind in ('artist_artist', 'artist_venue',
+                                      'venue_venue')}
+    if engine == 'scipy':
+        return _compute_sparse(plays, top_k)
+    return _compute_python(plays, top_k)
+
+
+def store(neighbours):
+    counts = {}
+    for kind, subjects in neighbours.items():
+        Recommendation.query.filter_by(kind=kind).delete()
+        rows = [{'kind': kind, 'subject_id': subject_id, 'rank': rank,
+                 'object_id': object_id, 'score': score}
+                for subject_id, items in subjects.items()
+                for rank, (object_id, score) in enumerate(items, 1)]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            db.session.bulk_insert_mappings(
+                Recommendation, rows[start:start + INSERT_BATCH_SIZE])
+        counts[kind] = len(rows)
+
+    db.session.flush()
+    return counts
+
+
+'''
+build(top_k=TOP_K, engine=None)
+    recomputes and replaces every recommendation in the current transaction,
+    the pages keep reading the previous ones until it commits. Returns the
+    number of rows stored per kind
+'''
+
+
+def build(top_k=TOP_K, engine=None):
+    return store(compute(plays(), top_k, engine))
+
+
+'''
+recommended(kind, subject_id, model)
+    the (id, name, image_link, score) of the artists or venues (model)
+    recommended to the subject, best first
+'''
+
+
+def recommended(kind, subject_id, model):
+    return db.session.query(
+        model.id, model.name, model.image_link, Recommendation.score) \
+        .join(Recommendation, Recommendation.object_id == model.id) \
+        .filter(Recommendation.kind == kind,
+                Recommendation.subject_id == subject_id,
+                model.deleted_at.is_(None)) \
+        .order_by(Recommendation.rank).all()
@@ -0,0 +1,212 @@
+#----------------------------------------------------------------------------#
+# Rollups
+# the shows per day, city and genre (show_rollups), the /stats page reads
+# nothing else. The genres of the artist are split here, once per change
+# instead of once per page. They are kept up to date in the transaction of
+# every change of the shows they count: a listed show adds 1 to the rows of
+# its day, city and genres (record()), the other changes are wrapped in
+#
+#   with tracking(venue_id=venue_id):
+#       venue.city = city
+#
+# which counts the shows of the venue before and after the block and applies
+# the difference (the shows cancelled or purged with a deleted venue or
+# artist, an edited city or genres). `flask rebuild-rollups` recomputes them
+# from the shows still attached (run it nightly), the months detached by
+# `flask partition-shows` keep their rollups.
+#----------------------------------------------------------------------------#
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import Date, func
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Artist, Show, ShowRollup, Venue
+import partitions
+
+# the genre of the totals, a show counts once under it
+ALL_GENRES = ''
+STATS_TOP = 10
+
+
+def split_genres(genres):
+    return sorted({genre.strip() for genre in (genres or '').split(',')}
+                  - {ALL_GENRES})
+
+
+'''
+counts(*criteria, **where)
+    Counter {(day, state, city, genre): shows} of the shows matching the
+    criteria and where (Show columns), every genre and ALL_GENRES. The shows
+    of the deleted venues and artists count until they are purged
+'''
+
+
+def counts(*criteria, **where):
+    day = func.date(Show.start_time, type_=Date)
+    query = db.session.query(
+        day, Venue.state, Venue.city, Artist.genres, func.count(Show.id)) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(*criteria) \
+        .filter(*[getattr(Show, name) == value
+                  for name, value in where.items()]) \
+        .group_by(day, Venue.state, Venue.city, Artist.genres)
+
+    rollups = Counter()
+    for day, state, city, genres, shows in query:
+        for genre in [ALL_GENRES] + split_genres(genres):
+            rollups[(day, state, city, genre)] += shows
+    return rollups
+
+
+'''
+apply(deltas)
+    adds the {(day, state, city, genre): shows} deltas to the rollups, the
+    rows left at 0 are deleted
+'''
+
+
+def apply(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        statement = insert(ShowRollup.__table__).values([
+            {'day': day, 'state': state, 'city': city, 'genre': genre,
+             'shows': delta}
+            for (day, state, city, genre), delta in deltas.items()])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['day', 'state', 'city', 'genre'],
+            set_={'shows': ShowRollup.shows + statement.excluded.shows}))
+    else:
+        for (day, state, city, genre), delta in deltas.items():
+            updated = ShowRollup.query.filter_by(
+                day=day, state=state, city=city, genre=genre) \
+                .update({ShowRollup.shows: ShowRollup.shows + delta},
+                        synchronize_session=False)
+            if not updated:
+                db.session.bulk_insert_mappings(ShowRollup, [{
+                    'day': day, 'state': state, 'city': city,
+                    'genre': genre, 'shows': delta}])
+
+    ShowRollup.query.filter(
+        ShowRollup.day.in_({day for day, _, _, _ in deltas}),
+        ShowRollup.shows <= 0).delete(synchronize_session=False)
+
+
+'''
+record(start_time, venue_id, artist_id, shows=1)
+    adds shows to the rows of the day, the city of the venue and the genres
+    of the artist, two lookups by primary key whatever their history
+'''
+
+
+def record(start_time, venue_id, artist_id, shows=1):
+    state, city = db.session.query(Venue.state, Venue.city) \
+        .filter(Venue.id == venue_id).one()
+    genres, = db.session.query(Artist.genres) \
+        .filter(Artist.id == artist_id).one()
+    apply({(start_time.date(), state, city, genre): shows
+           for genre in [ALL_GENRES] + split_genres(genres)})
+
+
+@contextmanager
+def tracking(*criteria, **where):
+    before = counts(*criteria, **where)
+    yield
+    deltas = counts(*criteria, **where)
+    deltas.subtract(before)
+    apply(deltas)
+
+
+'''
+attached_since()
+    the first day of the shows still in the database: the month of the
+    oldest partition of shows on Postgres, the older ones were detached by
+    `flask partition-shows`. None when nothing is detached (SQLite, shows not
+    partitioned)
+'''
+
+
+def attached_since():
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return None
+    months = [partitions.partition_month(name) for name in
+              partitions.existing_partitions(db.session.connection())]
+    months = [month for month in months if month is not None]
+    return min(months) if months else None
+
+
+'''
+rebuild(since=None)
+    replaces the rollups from the day since (all of them by default) by the
+    counts of the shows in the current transaction, the older rollups are
+    kept. Returns the number of rows
+'''
+
+
+def rebuild(since=None):
+    rollups = ShowRollup.query
+    criteria = []
+    if since is not None:
+        rollups = rollups.filter(ShowRollup.day >= since)
+        criteria.append(Show.start_time >= datetime.combine(
+            since, datetime.min.time()))
+    rollups.delete(synchronize_session=False)
+
+    rows = [{'day': day, 'state': state, 'city': city, 'genre': genre,
+             'shows': shows}
+            for (day, state, city, genre), shows in counts(*criteria).items()]
+    db.session.bulk_insert_mappings(ShowRollup, rows)
+    db.session.flush()
+    return len(rows)
+
+
+'''
+stats(year, genre=None, state=None, city=None, top=STATS_TOP)
+    the shows of the year per month, its top genres and top cities, read
+    from the rollups. genre narrows the months and the cities, state and
+    city narrow everything
+'''
+
+
+def stats(year, genre=None, state=None, city=None, top=STATS_TOP):
+    shows = func.sum(ShowRollup.shows)
+
+    def rollups(*columns):
+        query = db.session.query(*columns, shows).filter(
+            ShowRollup.day >= date(year, 1, 1),
+            ShowRollup.day < date(year + 1, 1, 1))
+        if state:
+            query = query.filter(ShowRollup.state == state)
+        if city:
+            query = query.filter(ShowRollup.city == city)
+        return query
+
+    totals = ShowRollup.genre == (genre or ALL_GENRES)
+    months = defaultdict(int)
+    for day, count in rollups(ShowRollup.day).filter(totals) \
+            .group_by(ShowRollup.day):
+        months[day.month] += count
+
+    genres = rollups(ShowRollup.genre) \
+        .filter(ShowRollup.genre != ALL_GENRES) \
+        .group_by(ShowRollup.genre) \
+        .order_by(shows.desc(), ShowRollup.genre).limit(top)
+    cities = rollups(ShowRollup.state, ShowRollup.city).filter(totals) \
+        .group_by(ShowRollup.state, ShowRollup.city) \
+        .order_by(shows.desc(), ShowRollup.state, ShowRollup.city).limit(top)
+
+    return {
+        "year": year,
+        "shows": sum(months.values()),
+        "months": [{"month": "{:04d}-{:02d}".format(year, month),
+                    "shows": months[month]} for month in range(1, 13)],
+        "genres": [{"genre": name, "shows": count}
+                   for name, count in genres],
+        "cities": [{"city": name, "state": area, "shows": count}
+                   for area, name, count in cities],
+    }
@@ -0,0 +1,88 @@
+#----------------------------------------------------------------------------#
+# Scheduling
+# a venue hosts one show at a time and an artist plays one show at a time.
+# A show overlapping [start, end) starts before end and at most
+# SHOW_MAX_DURATION before start: the overlaps are a bounded range scan of the
+# (venue_id, start_time) or (artist_id, start_time) index instead of every
+# show of the venue or artist. On Postgres the exclusion constraints of the
+# migrations (GiST over tsrange, btree_gist) also refuse the double bookings
+# two concurrent requests would both miss.
+#----------------------------------------------------------------------------#
+from datetime import timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Show, SHOW_DURATION, SHOW_MAX_DURATION
+
+# SQLSTATE of an exclusion constraint violation
+EXCLUSION_VIOLATION = '23P01'
+# the longest range an availability request may ask for
+AVAILABILITY_MAX_RANGE = timedelta(days=92)
+
+
+class DoubleBooking(Exception):
+    def __init__(self, show=None):
+        super().__init__(show)
+        self.show = show
+
+
+def overlaps(column, id, start, end):
+    return db.session.query(Show).filter(
+        column == id,
+        Show.start_time > start - SHOW_MAX_DURATION,
+        Show.start_time < end,
+        Show.end_time > start)
+
+
+'''
+book(artist_id, venue_id, start, duration=SHOW_DURATION)
+    adds the show, DoubleBooking (with the show in the way when known) if
+    the venue or the artist is already booked at that time
+'''
+
+
+def book(artist_id, venue_id, start, duration=SHOW_DURATION):
+    if not timedelta(0) < duration <= SHOW_MAX_DURATION:
+        raise ValueError('a show lasts up to {}'.format(SHOW_MAX_DURATION))
+
+    end = start + duration
+    for column, id in ((Show.venue_id, venue_id), (Show.artist_id, artist_id)):
+        show = overlaps(column, id, start, end).order_by(Show.start_time).first()
+        if show is not None:
+            raise DoubleBooking(show)
+
+    show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start,
+                end_time=end)
+    db.session.add(show)
+    try:
+        db.session.flush()
+    except IntegrityError as error:
+        if getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION:
+            raise DoubleBooking() from error
+        raise
+
+    return show
+
+
+'''
+free_slots(venue_id, start, end, min_duration=SHOW_DURATION)
+    the (start, end) slots of at least min_duration in [start, end) during
+    which the venue has no show
+'''
+
+
+def free_slots(venue_id, start, end, min_duration=SHOW_DURATION):
+    shows = overlaps(Show.venue_id, venue_id, start, end) \
+        .with_entities(Show.start_time, Show.end_time) \
+        .order_by(Show.start_time)
+
+    slots = []
+    free = start
+    for show_start, show_end in shows:
+        if show_start - free >= min_duration:
+            slots.append((free, show_start))
+        free = max(free, show_end)
+    if end - free >= min_duration:
+        slots.append((free, end))
+
+    return slots
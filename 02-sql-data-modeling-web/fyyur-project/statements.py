@@ -0,0 +1,279 @@
+#----------------------------------------------------------------------------#
+# Statements
+# the queries of the hottest pages are baked queries: the Query object is
+# built and its SQL compiled once per process (the cache key is the code of
+# the lambdas), a request only binds its parameters with bindparam
+#----------------------------------------------------------------------------#
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+
+from flask_sqlalchemy import Pagination
+from sqlalchemy import Boolean, String, and_, bindparam, func, literal, or_, \
+    select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.ext import baked
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from models import db, Venue, Artist, Show, ArtistSummary
+
+bakery = baked.bakery()
+
+ARTISTS_PER_PAGE = 50
+ARTIST_SORTS = ('name', 'upcoming')
+SEARCH_PER_PAGE = 20
+
+
+# every venue with its number of upcoming shows in a single grouped query,
+# instead of one query per city and one count per venue
+def venue_areas(now):
+    venues = bakery(lambda session: session.query(
+        Venue.city, Venue.state, Venue.id, Venue.name, func.count(Show.id)))
+    venues += lambda query: query.outerjoin(Show, and_(
+        Show.venue_id == Venue.id, Show.start_time > bindparam('now'))) \
+        .filter(Venue.deleted_at.is_(None)) \
+        .group_by(Venue.id, Venue.city, Venue.state, Venue.name) \
+        .order_by(Venue.state, Venue.city, Venue.id)
+
+    rows = venues(db.session()).params(now=now)
+    return [{
+        "city": city,
+        "state": state,
+        "venues": [{
+            "id": venue_id,
+            "name": name,
+            "num_upcoming_shows": num_upcoming_shows
+        } for _, _, venue_id, name, num_upcoming_shows in area]
+    } for (city, state), area in groupby(rows, key=lambda row: row[:2])]
+
+
+#----------------------------------------------------------------------------#
+# Artists listing
+# keyset (cursor) pagination: a page starts after the sort key of the last
+# artist of the previous one, read from the (name, id) or the
+# (upcoming_shows_count, id) index, so every page costs the same whatever
+# its depth. The cursor is the sort key, base64 encoded.
+#----------------------------------------------------------------------------#
+
+# the genres are stored comma separated ("Jazz,Reggae"), matched as an array
+# on Postgres (GIN index of the migrations) and as a delimited LIKE elsewhere
+class genres_contain(FunctionElement):
+    type = Boolean()
+    name = 'genres_contain'
+
+
+@compiles(genres_contain)
+def _genres_contain(element, compiler, **kw):
+    genres, genre = element.clauses
+    return compiler.process(
+        (literal(',') + genres + literal(',')).like(
+            literal('%,') + genre + literal(',%')), **kw)
+
+
+@compiles(genres_contain, 'postgresql')
+def _genres_contain_postgresql(element, compiler, **kw):
+    genres, genre = element.clauses
+    return compiler.process(
+        func.string_to_array(genres, ',', type_=ARRAY(String)).contains(
+            array([genre])), **kw)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+# the sort key of a cursor is the artist name (sort='name') or its count of
+# upcoming shows (sort='upcoming'), bool is rejected although it is an int
+def decode_cursor(cursor, sort='name'):
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('invalid cursor {!r}'.format(cursor))
+    key_type = int if sort == 'upcoming' else str
+    if not all(isinstance(item, item_type) and not isinstance(item, bool)
+               for item, item_type in ((value, key_type), (id, int))):
+        raise ValueError('invalid cursor {!r}'.format(cursor))
+    return value, id
+
+
+'''
+artists_page(sort='name', cursor=None, per_page=ARTISTS_PER_PAGE, city=None,
+             state=None, genre=None)
+    the ArtistSummary rows of a page and the cursor of the next one (None on
+    the last page). sort is 'name' (A to Z) or 'upcoming' (most upcoming
+    shows first), ValueError on an invalid cursor
+'''
+
+
+def artists_page(sort='name', cursor=None, per_page=ARTISTS_PER_PAGE,
+                 city=None, state=None, genre=None):
+    artists = bakery(lambda session: session.query(
+        Artist.id, Artist.name, Artist.city, Artist.state,
+        Artist.upcoming_shows_count)
+        .filter(Artist.deleted_at.is_(None)))
+    if city:
+        artists += lambda query: query.filter(Artist.city == bindparam('city'))
+    if state:
+        artists += lambda query: query.filter(
+            Artist.state == bindparam('state'))
+    if genre:
+        artists += lambda query: query.filter(
+            genres_contain(Artist.genres, bindparam('genre')))
+
+    params = {'city': city, 'state': state, 'genre': genre}
+    if cursor is not None:
+        params['after'], params['after_id'] = decode_cursor(cursor, sort)
+
+    if sort == 'upcoming':
+        if cursor is not None:
+            artists += lambda query: query.filter(
+                tuple_(Artist.upcoming_shows_count, Artist.id) <
+                tuple_(bindparam('after'), bindparam('after_id')))
+        artists += lambda query: query.order_by(
+            Artist.upcoming_shows_count.desc(), Artist.id.desc())
+    else:
+        if cursor is not None:
+            artists += lambda query: query.filter(
+                tuple_(Artist.name, Artist.id) >
+                tuple_(bindparam('after'), bindparam('after_id')))
+        artists += lambda query: query.order_by(Artist.name, Artist.id)
+
+    # one more row tells whether there is a next page
+    artists += lambda query: query.limit(bindparam('limit'))
+    params['limit'] = per_page + 1
+
+    rows = [ArtistSummary._make(row)
+            for row in artists(db.session()).params(**params)]
+    if len(rows) <= per_page:
+        return rows, None
+
+    rows = rows[:per_page]
+    last = rows[-1]
+    key = last.num_upcoming_shows if sort == 'upcoming' else last.name
+    return rows, encode_cursor([key, last.id])
+
+
+'''
+refresh_upcoming_counts(now, artist_ids=None)
+    counts again the upcoming shows of the artists (all of them by default)
+    and only writes the counts that changed, returns the number of artists
+    updated. The shows that started since the last run are no longer
+    upcoming: `flask refresh-upcoming` runs it on a schedule
+'''
+
+
+def refresh_upcoming_counts(now, artist_ids=None):
+    artists = Artist.__table__
+    upcoming = select([func.count(Show.id)]).where(and_(
+        Show.artist_id == artists.c.id, Show.start_time > now)).as_scalar()
+
+    update = artists.update() \
+        .where(artists.c.upcoming_shows_count != upcoming) \
+        .values(upcoming_shows_count=upcoming)
+    if artist_ids is not None:
+        update = update.where(artists.c.id.in_(artist_ids))
+
+    return db.session.execute(update).rowcount
+
+
+#----------------------------------------------------------------------------#
+# Search
+# venues and artists are searched the same way: a case insensitive substring
+# of the name or of "city, state", which the pg_trgm GIN indexes of the
+# migrations can serve on Postgres, and a page of hits comes with its
+# upcoming shows in one grouped query, plus the count of the hits
+#----------------------------------------------------------------------------#
+
+def matching(model, term):
+    pattern = '%{}%'.format(term.replace('\\', '\\\\')
+                            .replace('%', '\\%').replace('_', '\\_'))
+    return or_(model.name.ilike(pattern, escape='\\'),
+               (model.city + ', ' + model.state).ilike(pattern, escape='\\'))
+
+
+'''
+search(model, term, now, page=1, per_page=SEARCH_PER_PAGE)
+    a Pagination of the Venue or Artist rows (id, name, city, state,
+    num_upcoming_shows) matching term, by name
+'''
+
+
+def search(model, term, now, page=1, per_page=SEARCH_PER_PAGE):
+    shows = Show.venue_id if model is Venue else Show.artist_id
+    hits = and_(matching(model, term), model.deleted_at.is_(None))
+
+    total = db.session.query(func.count(model.id)).filter(hits).scalar()
+    items = db.session.query(
+        model.id, model.name, model.city, model.state,
+        func.count(Show.id).label('num_upcoming_shows')) \
+        .outerjoin(Show, and_(shows == model.id, Show.start_time > now)) \
+        .filter(hits) \
+        .group_by(model.id, model.name, model.city, model.state) \
+        .order_by(model.name, model.id) \
+        .limit(per_page).offset((page - 1) * per_page).all()
+
+    return Pagination(None, page, per_page, total, items)
+
+
+#----------------------------------------------------------------------------#
+# Calendars
+# the shows of a month of a venue, an artist or a city, a bounded range scan
+# of the (venue_id, start_time) or (artist_id, start_time) index (of the
+# venues of the city for a city), bucketed per day
+#----------------------------------------------------------------------------#
+
+def month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+'''
+calendar(start, end, venue_id=None, artist_id=None, city=None, state=None)
+    the days of [start, end) with shows, [{"day": 1, "shows": [...]}], a show
+    only lists the venue and artist the calendar is not about
+'''
+
+
+def calendar(start, end, venue_id=None, artist_id=None, city=None,
+             state=None):
+    shows = bakery(lambda session: session.query(
+        Show.id, Show.start_time, Show.end_time, Venue.id, Venue.name,
+        Artist.id, Artist.name)
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+        .filter(Show.start_time >= bindparam('start'),
+                Show.start_time < bindparam('end'),
+                Venue.deleted_at.is_(None), Artist.deleted_at.is_(None)))
+    if venue_id is not None:
+        shows += lambda query: query.filter(
+            Show.venue_id == bindparam('venue_id'))
+    if artist_id is not None:
+        shows += lambda query: query.filter(
+            Show.artist_id == bindparam('artist_id'))
+    if city is not None:
+        shows += lambda query: query.filter(
+            Venue.city == bindparam('city'), Venue.state == bindparam('state'))
+    shows += lambda query: query.order_by(Show.start_time, Show.id)
+
+    rows = shows(db.session()).params(
+        start=start, end=end, venue_id=venue_id, artist_id=artist_id,
+        city=city, state=state)
+
+    days = []
+    for day, day_shows in groupby(rows, key=lambda row: row[1].day):
+        bucket = []
+        for id, start_time, end_time, venue, venue_name, artist, artist_name \
+                in day_shows:
+            show = {"id": id, "start": start_time.strftime('%H:%M'),
+                    "end": end_time.strftime('%H:%M')}
+            if venue_id is None:
+                show.update(venue_id=venue, venue_name=venue_name)
+            if artist_id is None:
+                show.update(artist_id=artist, artist_name=artist_name)
+            bucket.append(show)
+        days.append({"day": day, "shows": bucket})
+
+    return days
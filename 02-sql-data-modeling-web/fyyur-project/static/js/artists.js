@@ -0,0 +1,50 @@
+// infinite scroll of the artists listing: the next page is fetched as JSON
+// when the "More artists" link comes into view, the link itself still works
+// without JavaScript
+(function () {
+  var more = document.getElementById('more-artists');
+  var list = document.getElementById('artists');
+  if (!more || !list || !('IntersectionObserver' in window)) {
+    return;
+  }
+
+  var loading = false;
+
+  function append(artist) {
+    var item = document.createElement('li');
+    var link = document.createElement('a');
+    var icon = document.createElement('i');
+    var div = document.createElement('div');
+    var name = document.createElement('h5');
+    link.href = '/artists/' + artist.id;
+    icon.className = 'fas fa-users';
+    div.className = 'item';
+    name.textContent = artist.name;
+    div.appendChild(name);
+    link.appendChild(icon);
+    link.appendChild(div);
+    item.appendChild(link);
+    list.appendChild(item);
+  }
+
+  var observer = new IntersectionObserver(function (entries) {
+    if (loading || !entries[0].isIntersecting) {
+      return;
+    }
+    loading = true;
+    fetch(more.href, {headers: {'Accept': 'application/json'}})
+      .then(function (response) { return response.json(); })
+      .then(function (page) {
+        page.artists.forEach(append);
+        if (page.next_page) {
+          more.href = page.next_page;
+        } else {
+          observer.disconnect();
+          more.parentNode.removeChild(more);
+        }
+        loading = false;
+      })
+      .catch(function () { loading = false; });
+  });
+  observer.observe(more);
+})();
@@ -0,0 +1,752 @@
+from os import environ
+from datetime import date, datetime, timedelta
+import unittest
+
+from sqlalchemy import event
+
+from app import create_app
+from datetimes import format_datetime
+from fragments import FragmentCache
+import geo
+import partitions
+import purges
+import recommendations
+import rollups
+from models import db, Venue, Artist, Purge, Show, ShowRollup
+from statements import artists_page, encode_cursor, refresh_upcoming_counts, \
+    search
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.database_path = environ.get(
+            'TEST_DATABASE_URL',
+            'postgresql://app_user@localhost:5432/fyyur_test')
+
+        # the schema and the rows come from the fixtures of conftest.py
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.client = self.app.test_client
+        self.fragments = self.app.extensions['fragments']
+
+        self.venue_form = {
+            'name': 'The Test Venue', 'city': 'Austin', 'state': 'TX',
+            'address': '1 Main Street', 'phone': '555-000-0000',
+            'image_link': 'https://example.com/venue.jpg',
+            'genres': ['Jazz', 'Blues'], 'facebook_link': '',
+        }
+        self.artist_form = {
+            'name': 'The Test Artist', 'city': 'Austin', 'state': 'TX',
+            'phone': '555-000-0000', 'image_link': 'https://example.com/a.jpg',
+            'genres': ['Jazz'], 'facebook_link': '',
+        }
+
+    def tearDown(self):
+        """Executed after reach test"""
+        pass
+
+    def a_show(self):
+        return Show.query.order_by(Show.id).first()
+
+    def test_get_venues(self):
+        res = self.client().get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Venue 1<', res.data)
+
+    def test_get_venue(self):
+        show = self.a_show()
+        res = self.client().get('/venues/{}'.format(show.venue_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(Artist.query.get(show.artist_id).name.encode(), res.data)
+
+    def test_404_if_venue_does_not_exist(self):
+        res = self.client().get('/venues/100000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_artist(self):
+        show = self.a_show()
+        res = self.client().get('/artists/{}'.format(show.artist_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(Venue.query.get(show.venue_id).name.encode(), res.data)
+
+    def walk_artists(self, sort, **filters):
+        artists, cursor = artists_page(sort, per_page=3, **filters)
+        while cursor is not None:
+            page, cursor = artists_page(sort, cursor, per_page=3, **filters)
+            artists += page
+        return artists
+
+    def test_artists_pages_by_name(self):
+        with self.app.app_context():
+            artists = self.walk_artists('name')
+            expected = Artist.query.order_by(Artist.name, Artist.id).all()
+
+        self.assertEqual([artist.id for artist in artists],
+                         [artist.id for artist in expected])
+
+    def test_artists_pages_by_upcoming_shows(self):
+        with self.app.app_context():
+            refresh_upcoming_counts(datetime.now())
+            artists = self.walk_artists('upcoming')
+            artist = artists[0]
+            upcoming = Show.query.filter(
+                Show.artist_id == artist.id,
+                Show.start_time > datetime.now()).count()
+
+        counts = [artist.num_upcoming_shows for artist in artists]
+        self.assertEqual(len(artists), Artist.query.count())
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(artist.num_upcoming_shows, upcoming)
+
+    def test_artists_filters(self):
+        self.client().post('/artists/create', data=dict(
+            self.artist_form, city='Springfield', state='IL',
+            genres=['Heavy Metal']))
+
+        with self.app.app_context():
+            metal = self.walk_artists('name', genre='Metal')
+            heavy_metal = self.walk_artists('name', genre='Heavy Metal')
+            springfield = self.walk_artists('name', city='Springfield',
+                                            state='IL')
+            genres = [Artist.query.get(artist.id).genres.split(',')
+                      for artist in heavy_metal]
+
+        self.assertEqual(metal, [])
+        self.assertIn('The Test Artist',
+                      [artist.name for artist in heavy_metal])
+        self.assertTrue(all('Heavy Metal' in names for names in genres))
+        self.assertEqual([artist.name for artist in springfield],
+                         ['The Test Artist'])
+
+    def test_get_artists_json(self):
+        res = self.client().get('/artists?sort=upcoming',
+                                headers={'Accept': 'application/json'})
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['artists']), Artist.query.count())
+        self.assertIsNone(data['next_page'])
+        self.assertIn('num_upcoming_shows', data['artists'][0])
+        self.assertIn('Accept', res.vary)
+
+    def test_artists_html_varies_on_accept(self):
+        res = self.client().get('/artists')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Accept', res.vary)
+
+    def test_400_if_artists_cursor_is_invalid(self):
+        self.assertEqual(
+            self.client().get('/artists?cursor=nope').status_code, 400)
+        self.assertEqual(
+            self.client().get('/artists?sort=city').status_code, 400)
+        # well formed JSON whose sort key has not the type of the sort
+        for sort, key in [('name', [[1], 1]), ('name', [{}, 1]),
+                          ('name', [1, 1]), ('upcoming', ['a', 1]),
+                          ('upcoming', [True, 1]), ('name', ['a', '1'])]:
+            cursor = encode_cursor(key)
+            res = self.client().get(
+                '/artists?sort={}&cursor={}'.format(sort, cursor))
+            self.assertEqual(res.status_code, 400)
+
+    def test_new_show_counts_as_upcoming(self):
+        with self.app.app_context():
+            refresh_upcoming_counts(datetime.now(), [1])
+            before = Artist.query.get(1).upcoming_shows_count
+
+        self.client().post('/shows/create', data={
+            'artist_id': 1, 'venue_id': 1,
+            'start_time': '2035-01-01 20:00:00'})
+
+        self.assertEqual(Artist.query.get(1).upcoming_shows_count, before + 1)
+
+    def test_search_artists(self):
+        res = self.client().post('/artists/search',
+                                 data={'search_term': 'artist 1'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Artist 10<', res.data)
+        self.assertNotIn(b'Artist 2<', res.data)
+        self.assertIn(b'upcoming shows', res.data)
+
+    def test_search_artists_by_city_and_state(self):
+        self.client().post('/artists/create', data=dict(
+            self.artist_form, city='Springfield', state='IL'))
+
+        res = self.client().get('/artists/search?search_term=springfield,+IL')
+
+        self.assertIn(b'The Test Artist', res.data)
+        self.assertIn(b'"springfield, IL": 1', res.data)
+
+    def test_search_upcoming_shows(self):
+        now = datetime.now()
+        with self.app.app_context():
+            hits = search(Artist, 'Artist', now, per_page=100)
+            counts = {artist.id: Show.query.filter(
+                Show.artist_id == artist.id, Show.start_time > now).count()
+                for artist in hits.items}
+
+        self.assertEqual(hits.total, Artist.query.count())
+        self.assertEqual(
+            {artist.id: artist.num_upcoming_shows for artist in hits.items},
+            counts)
+
+    def test_search_pages(self):
+        with self.app.app_context():
+            first = search(Venue, 'Venue', datetime.now(), 1, per_page=3)
+            second = search(Venue, 'Venue', datetime.now(), 2, per_page=3)
+
+        self.assertEqual(first.total, Venue.query.count())
+        self.assertEqual(len(first.items), 3)
+        self.assertTrue(first.has_next)
+        self.assertLess(first.items[-1].name, second.items[0].name)
+
+    def test_search_is_two_statements(self):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if statement.startswith('SELECT'):
+                statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.session.get_bind().engine
+            event.listen(engine, 'before_cursor_execute', count)
+            try:
+                search(Artist, '', datetime.now(), per_page=100)
+            finally:
+                event.remove(engine, 'before_cursor_execute', count)
+
+        self.assertEqual(len(statements), 2)
+
+    def test_search_escapes_wildcards(self):
+        with self.app.app_context():
+            hits = search(Artist, '%', datetime.now())
+
+        self.assertEqual(hits.total, 0)
+
+    def book(self, artist_id, venue_id, start_time, **form):
+        return self.client().post('/shows/create', data=dict(
+            form, artist_id=artist_id, venue_id=venue_id,
+            start_time=start_time))
+
+    def test_artist_cannot_be_double_booked(self):
+        self.book(1, 1, '2035-01-01 20:00:00')
+        shows = Show.query.count()
+
+        res = self.book(1, 2, '2035-01-01 21:00:00')
+
+        self.assertIn(b'the artist is already booked', res.data)
+        self.assertEqual(Show.query.count(), shows)
+
+    def test_venue_cannot_be_double_booked(self):
+        self.book(1, 1, '2035-01-01 20:00:00', duration=240)
+        shows = Show.query.count()
+
+        res = self.book(2, 1, '2035-01-01 23:30:00')
+
+        self.assertIn(b'the venue is already booked', res.data)
+        self.assertEqual(Show.query.count(), shows)
+
+    def test_back_to_back_shows(self):
+        self.book(1, 1, '2035-01-01 18:00:00')
+        shows = Show.query.count()
+
+        res = self.book(1, 1, '2035-01-01 20:00:00')
+
+        self.assertIn(b'Show was successfully listed!', res.data)
+        self.assertEqual(Show.query.count(), shows + 1)
+
+    def test_venue_availability(self):
+        self.book(1, 1, '2035-01-01 20:00:00')
+        self.book(2, 1, '2035-01-01 12:00:00', duration=60)
+
+        res = self.client().get('/venues/1/availability'
+                                '?start=2035-01-01&end=2035-01-02')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['free'], [
+            {'start': '2035-01-01T00:00:00', 'end': '2035-01-01T12:00:00'},
+            {'start': '2035-01-01T13:00:00', 'end': '2035-01-01T20:00:00'},
+            {'start': '2035-01-01T22:00:00', 'end': '2035-01-02T00:00:00'},
+        ])
+
+    def test_venue_availability_of_long_slots(self):
+        self.book(1, 1, '2035-01-01 20:00:00')
+
+        res = self.client().get('/venues/1/availability?start=2035-01-01'
+                                '&end=2035-01-02&min_minutes=180')
+
+        self.assertEqual(res.get_json()['free'], [
+            {'start': '2035-01-01T00:00:00', 'end': '2035-01-01T20:00:00'},
+        ])
+
+    def test_venue_availability_with_utc_offset(self):
+        res = self.client().get('/venues/1/availability'
+                                '?start=2035-01-01T00:00%2B02:00&end=2035-01-02')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['start'], '2034-12-31T22:00:00')
+        self.assertEqual(data['end'], '2035-01-02T00:00:00')
+
+    def test_400_if_availability_range_is_invalid(self):
+        for query in ('start=2035-01-02&end=2035-01-01',
+                      'start=2035-01-01&end=2036-01-01',
+                      'start=someday',
+                      # 2035-01-02T01:00 in UTC, after the naive end
+                      'start=2035-01-01T23:00-02:00&end=2035-01-02'):
+            res = self.client().get('/venues/1/availability?' + query)
+            self.assertEqual(res.status_code, 400)
+
+        self.assertEqual(
+            self.client().get('/venues/100000/availability').status_code, 404)
+
+    def test_venue_calendar(self):
+        self.book(1, 1, '2035-03-02 20:00:00')
+        self.book(2, 1, '2035-03-02 23:00:00')
+        self.book(1, 1, '2035-03-31 20:00:00')
+        self.book(1, 1, '2035-04-01 20:00:00')
+
+        res = self.client().get('/venues/1/calendar/2035/3')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([day['day'] for day in data['days']], [2, 31])
+        self.assertEqual([(show['start'], show['artist_id'])
+                          for show in data['days'][0]['shows']],
+                         [('20:00', 1), ('23:00', 2)])
+        self.assertNotIn('venue_id', data['days'][0]['shows'][0])
+        self.assertEqual(res.cache_control.max_age,
+                         self.app.config['CALENDAR_MAX_AGE'])
+
+    def test_artist_and_city_calendars(self):
+        venue = Venue.query.get(1)
+        self.book(1, 1, '2035-03-02 20:00:00')
+
+        artist = self.client().get('/artists/1/calendar/2035/3').get_json()
+        city = self.client().get('/cities/{}/{}/calendar/2035/3'.format(
+            venue.state, venue.city)).get_json()
+
+        self.assertEqual(artist['days'][0]['shows'][0]['venue_id'], 1)
+        self.assertNotIn('artist_id', artist['days'][0]['shows'][0])
+        self.assertEqual(city['days'][0]['shows'][0]['artist_id'], 1)
+
+    def test_past_month_calendar_is_cached_longer(self):
+        month = datetime.now() - timedelta(days=62)
+
+        res = self.client().get('/venues/1/calendar/{}/{}'.format(
+            month.year, month.month))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.cache_control.public)
+        self.assertEqual(res.cache_control.max_age,
+                         self.app.config['CALENDAR_MAX_AGE_PAST'])
+
+    def test_404_if_calendar_does_not_exist(self):
+        for path in ('/venues/100000/calendar/2035/3',
+                     '/artists/100000/calendar/2035/3',
+                     '/venues/1/calendar/2035/13'):
+            self.assertEqual(self.client().get(path).status_code, 404)
+
+    def test_venue_page_fragments_are_cached(self):
+        self.client().get('/venues/1')
+        misses = self.fragments.misses
+        first = self.client().get('/venues/1').data
+        second = self.client().get('/venues/1').data
+
+        self.assertEqual(self.fragments.misses, misses)
+        self.assertGreaterEqual(self.fragments.hits, 4)
+        self.assertEqual(first, second)
+
+    def test_venue_page_after_edit(self):
+        self.client().get('/venues/1')
+        res = self.client().post('/venues/1/edit', data=dict(
+            self.venue_form, name='Renamed Venue'))
+        self.assertEqual(res.status_code, 302)
+
+        res = self.client().get('/venues/1')
+
+        self.assertIn(b'Renamed Venue', res.data)
+        self.assertIn(b'Blues', res.data)
+
+    def test_venue_page_after_edit_in_another_worker(self):
+        # every worker has its own fragments, the versions are shared
+        other = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.client().get('/venues/1')
+        res = other.test_client().post('/venues/1/edit', data=dict(
+            self.venue_form, name='Renamed Venue'))
+        self.assertEqual(res.status_code, 302)
+
+        res = self.client().get('/venues/1')
+
+        self.assertIn(b'Renamed Venue', res.data)
+
+    def test_artist_page_after_venue_edit(self):
+        show = self.a_show()
+        self.client().get('/artists/{}'.format(show.artist_id))
+        self.client().post('/venues/{}/edit'.format(show.venue_id),
+                           data=dict(self.venue_form, name='Renamed Venue'))
+
+        res = self.client().get('/artists/{}'.format(show.artist_id))
+
+        self.assertIn(b'Renamed Venue', res.data)
+
+    def test_venue_page_after_new_show(self):
+        before = self.client().get('/venues/1').data
+        self.assertNotIn(b'Monday January, 1, 2035', before)
+
+        res = self.client().post('/shows/create', data={
+            'artist_id': 1, 'venue_id': 1,
+            'start_time': '2035-01-01 20:00:00'})
+        self.assertIn(b'Show was successfully listed!', res.data)
+
+        after = self.client().get('/venues/1').data
+        self.assertIn(b'Monday January, 1, 2035', after)
+        after = self.client().get('/artists/1').data
+        self.assertIn(b'Monday January, 1, 2035', after)
+
+    def test_listings_after_create(self):
+        self.client().get('/venues')
+        self.client().get('/artists')
+        self.client().post('/venues/create', data=self.venue_form)
+        self.client().post('/artists/create', data=self.artist_form)
+
+        self.assertIn(b'The Test Venue', self.client().get('/venues').data)
+        self.assertIn(b'The Test Artist', self.client().get('/artists').data)
+
+    def test_venue_page_after_artist_delete(self):
+        show = self.a_show()
+        artist = Artist.query.get(show.artist_id)
+        self.client().get('/venues/{}'.format(show.venue_id))
+
+        self.client().delete('/artist/{}'.format(artist.id))
+
+        res = self.client().get('/venues/{}'.format(show.venue_id))
+        self.assertNotIn('>{}<'.format(artist.name).encode(), res.data)
+        self.assertNotIn(artist.name.encode(),
+                         self.client().get('/artists').data)
+
+    def test_venue_page_in_user_timezone(self):
+        self.client().post('/shows/create', data={
+            'artist_id': 1, 'venue_id': 1,
+            'start_time': '2035-01-01 20:00:00'})
+        self.client().get('/venues/1')
+
+        client = self.client()
+        client.set_cookie('localhost', 'timezone', 'Asia/Tokyo')
+        res = client.get('/venues/1')
+
+        self.assertIn(b"Tuesday January, 2, 2035 at 5:00AM", res.data)
+
+    def test_format_datetime(self):
+        with self.app.test_request_context():
+            self.assertEqual(format_datetime(datetime(2035, 1, 1, 20), 'full'),
+                             "Monday January, 1, 2035 at 8:00PM")
+            self.assertEqual(format_datetime('2035-01-01 20:00:00'),
+                             format_datetime(datetime(2035, 1, 1, 20)))
+            self.assertEqual(
+                format_datetime(datetime(2035, 1, 1, 20), 'full',
+                                tz='America/New_York'),
+                "Monday January, 1, 2035 at 3:00PM")
+
+    def test_nearby_venues(self):
+        with self.app.app_context():
+            located, missing = geo.geocode_venues(geo.load_gazetteer())
+            db.session.commit()
+            austin = Venue.query.filter_by(city='Austin', state='TX').count()
+
+        res = self.client().get('/venues/nearby?lat=30.27&lng=-97.74&radius=10')
+        venues = res.get_json()['venues']
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(missing, 0)
+        self.assertEqual(located, Venue.query.count())
+        self.assertEqual(len(venues), min(austin, geo.NEARBY_LIMIT))
+        self.assertTrue(all(venue['city'] == 'Austin' for venue in venues))
+
+    def test_nearby_venues_nearest_first(self):
+        self.client().post('/venues/create', data=self.venue_form)
+        places = {geo.normalize('1 Main Street', 'Austin', 'TX'): (30.3, -97.7),
+                  geo.normalize('Austin', 'TX'): (30.2672, -97.7431)}
+        with self.app.app_context():
+            geo.geocode_venues(places)
+            venues = geo.nearby(30.3, -97.7, 50)
+
+        self.assertEqual(venues[0][1], 'The Test Venue')
+        self.assertLess(venues[0][4], 0.001)
+        self.assertAlmostEqual(venues[1][4], 5.4, delta=0.2)
+        self.assertEqual([venue[4] for venue in venues],
+                         sorted(venue[4] for venue in venues))
+
+    def test_nearby_venues_across_the_antimeridian(self):
+        with self.app.app_context():
+            venue = Venue.query.get(1)
+            venue.latitude, venue.longitude = -16.5, -179.95
+            db.session.flush()
+            venues = geo.nearby(-16.5, 179.95, 20)
+
+        self.assertEqual([venue[0] for venue in venues], [1])
+        self.assertAlmostEqual(venues[0][4], 10.7, delta=0.2)
+
+    def test_venue_edit_forgets_its_coordinates(self):
+        with self.app.app_context():
+            venue = Venue.query.get(1)
+            venue.latitude, venue.longitude = 30.0, -97.0
+            db.session.commit()
+
+        self.client().post('/venues/1/edit', data=self.venue_form)
+
+        self.assertIsNone(Venue.query.get(1).latitude)
+
+    def test_400_if_nearby_is_invalid(self):
+        for query in ('lat=30', 'lat=91&lng=0', 'lat=30&lng=-97&radius=0',
+                      'lat=30&lng=-97&radius=100000', 'lat=a&lng=b'):
+            res = self.client().get('/venues/nearby?' + query)
+            self.assertEqual(res.status_code, 400)
+
+    plays = [(1, 10, 1.0), (1, 11, 1.0), (2, 10, 1.0), (2, 12, 1.0),
+             (3, 20, 1.0)]
+
+    def test_recommendations(self):
+        neighbours = recommendations.compute(self.plays, engine='python')
+
+        self.assertEqual(neighbours['artist_artist'][1], [(2, 0.5)])
+        self.assertEqual(neighbours['artist_artist'][3], [])
+        self.assertEqual(neighbours['artist_venue'][1], [(12, 0.5)])
+        self.assertEqual(neighbours['venue_venue'][10],
+                         [(11, 0.707106781), (12, 0.707106781)])
+
+    @unittest.skipIf(recommendations.sparse is None, 'scipy is not installed')
+    def test_recommendation_engines_agree(self):
+        self.assertEqual(
+            recommendations.compute(self.plays, engine='scipy'),
+            recommendations.compute(self.plays, engine='python'))
+
+        with self.app.app_context():
+            plays = recommendations.plays()
+        self.assertEqual(
+            recommendations.compute(plays, top_k=5, engine='scipy'),
+            recommendations.compute(plays, top_k=5, engine='python'))
+
+    def test_recommendation_panels(self):
+        with self.app.app_context():
+            counts = recommendations.build()
+            db.session.commit()
+            similar = recommendations.recommended('artist_artist', 1, Artist)
+
+        artist_page = self.client().get('/artists/1').data
+        venue_page = self.client().get('/venues/1').data
+
+        self.assertGreater(counts['artist_artist'], 0)
+        self.assertIn(b'Similar Artists', artist_page)
+        self.assertIn('/artists/{}"'.format(similar[0].id).encode(),
+                      artist_page)
+        self.assertIn(b'Similar Venues', venue_page)
+
+    def stored_rollups(self):
+        with self.app.app_context():
+            return {(rollup.day, rollup.state, rollup.city, rollup.genre):
+                    rollup.shows for rollup in ShowRollup.query}
+
+    def counted_rollups(self):
+        with self.app.app_context():
+            return dict(rollups.counts())
+
+    def test_rollups_follow_the_shows(self):
+        with self.app.app_context():
+            rollups.rebuild()
+            db.session.commit()
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+        self.book(1, 1, '2035-01-01 20:00:00')
+        self.assertIn((date(2035, 1, 1), Venue.query.get(1).state,
+                       Venue.query.get(1).city, rollups.ALL_GENRES),
+                      self.stored_rollups())
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+        self.client().post('/artists/1/edit', data=dict(
+            self.artist_form, genres=['Jazz', 'Folk']))
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+        self.client().post('/venues/1/edit', data=self.venue_form)
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+        show = self.a_show()
+        self.client().delete('/venues/{}'.format(show.venue_id))
+        self.client().delete('/artist/{}'.format(show.artist_id))
+        self.assertIsNotNone(Venue.query.get(show.venue_id).deleted_at)
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+        with self.app.app_context():
+            purges.run()
+        self.assertIsNone(Venue.query.get(show.venue_id))
+        self.assertEqual(self.stored_rollups(), self.counted_rollups())
+
+    def test_rollups_rebuild_keeps_detached_months(self):
+        with self.app.app_context():
+            rollups.rebuild()
+            db.session.commit()
+        before = self.stored_rollups()
+        times = sorted(start for start, in db.session.query(Show.start_time))
+        since = times[len(times) // 2].date()
+
+        # the shows of a detached partition are gone from shows
+        with self.app.app_context():
+            Show.query.filter(Show.start_time < datetime.combine(
+                since, datetime.min.time())).delete()
+            rollups.rebuild(since)
+            db.session.commit()
+        after = self.stored_rollups()
+
+        older = {key: shows for key, shows in before.items() if key[0] < since}
+        self.assertTrue(older)
+        self.assertEqual({key: shows for key, shows in after.items()
+                          if key[0] < since}, older)
+        self.assertEqual({key: shows for key, shows in after.items()
+                          if key[0] >= since}, self.counted_rollups())
+
+    def test_stats(self):
+        show = self.a_show()
+        year = show.start_time.year
+        with self.app.app_context():
+            rollups.rebuild()
+            db.session.commit()
+        shows = Show.query.join(Venue).join(Artist).filter(
+            Show.start_time >= datetime(year, 1, 1),
+            Show.start_time < datetime(year + 1, 1, 1)).count()
+
+        res = self.client().get('/stats?year={}'.format(year),
+                                headers={'Accept': 'application/json'})
+        stats = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(stats['shows'], shows)
+        self.assertEqual(sum(month['shows'] for month in stats['months']),
+                         shows)
+        self.assertEqual(len(stats['months']), 12)
+        genre = stats['genres'][0]['genre']
+        self.assertEqual(
+            self.client().get('/stats', query_string={
+                'year': year, 'genre': genre},
+                headers={'Accept': 'application/json'}).get_json()['shows'],
+            stats['genres'][0]['shows'])
+
+        res = self.client().get('/stats?year={}'.format(year))
+        self.assertIn(b'Top genres', res.data)
+        self.assertIn('Accept', res.vary)
+        self.assertIn('{} shows in {}'.format(shows, year).encode(), res.data)
+
+    def busiest_venue(self):
+        return db.session.query(Show.venue_id).group_by(Show.venue_id) \
+            .order_by(db.func.count(Show.id).desc(), Show.venue_id).first()[0]
+
+    def test_deleted_venue_is_hidden(self):
+        venue = Venue.query.get(self.a_show().venue_id)
+        shows = Show.query.filter(Show.venue_id == venue.id,
+                                  Show.start_time < datetime.now()).all()
+        res = self.book(shows[0].artist_id, venue.id, '2095-01-01 20:00:00')
+        self.assertIn(b'Show was successfully listed!', res.data)
+
+        self.client().delete('/venues/{}'.format(venue.id))
+        self.assertIsNotNone(Venue.query.get(venue.id).deleted_at)
+
+        self.assertEqual(self.client().get('/venues/{}'.format(venue.id)).status_code, 404)
+        self.assertNotIn('>{}<'.format(venue.name).encode(),
+                         self.client().get('/venues').data)
+        self.assertNotIn('/venues/{}"'.format(venue.id).encode(),
+                         self.client().get('/artists/{}'.format(shows[0].artist_id)).data)
+        self.assertEqual(self.client().post('/venues/search', data={
+            'search_term': venue.name}).data.count('/venues/{}"'.format(venue.id).encode()), 0)
+
+        # the upcoming show is cancelled, the past ones wait for the purge
+        self.assertEqual(Show.query.filter_by(venue_id=venue.id).count(), len(shows))
+        self.assertIsNone(Purge.query.get(('venue', venue.id)).finished_at)
+
+    def test_deleted_artist_cannot_be_booked(self):
+        show = self.a_show()
+        self.client().delete('/artist/{}'.format(show.artist_id))
+
+        res = self.book(show.artist_id, show.venue_id, '2035-01-01 20:00:00')
+
+        self.assertIn(b'Show could not be listed', res.data)
+        self.assertEqual(self.client().get('/artists/{}'.format(show.artist_id)).status_code, 404)
+
+    def test_purge_is_batched_and_resumable(self):
+        venue_id = self.busiest_venue()
+        self.client().delete('/venues/{}'.format(venue_id))
+        shows = Show.query.filter_by(venue_id=venue_id).count()
+        self.assertGreater(shows, 2)
+
+        with self.app.app_context():
+            self.assertEqual(purges.run(batch_size=2, max_batches=1), (0, 2))
+        purge = Purge.query.get(('venue', venue_id))
+        self.assertEqual((purge.shows_deleted, purge.batches), (2, 1))
+        self.assertEqual(Show.query.filter_by(venue_id=venue_id).count(), shows - 2)
+
+        # an interrupted run starts again from the shows left
+        with self.app.app_context():
+            finished, deleted = purges.run(batch_size=2)
+        purge = Purge.query.get(('venue', venue_id))
+
+        self.assertEqual((finished, deleted), (1, shows - 2))
+        self.assertEqual(purge.shows_deleted, shows)
+        self.assertIsNotNone(purge.finished_at)
+        self.assertEqual(Show.query.filter_by(venue_id=venue_id).count(), 0)
+        self.assertIsNone(Venue.query.get(venue_id))
+        with self.app.app_context():
+            self.assertEqual(purges.run(), (0, 0))
+
+    def test_show_partitions_plan(self):
+        existing = ['shows_default', 'shows_y2034m10', 'shows_y2034m12',
+                    'shows_y2035m01', 'shows_y2035m02']
+
+        create, detach = partitions.plan(existing, date(2035, 1, 17),
+                                         ahead=3, keep=2)
+
+        self.assertEqual(create, [date(2035, 3, 1), date(2035, 4, 1)])
+        self.assertEqual(detach, ['shows_y2034m10'])
+
+    def test_show_partitions_plan_keeps_every_month(self):
+        create, detach = partitions.plan(['shows_y2001m01'], date(2035, 12, 3),
+                                         ahead=1, keep=0)
+
+        self.assertEqual(create, [date(2035, 12, 1), date(2036, 1, 1)])
+        self.assertEqual(detach, [])
+
+    def test_fragment_expires_at_next_show(self):
+        fragments = FragmentCache()
+        render = iter(['first', 'second'])
+
+        def caller():
+            return next(render)
+
+        started = datetime.now() - timedelta(seconds=1)
+        with self.app.test_request_context():
+            fragments.fragment('venue', 1, 'shows', started, caller=caller)
+
+            self.assertEqual(
+                fragments.fragment('venue', 1, 'shows', started, caller=caller),
+                'second')
+
+    def test_fragment_cache_is_bounded(self):
+        fragments = FragmentCache()
+        fragments.max_entries = 2
+        with self.app.test_request_context():
+            for venue_id in range(3):
+                fragments.fragment('venue', venue_id, 'details',
+                                   caller=lambda: 'venue')
+
+        self.assertEqual(len(fragments.entries), 2)
+        self.assertIsNone(fragments.get(('venue', 0, 'details', None, 0, 0)))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
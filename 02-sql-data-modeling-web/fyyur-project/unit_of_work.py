@@ -0,0 +1,128 @@
+#----------------------------------------------------------------------------#
+# Unit of work
+# one transaction per request: the handlers add, change and delete instances
+# but never commit, the request is committed once (rolled back when the response is an
+# error or the method is safe, GET handlers may change instances only to
+# display them) and the session removed, so its connection is back in the pool
+# before the template is rendered: render() ends the unit of work, the write
+# handlers end it themselves with release() to know whether it was committed
+# and after_request does it for the other responses (redirects).
+# Every checkout of the pool is timed: the time the request held a connection
+# is sent in a Server-Timing header (db-hold) and added to stats()
+#----------------------------------------------------------------------------#
+import time
+
+from flask import current_app, g, has_request_context, jsonify, \
+    render_template, request
+from sqlalchemy import event
+
+from models import db
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def commits(status):
+    return status < 400 and request.method not in SAFE_METHODS
+
+
+class UnitOfWork:
+    def __init__(self, app=None):
+        # turned off by benchmarks.connection_hold to measure the old
+        # behaviour, the connection is then released after serialization
+        self.release_early = True
+        self.checkouts = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['unit_of_work'] = self
+        engine = db.get_engine(app)
+        event.listen(engine, 'checkout', self._checkout)
+        event.listen(engine, 'checkin', self._checkin)
+        app.after_request(self._after_request)
+
+    '''
+    release(commit=True)
+        commits (or rolls back) the session of the request and removes it,
+        its connection goes back to the pool
+    '''
+
+    def release(self, commit=True):
+        try:
+            if commit:
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+    def before_serialization(self, status):
+        if self.release_early:
+            self.release(commits(status))
+
+    def stats(self):
+        return {
+            'checkouts': self.checkouts,
+            'hold_total_ms': round(self.hold_total * 1000, 2),
+            'hold_mean_ms': round(self.hold_total * 1000 /
+                                  max(self.checkouts, 1), 3),
+            'hold_max_ms': round(self.hold_max * 1000, 3),
+        }
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+
+    def _checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        if checked_out_at is None:
+            return
+
+        held = time.perf_counter() - checked_out_at
+        self.checkouts += 1
+        self.hold_total += held
+        self.hold_max = max(self.hold_max, held)
+        if has_request_context():
+            g.db_hold = g.get('db_hold', 0.0) + held
+
+    def _after_request(self, response):
+        self.release(commits(response.status_code))
+
+        held = g.pop('db_hold', None)
+        if held is not None:
+            response.headers.add('Server-Timing',
+                                 'db-hold;dur={:.2f}'.format(held * 1000))
+        return response
+
+
+'''
+release(commit=True)
+    ends the unit of work of the current request: commits it (or rolls it
+    back) and returns the connection to the pool
+'''
+
+
+def release(commit=True):
+    current_app.extensions['unit_of_work'].release(commit)
+
+
+'''
+render(template_name, **context)
+    render_template() once the unit of work of the request has ended, the
+    templates only read what the handler loaded
+'''
+
+
+def render(template_name, **context):
+    current_app.extensions['unit_of_work'].before_serialization(200)
+    return render_template(template_name, **context)
+
+
+# the JSON variant of render()
+def render_json(payload):
+    current_app.extensions['unit_of_work'].before_serialization(200)
+    return jsonify(payload)
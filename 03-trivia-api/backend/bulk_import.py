@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from models import db, Question, Category
+
+BATCH_SIZE = 5000
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ('question', 'answer', 'category', 'difficulty')
+# the errors detailed in the report, the others are only counted
+MAX_ERRORS = 100
+
+'''
+read_records(stream, fmt)
+    yields (line_number, record) from a binary stream of CSV (with a header
+    line naming the COLUMNS) or newline delimited JSON, records that can not
+    be decoded (invalid UTF-8, CSV or JSON) are yielded as the exception so
+    they are reported with the batch instead of aborting the load
+'''
+
+
+def decoded_lines(stream, invalid):
+    for line_number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError as error:
+            invalid[line_number] = error
+            yield line.decode('utf-8', errors='replace')
+
+
+def read_records(stream, fmt):
+    # the line numbers that are not UTF-8 and their error
+    invalid = {}
+    lines = decoded_lines(stream, invalid)
+
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        first = 1
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as error:
+                record = error
+
+            # a record spans several lines when a quoted field has newlines
+            errors = [invalid.pop(line_number) for line_number
+                      in range(first, reader.line_num + 1)
+                      if line_number in invalid]
+            first = reader.line_num + 1
+            yield reader.line_num, errors[0] if errors else record
+
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if line_number in invalid:
+                yield line_number, invalid.pop(line_number)
+                continue
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as error:
+                yield line_number, error
+
+    else:
+        raise ValueError('unknown format {}'.format(fmt))
+
+
+'''
+validate(record, categories)
+    returns the row to be inserted or raises ValueError with a message,
+    the same fields are required as POST /questions
+'''
+
+
+def validate(record, categories):
+    if isinstance(record, UnicodeDecodeError):
+        raise ValueError('invalid UTF-8: {}'.format(record))
+
+    if isinstance(record, csv.Error):
+        raise ValueError('invalid CSV: {}'.format(record))
+
+    if isinstance(record, Exception):
+        raise ValueError('invalid JSON: {}'.format(record))
+
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+
+    question = record.get('question')
+    answer = record.get('answer')
+    if not question or not answer:
+        raise ValueError('question and answer are required')
+
+    try:
+        category = int(record.get('category'))
+        difficulty = int(record.get('difficulty'))
+    except (TypeError, ValueError):
+        raise ValueError('category and difficulty must be integers')
+
+    if category not in categories:
+        raise ValueError('unknown category {}'.format(category))
+
+    if not 1 <= difficulty <= 5:
+        raise ValueError('difficulty must be between 1 and 5')
+
+    return {
+        'question': str(question),
+        'answer': str(answer),
+        'category': category,
+        'difficulty': difficulty
+    }
+
+
+'''
+Loaders, one transaction per batch. On Postgres the batch is sent with COPY,
+on the other databases (SQLite for local runs) with a single executemany.
+'''
+
+
+def copy_batch(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in COLUMNS])
+    buffer.seek(0)
+
+    # the DBAPI connection of the session, so COPY runs in its transaction
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            Question.__tablename__, ', '.join(COLUMNS)),
+        buffer)
+
+
+def executemany_batch(rows):
+    db.session.execute(Question.__table__.insert(), rows)
+
+
+def new_report():
+    return {
+        'inserted': 0,
+        'failed': 0,
+        'batches': 0,
+        'error_count': 0,
+        'errors': []
+    }
+
+
+def add_error(report, line, message):
+    report['error_count'] += 1
+    if len(report['errors']) < MAX_ERRORS:
+        report['errors'].append({
+            'batch': report['batches'],
+            'line': line,
+            'message': message
+        })
+
+
+def batch_failed(report, rows, error):
+    report['failed'] += len(rows)
+    add_error(report, None, 'batch rolled back: {}'.format(error))
+
+
+'''
+validated_batches(stream, fmt, categories, report, batch_size=BATCH_SIZE)
+    yields the valid rows of every batch of records, the invalid ones are
+    counted and reported. The loaders of import_questions and of the async
+    build (flaskr/asgi.py) insert them
+'''
+
+
+def validated_batches(stream, fmt, categories, report, batch_size=BATCH_SIZE):
+    records = read_records(stream, fmt)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+
+        report['batches'] += 1
+        rows = []
+        for line, record in batch:
+            try:
+                rows.append(validate(record, categories))
+            except ValueError as error:
+                report['failed'] += 1
+                add_error(report, line, str(error))
+
+        if rows:
+            yield rows
+
+
+'''
+import_questions(stream, fmt='csv', batch_size=BATCH_SIZE)
+    validates and loads the records in batches, invalid records are skipped
+    and a failing batch is rolled back without stopping the following ones
+    returns a report with the counts, the number of errors and the first
+    MAX_ERRORS of them
+'''
+
+
+def import_questions(stream, fmt='csv', batch_size=BATCH_SIZE):
+    categories = {category_id for category_id, in
+                  db.session.query(Category.id)}
+    load = copy_batch if db.engine.dialect.name == 'postgresql' \
+        else executemany_batch
+
+    report = new_report()
+    for rows in validated_batches(stream, fmt, categories, report,
+                                  batch_size):
+        try:
+            load(rows)
+            db.session.commit()
+            report['inserted'] += len(rows)
+        except Exception as error:
+            db.session.rollback()
+            batch_failed(report, rows, error)
+
+    return report
@@ -0,0 +1,63 @@
+'''
+Test fixtures
+    the schema and the rows of trivia.psql are loaded once per run in a
+    template database, every pytest-xdist worker tests against its own copy
+    and every test runs in a SAVEPOINT rolled back at its end.
+    TEST_DATABASE_URL picks the database server, a temporary SQLite database
+    by default:
+
+    TEST_DATABASE_URL=postgres://app_user@localhost:5432/trivia_test pytest -n auto
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from benchmarks import fixtures  # noqa: E402
+from models import db  # noqa: E402
+
+DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+
+def pytest_configure(config):
+    fixtures.configure(config, db.metadata, DUMP)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    fixtures.configure_node(node)
+
+
+def pytest_unconfigure(config):
+    fixtures.unconfigure(config)
+
+
+@pytest.fixture(scope='session')
+def database_url(request):
+    url = fixtures.worker_database(request.config)
+    os.environ['TEST_DATABASE_URL'] = url
+    yield url
+    fixtures.drop_database(url)
+
+
+@pytest.fixture(scope='session')
+def engine(database_url):
+    engine = fixtures.test_engine(database_url)
+    yield engine
+    engine.dispose()
+
+
+# flask_sqlalchemy sessions need an application, built once per worker
+@pytest.fixture(scope='session')
+def flask_app(database_url):
+    from flaskr import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+
+
+@pytest.fixture(autouse=True)
+def rollback(flask_app, engine):
+    with fixtures.rollback_session(db, engine) as session:
+        yield session
@@ -1,27 +1,85 @@
 import os
 import sys
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql.expression import func
 from flask_cors import CORS
 import random
+import time
+import click
+from sqlalchemy.orm import configure_mappers
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category, question_columns, format_question_row
+from statements import questions_page
+from unit_of_work import UnitOfWork
+from bulk_import import import_questions, FORMATS, BATCH_SIZE
+from json_provider import init_json, json_response, ndjson_response, \
+    wants_gzip
 
 QUESTIONS_PER_PAGE = 10
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+EXPORT_BATCH_SIZE = 1000
+CATEGORIES_TTL = 60
 
-# inspired by the udacity example
+# inspired by the udacity example, formats the row tuples of the column-only
+# queries so no Question instance is hydrated
 
 
-def format_output(selection):
-    entities = [entity.format() for entity in selection]
-    return entities
+def format_rows(rows):
+    return [format_question_row(row) for row in rows]
+
+
+def questions_query():
+    return Question.query.with_entities(*question_columns)
+
+
+# the categories never change through the API, they are cached per process
+# for CATEGORIES_TTL seconds instead of being queried on every request
+_categories = {'value': None, 'expires': 0.0}
+
+
+def categories_formated():
+    now = time.monotonic()
+    if _categories['value'] is None or now >= _categories['expires']:
+        rows = Category.query.with_entities(Category.id, Category.type) \
+                             .order_by(Category.id)
+        _categories['value'] = {category_id: type_ for category_id, type_ in rows}
+        _categories['expires'] = now + CATEGORIES_TTL
+
+    return _categories['value']
+
+
+'''
+warm_up(app)
+    builds what the first requests would: the mappers, the categories cache
+    and the baked page queries. gunicorn.conf.py calls it in the master
+    before the workers fork so they all start with it, a failure is logged
+    and the pool emptied all the same
+'''
+
+
+def warm_up(app):
+    configure_mappers()
+    with app.app_context():
+        categories_formated()
+        questions_page(1, QUESTIONS_PER_PAGE)
+        questions_page(1, QUESTIONS_PER_PAGE, category=1)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is None:
+        setup_db(app)
+    else:
+        app.config.from_mapping(test_config)
+        setup_db(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    UnitOfWork(app)
+    init_json(app)
     CORS(app, resources={r"/*": {"origins": "*"}})
 
     @app.after_request
@@ -37,14 +95,11 @@ def create_app(test_config=None):
   '''
     @app.route('/categories')
     def get_categories():
-        categories = Category.query.order_by(Category.id).all()
+        categories = categories_formated()
 
-        categories_formated = {
-            category.id: category.type for category in categories}
-
-        return jsonify({
+        return json_response({
             'success': True,
-            'categories': categories_formated,
+            'categories': categories,
             'total_categories': len(categories)
         })
 
@@ -57,36 +112,48 @@ def create_app(test_config=None):
         page = request.args.get('page', 1, type=int)
         current_category = request.args.get('current_category', type=int)
 
-        questions = Question.query.order_by(Question.id)
-
-        if current_category is not None:
-            questions = questions.filter_by(category=current_category)
-
         '''
       Using the SQLAlchemy pagination solution. It's not correct to use all(),
       bring all data from the database, and slice the array[start:end],
       doing this we are processing a large amount of data we download all data
       in the memory and most of it will be not sent to the client,
-      this is the responsibility of the database
+      this is the responsibility of the database. The page and count queries
+      are baked, see statements.py
       '''
-        questions = questions.paginate(page=page, per_page=QUESTIONS_PER_PAGE)
+        questions = questions_page(page, QUESTIONS_PER_PAGE, current_category)
         if questions is None:
             abort(404)
 
-        questions_formated = format_output(questions.items)
+        questions_formated = format_rows(questions.items)
 
-        categories = Category.query.order_by(Category.id).all()
-        categories_formated = {
-            category.id: category.type for category in categories}
-
-        return jsonify({
+        return json_response({
             'success': True,
             'questions': questions_formated,
             'total_questions': questions.total,
             'current_category': current_category,
-            'categories': categories_formated
+            'categories': categories_formated()
         })
 
+    '''
+  Endpoint to export the whole question bank as newline delimited JSON.
+  The rows are read from a server-side cursor and streamed, gzipped if asked.
+  The since argument is the last question ID already exported by the client,
+  only questions with a greater ID are returned.
+  '''
+    @app.route('/questions/export')
+    def export_questions():
+        since = request.args.get('since', type=int)
+
+        questions = questions_query().order_by(Question.id)
+        if since is not None:
+            questions = questions.filter(Question.id > since)
+
+        questions = questions.yield_per(EXPORT_BATCH_SIZE)
+
+        return ndjson_response(
+            (format_question_row(row) for row in questions),
+            compress=wants_gzip())
+
     '''
   Endpoint to DELETE question using a question ID
   '''
@@ -99,7 +166,7 @@ def create_app(test_config=None):
 
             question.delete()
 
-            return jsonify({
+            return json_response({
                 'success': True,
                 'deleted': question_id
             })
@@ -126,13 +193,13 @@ def create_app(test_config=None):
 
         if search_term:
             page = request.args.get('page', 1, type=int)
-            questions = Question.query.filter(Question.question.ilike('%' + search_term + '%')) \
-                                      .order_by(Question.id) \
-                                      .paginate(page=page, per_page=QUESTIONS_PER_PAGE)
+            questions = questions_query().filter(Question.question.ilike('%' + search_term + '%')) \
+                                         .order_by(Question.id) \
+                                         .paginate(page=page, per_page=QUESTIONS_PER_PAGE)
 
-            questions_formated = format_output(questions.items)
+            questions_formated = format_rows(questions.items)
 
-            return jsonify({
+            return json_response({
                 'success': True,
                 'questions': questions_formated,
                 'total_questions': questions.total
@@ -147,13 +214,57 @@ def create_app(test_config=None):
                     question=title, answer=answer, difficulty=difficulty, category=category)
                 question.insert()
 
-                return jsonify({
+                return json_response({
                     'success': True,
                     'created': question.id
                 })
             except:
                 abort(422)
 
+    '''
+  Endpoint to bulk import questions from a CSV (text/csv) or newline delimited
+  JSON (application/x-ndjson) body. The records are validated and loaded in
+  batches, invalid records and failing batches are reported without aborting
+  the whole load.
+  '''
+    @app.route('/questions/import', methods=['POST'])
+    def bulk_import_questions():
+        fmt = request.args.get('format') or \
+            IMPORT_CONTENT_TYPES.get(request.mimetype)
+        if fmt not in FORMATS:
+            abort(400)
+
+        report = import_questions(request.stream, fmt)
+
+        return json_response(dict(report, success=True))
+
+    @app.cli.command('create-db')
+    def create_db_command():
+        """Create the tables of the models that do not exist yet."""
+        db.create_all()
+        click.echo('tables created')
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS))
+    @click.option('--batch-size', type=int, default=BATCH_SIZE)
+    def import_questions_command(path, fmt, batch_size):
+        """Bulk import questions from a CSV or NDJSON file."""
+        if fmt is None:
+            fmt = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        with open(path, 'rb') as stream:
+            report = import_questions(stream, fmt, batch_size)
+
+        for error in report['errors']:
+            click.echo('batch {batch} line {line}: {message}'.format(**error),
+                       err=True)
+        if report['error_count'] > len(report['errors']):
+            click.echo('{} more errors'.format(
+                report['error_count'] - len(report['errors'])), err=True)
+        click.echo('{inserted} inserted, {failed} failed in {batches} batches'
+                   .format(**report))
+
     '''
   Endpoint to get questions based on category
   '''
@@ -161,23 +272,20 @@ def create_app(test_config=None):
     def get_questions_by_category(category_id):
         page = request.args.get('page', 1, type=int)
 
-        current_category = Category.query.filter_by(
-            id=category_id).one_or_none()
+        current_category = categories_formated().get(category_id)
         if current_category is None:
             abort(404)
 
-        questions = Question.query.filter_by(category=category_id) \
-                                  .order_by(Question.id) \
-                                  .paginate(page=page, per_page=QUESTIONS_PER_PAGE)
+        questions = questions_page(page, QUESTIONS_PER_PAGE, category_id)
         if questions is None:
             abort(404)
 
-        items = format_output(questions.items)
+        items = format_rows(questions.items)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'questions': items,
-            'current_category': current_category.type,
+            'current_category': current_category,
             'total_questions': questions.total
         })
 
@@ -198,7 +306,7 @@ def create_app(test_config=None):
                 previous_questions = None
                 quiz_category = None
 
-            question = Question.query
+            question = questions_query()
 
             # Using https://docs.sqlalchemy.org/en/14/core/sqlelement.html#sqlalchemy.sql.operators.ColumnOperators.notin_
             # this will not include all the IDs passed on the request args
@@ -207,16 +315,17 @@ def create_app(test_config=None):
                     Question.id.notin_(previous_questions))
 
             if quiz_category is not None and quiz_category['id'] != 0:
-                question = question.filter_by(category=quiz_category['id'])
+                question = question.filter(
+                    Question.category == quiz_category['id'])
 
             # Using build in random SQLAlchemy function
             # ref: https://stackoverflow.com/a/60815/6454864
             question = question.order_by(func.random()).limit(1).first()
 
             if question is not None:
-                question = question.format()
+                question = format_question_row(question)
 
-            return jsonify({
+            return json_response({
                 'success': True,
                 'question': question
             })
@@ -228,42 +337,42 @@ def create_app(test_config=None):
   '''
     @app.errorhandler(400)
     def bad_request(error):
-        return jsonify({
+        return json_response({
             "error": 400,
             "message": "Bad request",
             "success": False
-        }), 400
+        }, 400)
 
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({
+        return json_response({
             "error": 404,
             "message": "Resource could not be found",
             "success": False
-        }), 404
+        }, 404)
 
     @app.errorhandler(405)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 405,
             "message": "Method not allowed",
             "success": False
-        }), 405
+        }, 405)
 
     @app.errorhandler(422)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 422,
             "message": "Request could not be processable",
             "success": False
-        }), 422
+        }, 422)
 
     @app.errorhandler(500)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 500,
             "message": "Internal server error",
             "success": False
-        }), 500
+        }, 500)
 
     return app
@@ -0,0 +1,399 @@
+'''
+Async deployment of the trivia API
+
+The same routes, response shapes and error handlers of create_app() served by
+an ASGI application (Starlette) on top of SQLAlchemy asyncio sessions,
+asyncpg on Postgres and aiosqlite for local runs and tests.
+Install requirements-async.txt and run it with:
+
+    uvicorn flaskr.asgi:app --workers 4
+'''
+from os import environ
+from tempfile import SpooledTemporaryFile
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from models import database_path, Question, Category, question_columns, \
+    format_question_row
+from json_provider import default_provider, NdjsonChunks
+from bulk_import import new_report, batch_failed, validated_batches, FORMATS
+from flaskr import QUESTIONS_PER_PAGE, EXPORT_BATCH_SIZE, \
+    IMPORT_CONTENT_TYPES
+
+provider = default_provider()
+
+# the import body is kept in memory up to this size, on disk beyond
+IMPORT_SPOOL_SIZE = 1024 * 1024
+
+ERROR_MESSAGES = {
+    400: "Bad request",
+    404: "Resource could not be found",
+    405: "Method not allowed",
+    422: "Request could not be processable",
+    500: "Internal server error",
+}
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+'''
+async_database_path(path)
+    translates the sync database URL of models.py to its asyncio driver
+'''
+
+
+def async_database_path(path):
+    scheme, _, rest = path.partition('://')
+    return '{}://{}'.format(ASYNC_DRIVERS.get(scheme.split('+')[0], scheme),
+                            rest)
+
+
+engine = create_async_engine(
+    async_database_path(environ.get('ASYNC_DATABASE_URL', database_path)))
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+questions_table = Question.__table__
+categories_table = Category.__table__
+
+
+def json_response(obj, status=200):
+    return Response(provider.dumps(obj), status_code=status,
+                    media_type=provider.mimetype)
+
+
+def arg_int(request, name, default=None):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+# the gzip query argument wins over Accept-Encoding, as wants_gzip()
+def wants_gzip(request):
+    value = request.query_params.get('gzip')
+    if value is not None:
+        return value.lower() in ('1', 'true', 'yes')
+
+    encodings = request.headers.get('accept-encoding', '')
+    return any(encoding.split(';')[0].strip() == 'gzip'
+               for encoding in encodings.split(','))
+
+
+async def get_json(request):
+    if request.headers.get('content-type', '').split(';')[0] != 'application/json':
+        return None
+    try:
+        return await request.json()
+    except ValueError:
+        raise HTTPException(400)
+
+
+'''
+paginate(session, query, page)
+    same semantics of flask_sqlalchemy paginate: 404 for an invalid page or a
+    page without items other than the first one
+'''
+
+
+async def paginate(session, query, page):
+    if page < 1:
+        raise HTTPException(404)
+
+    items = (await session.execute(
+        query.limit(QUESTIONS_PER_PAGE)
+             .offset((page - 1) * QUESTIONS_PER_PAGE))).all()
+    if not items and page != 1:
+        raise HTTPException(404)
+
+    total = await session.scalar(
+        select(func.count()).select_from(query.order_by(None).subquery()))
+
+    return items, total
+
+
+async def categories_formated(session):
+    rows = await session.execute(
+        select(categories_table.c.id, categories_table.c.type)
+        .order_by(categories_table.c.id))
+    return {category_id: type_ for category_id, type_ in rows}
+
+
+def questions_query():
+    return select(*question_columns)
+
+
+async def get_categories(request):
+    async with Session() as session:
+        categories = await categories_formated(session)
+
+    return json_response({
+        'success': True,
+        'categories': categories,
+        'total_categories': len(categories)
+    })
+
+
+async def get_questions(request):
+    page = arg_int(request, 'page', 1)
+    current_category = arg_int(request, 'current_category')
+
+    query = questions_query().order_by(Question.id)
+    if current_category is not None:
+        query = query.where(Question.category == current_category)
+
+    async with Session() as session:
+        questions, total = await paginate(session, query, page)
+        categories = await categories_formated(session)
+
+    return json_response({
+        'success': True,
+        'questions': [format_question_row(row) for row in questions],
+        'total_questions': total,
+        'current_category': current_category,
+        'categories': categories
+    })
+
+
+'''
+export_questions(request)
+    the questions after since as newline delimited JSON, streamed from a
+    server-side cursor and gzipped if asked, like the sync export
+'''
+
+
+async def export_questions(request):
+    since = arg_int(request, 'since')
+    compress = wants_gzip(request)
+
+    query = questions_query().order_by(Question.id)
+    if since is not None:
+        query = query.where(Question.id > since)
+
+    async def generate():
+        chunks = NdjsonChunks(provider, compress)
+        async with Session() as session:
+            rows = await session.stream(
+                query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for row in rows:
+                chunk = chunks.write(format_question_row(row))
+                if chunk:
+                    yield chunk
+
+        chunk = chunks.close()
+        if chunk:
+            yield chunk
+
+    headers = {'Vary': 'Accept-Encoding'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(generate(), media_type='application/x-ndjson',
+                             headers=headers)
+
+
+'''
+import_questions(request)
+    the same report of the sync import: the body is spooled, then validated
+    by bulk_import.py and inserted a batch per transaction
+'''
+
+
+async def import_questions(request):
+    content_type = request.headers.get('content-type', '')
+    fmt = request.query_params.get('format') or \
+        IMPORT_CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+    if fmt not in FORMATS:
+        raise HTTPException(400)
+
+    report = new_report()
+    with SpooledTemporaryFile(IMPORT_SPOOL_SIZE) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+
+        async with Session() as session:
+            categories = set(await session.scalars(
+                select(categories_table.c.id)))
+            for rows in validated_batches(body, fmt, categories, report):
+                try:
+                    await session.execute(insert(questions_table), rows)
+                    await session.commit()
+                    report['inserted'] += len(rows)
+                except Exception as error:
+                    await session.rollback()
+                    batch_failed(report, rows, error)
+
+    return json_response(dict(report, success=True))
+
+
+async def delete_question(request):
+    question_id = request.path_params['question_id']
+
+    async with Session() as session:
+        try:
+            result = await session.execute(
+                delete(questions_table)
+                .where(questions_table.c.id == question_id))
+            await session.commit()
+        except Exception:
+            raise HTTPException(422)
+
+    # the sync app turns the not found abort into a 422 as well
+    if result.rowcount == 0:
+        raise HTTPException(422)
+
+    return json_response({
+        'success': True,
+        'deleted': question_id
+    })
+
+
+async def add_or_search_questions(request):
+    body = await get_json(request)
+    if body is None:
+        raise HTTPException(400)
+
+    search_term = body.get('searchTerm', None)
+
+    if search_term:
+        page = arg_int(request, 'page', 1)
+        query = questions_query() \
+            .where(Question.question.ilike('%' + search_term + '%')) \
+            .order_by(Question.id)
+
+        async with Session() as session:
+            questions, total = await paginate(session, query, page)
+
+        return json_response({
+            'success': True,
+            'questions': [format_question_row(row) for row in questions],
+            'total_questions': total
+        })
+
+    values = {key: body.get(key, None)
+              for key in ('question', 'answer', 'difficulty', 'category')}
+    if any(value is None for value in values.values()):
+        raise HTTPException(400)
+
+    async with Session() as session:
+        try:
+            result = await session.execute(
+                insert(questions_table).values(**values))
+            await session.commit()
+        except Exception:
+            raise HTTPException(422)
+
+    return json_response({
+        'success': True,
+        'created': result.inserted_primary_key[0]
+    })
+
+
+async def get_questions_by_category(request):
+    category_id = request.path_params['category_id']
+    page = arg_int(request, 'page', 1)
+
+    async with Session() as session:
+        current_category = await session.scalar(
+            select(categories_table.c.type)
+            .where(categories_table.c.id == category_id))
+        if current_category is None:
+            raise HTTPException(404)
+
+        query = questions_query() \
+            .where(Question.category == category_id) \
+            .order_by(Question.id)
+        questions, total = await paginate(session, query, page)
+
+    return json_response({
+        'success': True,
+        'questions': [format_question_row(row) for row in questions],
+        'current_category': current_category,
+        'total_questions': total
+    })
+
+
+async def quizzes(request):
+    try:
+        body = await get_json(request) or {}
+
+        previous_questions = body.get('previous_questions', None)
+        quiz_category = body.get('quiz_category', None)
+
+        query = questions_query()
+        if previous_questions is not None:
+            query = query.where(Question.id.notin_(previous_questions))
+
+        if quiz_category is not None and quiz_category['id'] != 0:
+            query = query.where(Question.category == quiz_category['id'])
+
+        async with Session() as session:
+            question = (await session.execute(
+                query.order_by(func.random()).limit(1))).first()
+    except Exception:
+        raise HTTPException(422)
+
+    if question is not None:
+        question = format_question_row(question)
+
+    return json_response({
+        'success': True,
+        'question': question
+    })
+
+
+'''
+Error handlers for expected errors, same payloads of the sync app
+'''
+
+
+async def http_error(request, exc):
+    status = exc.status_code if exc.status_code in ERROR_MESSAGES else 500
+    return json_response({
+        "error": status,
+        "message": ERROR_MESSAGES[status],
+        "success": False
+    }, status)
+
+
+async def server_error(request, exc):
+    return json_response({
+        "error": 500,
+        "message": ERROR_MESSAGES[500],
+        "success": False
+    }, 500)
+
+
+routes = [
+    Route('/categories', get_categories),
+    Route('/questions', get_questions, methods=['GET']),
+    Route('/questions', add_or_search_questions, methods=['POST']),
+    Route('/questions/export', export_questions, methods=['GET']),
+    Route('/questions/import', import_questions, methods=['POST']),
+    Route('/questions/{question_id:int}', delete_question,
+          methods=['DELETE']),
+    Route('/categories/{category_id:int}/questions',
+          get_questions_by_category),
+    Route('/quizzes', quizzes, methods=['POST']),
+]
+
+middleware = [
+    Middleware(CORSMiddleware, allow_origins=['*'],
+               allow_headers=['Content-Type', 'Authorization', 'true'],
+               allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']),
+]
+
+app = Starlette(routes=routes, middleware=middleware,
+                exception_handlers={HTTPException: http_error,
+                                    Exception: server_error},
+                on_shutdown=[engine.dispose])
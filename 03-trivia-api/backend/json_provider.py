@@ -0,0 +1,179 @@
+from datetime import date, datetime, time
+from flask import current_app, request, stream_with_context
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fallback to the stdlib json
+    orjson = None
+
+
+# the types orjson serializes natively, in the same ISO 8601 form
+def default(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+
+    return str(value)
+
+
+'''
+JSONProvider
+    serializes the response payloads with the stdlib json module in the
+    compact form, jsonify pretty-prints and sorts keys which is only useful
+    when debugging by hand. Dates and times are sent in ISO 8601
+'''
+
+
+class JSONProvider:
+    mimetype = 'application/json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=default).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def response(self, obj, status=200):
+        return current_app.response_class(
+            self.dumps(obj), status=status, mimetype=self.mimetype)
+
+
+'''
+OrjsonProvider
+    same contract and output of JSONProvider backed by orjson, the integer
+    keys are allowed because the categories are keyed by their integer id
+'''
+
+
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+# orjson when it is installed
+def default_provider():
+    return OrjsonProvider() if orjson is not None else JSONProvider()
+
+
+'''
+init_json(app, provider=None)
+    binds a JSON provider to the flask application, orjson is used when
+    installed unless a provider is explicitly given
+'''
+
+
+def init_json(app, provider=None):
+    if provider is None:
+        provider = default_provider()
+
+    app.extensions['json_provider'] = provider
+    return provider
+
+
+'''
+json_response(obj, status=200)
+    drop-in replacement of jsonify using the provider bound to the current app,
+    the unit of work of the request (unit_of_work.py) ends before serializing
+'''
+
+
+def json_response(obj, status=200):
+    provider = current_app.extensions.get('json_provider')
+    if provider is None:
+        provider = init_json(current_app)
+
+    unit_of_work = current_app.extensions.get('unit_of_work')
+    if unit_of_work is not None:
+        unit_of_work.before_serialization(status)
+
+    return provider.response(obj, status)
+
+
+'''
+NdjsonChunks(provider, compress=False)
+    encodes records as newline delimited JSON, write() returns the lines in
+    chunks of about CHUNK_SIZE bytes (b'' until one is full), optionally
+    gzipped on the fly, and close() the rest. Shared by ndjson_response and
+    the async build (flaskr/asgi.py)
+'''
+CHUNK_SIZE = 64 * 1024
+
+
+class NdjsonChunks:
+    def __init__(self, provider, compress=False):
+        self.provider = provider
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) \
+            if compress else None
+        self.buffer = []
+        self.size = 0
+
+    def write(self, record):
+        line = self.provider.dumps(record) + b'\n'
+        self.buffer.append(line)
+        self.size += len(line)
+        if self.size < CHUNK_SIZE:
+            return b''
+
+        chunk = b''.join(self.buffer)
+        self.buffer, self.size = [], 0
+        if self.compressor is not None:
+            chunk = self.compressor.compress(chunk)
+        return chunk
+
+    def close(self):
+        chunk = b''.join(self.buffer)
+        self.buffer, self.size = [], 0
+        if self.compressor is not None:
+            chunk = self.compressor.compress(chunk) + self.compressor.flush()
+        return chunk
+
+
+'''
+ndjson_response(records, compress=False)
+    streams an iterable of dicts as newline delimited JSON, so the memory
+    stays constant whatever the number of records
+'''
+
+
+def ndjson_response(records, compress=False):
+    provider = current_app.extensions.get('json_provider')
+    if provider is None:
+        provider = init_json(current_app)
+
+    def generate():
+        chunks = NdjsonChunks(provider, compress)
+        for record in records:
+            chunk = chunks.write(record)
+            if chunk:
+                yield chunk
+
+        chunk = chunks.close()
+        if chunk:
+            yield chunk
+
+    response = current_app.response_class(
+        stream_with_context(generate()), mimetype='application/x-ndjson')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    return response
+
+
+'''
+wants_gzip()
+    the gzip query argument wins when given (gzip=true|false), otherwise the
+    Accept-Encoding header of the request is used
+'''
+
+
+def wants_gzip():
+    value = request.args.get('gzip')
+    if value is not None:
+        return value.lower() in ('1', 'true', 'yes')
+
+    return 'gzip' in request.accept_encodings
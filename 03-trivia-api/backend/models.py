@@ -1,25 +1,29 @@
 from os import environ
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_host = environ.get('DATABASE_HOST', "localhost:5432")
 database_name = environ.get('DATABASE_NAME', "trivia")
 database_user = environ.get('DATABASE_USER', "app_user")
-database_path = "postgres://{}@{}/{}".format(database_user, database_host, database_name)
+database_path = environ.get(
+  'DATABASE_URL',
+  "postgres://{}@{}/{}".format(database_user, database_host, database_name))
 
-db = SQLAlchemy()
+# the request is committed once and its session removed before the response
+# is built (unit_of_work.py), the instances keep their loaded state
+db = SQLAlchemy(session_options={'expire_on_commit': False})
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service, without touching
+    the database: the tables are created by `flask create-db`
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
-    db.create_all()
 
 '''
 Question
@@ -31,7 +35,7 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -40,16 +44,17 @@ class Question(db.Model):
     self.category = category
     self.difficulty = difficulty
 
+  # flushed, not committed: the request commits once (unit_of_work.py)
   def insert(self):
     db.session.add(self)
-    db.session.commit()
+    db.session.flush()
 
   def update(self):
-    db.session.commit()
+    db.session.flush()
 
   def delete(self):
     db.session.delete(self)
-    db.session.commit()
+    db.session.flush()
 
   def format(self):
     return {
@@ -60,6 +65,24 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+'''
+Question rows
+    columns selected by the list endpoints, the query returns plain row tuples
+    so no Question instance is hydrated, format_question_row has the same
+    output of Question.format()
+'''
+question_columns = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+
+def format_question_row(row):
+  return {
+    'id': row[0],
+    'question': row[1],
+    'answer': row[2],
+    'category': row[3],
+    'difficulty': row[4]
+  }
+
 '''
 Category
 
@@ -0,0 +1,57 @@
+# --------------------------------------------------------------------------- #
+# Statements
+# the queries of the hottest endpoints are baked queries: the Query object is
+# built and its SQL compiled once per process (the cache key is the code of
+# the lambdas), a request only binds its parameters with bindparam
+# --------------------------------------------------------------------------- #
+from flask import abort
+from flask_sqlalchemy import Pagination
+from sqlalchemy import bindparam, func
+from sqlalchemy.ext import baked
+
+from models import db, Question, question_columns
+
+bakery = baked.bakery()
+
+
+'''
+paginate(items, count, page, per_page, **params)
+    same result and 404s as BaseQuery.paginate() for a baked items query
+    (with limit and offset bind parameters) and its baked count query
+'''
+
+
+def paginate(items, count, page, per_page, **params):
+    if page < 1:
+        abort(404)
+
+    session = db.session()
+    rows = items(session).params(limit=per_page, offset=(page - 1) * per_page,
+                                 **params).all()
+    if not rows and page != 1:
+        abort(404)
+
+    if page == 1 and len(rows) < per_page:
+        total = len(rows)
+    else:
+        total = count(session).params(**params).scalar()
+
+    return Pagination(None, page, per_page, total, rows)
+
+
+def questions_page(page, per_page, category=None):
+    items = bakery(lambda session: session.query(*question_columns))
+    count = bakery(lambda session: session.query(func.count(Question.id)))
+    params = {}
+    if category is not None:
+        items += lambda query: query.filter(
+            Question.category == bindparam('category'))
+        count += lambda query: query.filter(
+            Question.category == bindparam('category'))
+        params['category'] = category
+
+    items += lambda query: query.order_by(Question.id) \
+                                .limit(bindparam('limit')) \
+                                .offset(bindparam('offset'))
+
+    return paginate(items, count, page, per_page, **params)
@@ -1,10 +1,18 @@
 from os import environ
+from types import SimpleNamespace
+import gc
+import os
+import runpy
 import unittest
+from unittest.mock import patch
 import json
-from flask_sqlalchemy import SQLAlchemy
+import gzip
+
+from sqlalchemy import event
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, Question, Category
+from bulk_import import MAX_ERRORS
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,14 +20,14 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_host = environ.get('DATABASE_HOST', "localhost:5432")
         self.database_name = "trivia_test"
         self.database_user = environ.get('DATABASE_USER', "app_user")
-        self.database_path = "postgres://{}@{}/{}".format(self.database_user, self.database_host, self.database_name)
+        self.database_path = environ.get('TEST_DATABASE_URL', "postgres://{}@{}/{}".format(self.database_user, self.database_host, self.database_name))
 
-        setup_db(self.app, self.database_path)
+        # the schema and the rows come from the fixtures of conftest.py
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.client = self.app.test_client
 
         self.new_question = {
             'question': 'What is the answer for the universe and everything else?',
@@ -28,13 +36,6 @@ class TriviaTestCase(unittest.TestCase):
             'category': 1 # Science
         }
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-
     def tearDown(self):
         """Executed after reach test"""
         pass
@@ -98,6 +99,31 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.content_type, 'application/json')
         self.assertEqual(data['success'], False)
 
+    def test_export_questions(self):
+        res = self.client().get('/questions/export?gzip=false')
+        questions = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content_type, 'application/x-ndjson')
+        self.assertGreater(len(questions), 0)
+        self.assertEqual(questions, sorted(questions, key=lambda q: q['id']))
+
+    def test_export_questions_since(self):
+        res = self.client().get('/questions/export?gzip=false&since=10')
+        questions = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all(question['id'] > 10 for question in questions))
+
+    def test_export_questions_gzip(self):
+        res = self.client().get('/questions/export',
+                                headers={'Accept-Encoding': 'gzip'})
+        lines = gzip.decompress(res.data).splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertGreater(len(lines), 0)
+
     def test_delete_valid_question(self):
         random_question_to_delete = Question.query.limit(1).first()
         question_id = random_question_to_delete.id
@@ -186,6 +212,73 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['created'], question.id)
 
+    def test_bulk_import_questions_csv(self):
+        body = 'question,answer,category,difficulty\n' \
+               'What is the boiling point of water in Celsius?,100,1,1\n' \
+               'A question without answer,,1,1\n'
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(data['errors'][0]['line'], 3)
+
+    def test_bulk_import_questions_ndjson(self):
+        body = '{"question": "How many legs has a spider?", "answer": "8", "category": 1, "difficulty": 1}\n' \
+               '{"question": "Invalid difficulty", "answer": "x", "category": 1, "difficulty": 9}\n' \
+               'not json\n'
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['failed'], 2)
+
+    def test_bulk_import_caps_the_errors(self):
+        body = 'question,answer,category,difficulty\n' + \
+               'A question without answer,,1,1\n' * (MAX_ERRORS + 50)
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['failed'], MAX_ERRORS + 50)
+        self.assertEqual(data['error_count'], MAX_ERRORS + 50)
+        self.assertEqual(len(data['errors']), MAX_ERRORS)
+        self.assertEqual(data['errors'][0]['line'], 2)
+
+    def test_bulk_import_reports_invalid_utf8(self):
+        for content_type, body in [
+                ('application/x-ndjson',
+                 b'{"question": "Is this UTF-8?", "answer": "yes", "category": 1, "difficulty": 1}\n'
+                 b'\xff\xfe\n'),
+                ('text/csv',
+                 b'question,answer,category,difficulty\n'
+                 b'Is this UTF-8?,yes,1,1\n'
+                 b'\xff\xfe,no,1,1\n')]:
+            res = self.client().post('/questions/import', data=body,
+                                     content_type=content_type)
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['inserted'], 1)
+            self.assertEqual(data['failed'], 1)
+            self.assertEqual(data['errors'][0]['line'],
+                             3 if content_type == 'text/csv' else 2)
+            self.assertIn('UTF-8', data['errors'][0]['message'])
+
+    def test_400_bulk_import_unknown_format(self):
+        res = self.client().post('/questions/import', data='<xml/>',
+                                 content_type='application/xml')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     def test_400_if_question_creation_fails(self):
         res = self.client().post('/questions', json={})
         data = json.loads(res.data)
@@ -243,6 +336,124 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Method not allowed')
 
+    def test_failed_warm_up_is_logged_and_pool_emptied(self):
+        errors = []
+        disposed = []
+        server = SimpleNamespace(
+            app=SimpleNamespace(wsgi=lambda: self.app),
+            log=SimpleNamespace(exception=errors.append,
+                                info=lambda *args: None))
+        config = runpy.run_path(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+        with self.app.app_context():
+            engine = db.get_engine(self.app)
+
+        def on_dispose(engine):
+            disposed.append(engine)
+        event.listen(engine, 'engine_disposed', on_dispose)
+
+        try:
+            with patch('flaskr.warm_up',
+                       side_effect=RuntimeError('database is down')):
+                config['when_ready'](server)
+        finally:
+            event.remove(engine, 'engine_disposed', on_dispose)
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+
+        self.assertEqual(errors, ['warm up failed before fork'])
+        self.assertEqual(disposed, [engine])
+
+
+class TriviaAsgiTestCase(unittest.TestCase):
+    """The async deployment must answer with the same payloads of the sync app"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            from starlette.testclient import TestClient
+        except ImportError:
+            raise unittest.SkipTest('requirements-async.txt is not installed')
+
+        database_host = environ.get('DATABASE_HOST', "localhost:5432")
+        database_user = environ.get('DATABASE_USER', "app_user")
+        environ.setdefault('ASYNC_DATABASE_URL', environ.get(
+            'TEST_DATABASE_URL', "postgres://{}@{}/{}".format(
+                database_user, database_host, "trivia_test")))
+
+        from flaskr.asgi import app
+        cls.async_client = TestClient(app)
+
+    def setUp(self):
+        self.app = create_app(
+            {'SQLALCHEMY_DATABASE_URI': environ['ASYNC_DATABASE_URL']})
+        self.client = self.app.test_client
+
+    def test_same_categories(self):
+        res = self.async_client.get('/categories')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), json.loads(self.client().get('/categories').data))
+
+    def test_same_questions_page(self):
+        res = self.async_client.get('/questions?page=1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), json.loads(self.client().get('/questions?page=1').data))
+
+    def test_same_error_payloads(self):
+        for method, path in [('get', '/questions?page=99999'),
+                             ('get', '/categoriesssssss'),
+                             ('patch', '/categories/1/questions'),
+                             ('delete', '/questions/44141')]:
+            res = getattr(self.async_client, method)(path)
+            expected = getattr(self.client(), method)(path)
+
+            self.assertEqual(res.status_code, expected.status_code)
+            self.assertEqual(res.json(), json.loads(expected.data))
+
+    def test_same_export(self):
+        for path in ('/questions/export?gzip=false',
+                     '/questions/export?gzip=false&since=10'):
+            res = self.async_client.get(path)
+            expected = self.client().get(path)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.headers['content-type'],
+                             expected.content_type)
+            self.assertEqual(res.content.splitlines(),
+                             expected.data.splitlines())
+
+    def test_same_export_gzip(self):
+        headers = {'Accept-Encoding': 'gzip'}
+        res = self.async_client.get('/questions/export', headers=headers)
+        expected = self.client().get('/questions/export', headers=headers)
+
+        self.assertEqual(res.headers['content-encoding'], 'gzip')
+        # the test client of starlette decompresses the body
+        self.assertEqual(res.content.splitlines(),
+                         gzip.decompress(expected.data).splitlines())
+
+    def test_same_import_report(self):
+        # invalid records only, the async import commits what it inserts
+        for content_type, body in [
+                ('text/csv', b'question,answer,category,difficulty\n'
+                             b'A question without answer,,1,1\n'
+                             b'\xff\xfe,no,1,1\n'
+                             b'Too hard,x,1,9\n'),
+                ('application/x-ndjson', b'not json\n'
+                                         b'{"question": "q", "answer": "a", '
+                                         b'"category": 1000, "difficulty": 1}\n'),
+                ('application/xml', b'<xml/>')]:
+            res = self.async_client.post(
+                '/questions/import', data=body,
+                headers={'Content-Type': content_type})
+            expected = self.client().post('/questions/import', data=body,
+                                          content_type=content_type)
+
+            self.assertEqual(res.status_code, expected.status_code)
+            self.assertEqual(res.json(), json.loads(expected.data))
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+'''
+Test fixtures
+    the tests run against a temporary SQLite database created again by every
+    test (test_api.py), and Auth0 is replaced by a local JWKS file
+    (AUTH0_JWKS_URL=file://...): the tokens of the tests are signed by its
+    key with the permissions of ROLES
+'''
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from benchmarks.tokens import LocalIssuer, PERMISSIONS  # noqa: E402
+
+# before src.api is imported by the tests
+DIRECTORY = tempfile.mkdtemp(prefix='coffee-shop-')
+ISSUER = LocalIssuer(DIRECTORY)
+os.environ.update(ISSUER.environ('coffee-shop'))
+os.environ['DATABASE_URL'] = 'sqlite:///{}'.format(
+    os.path.join(DIRECTORY, 'database.db'))
+
+ROLES = {
+    'BARISTA_TOKEN': ['get:drinks-detail'],
+    'MANAGER_TOKEN': PERMISSIONS['coffee-shop'],
+    # creates drinks but cannot change the existing ones
+    'CREATOR_TOKEN': ['get:drinks-detail', 'post:drinks'],
+}
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def tokens():
+    for name, permissions in ROLES.items():
+        os.environ[name] = ISSUER.token('coffee-shop', permissions)
@@ -1,14 +1,17 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink, \
+    drink_columns, format_drink_row_short, format_drink_row_long
 from .auth.auth import AuthError, requires_auth
+from .json_provider import init_json, json_response
 
 app = Flask(__name__)
 setup_db(app)
+init_json(app)
 CORS(app)
 
 '''
@@ -30,11 +33,11 @@ CORS(app)
 
 @app.route('/drinks')
 def get_drinks():
-    drinks = Drink.query.all()
+    drinks = Drink.query.with_entities(*drink_columns).all()
 
-    return jsonify({
+    return json_response({
         "success": True,
-        "drinks": [drink.short() for drink in drinks]
+        "drinks": [format_drink_row_short(drink) for drink in drinks]
     })
 
 
@@ -51,11 +54,11 @@ def get_drinks():
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_detail(payload):
-    drinks = Drink.query.all()
+    drinks = Drink.query.with_entities(*drink_columns).all()
 
-    return jsonify({
+    return json_response({
         "success": True,
-        "drinks": [drink.long() for drink in drinks]
+        "drinks": [format_drink_row_long(drink) for drink in drinks]
     })
 
 
@@ -94,12 +97,129 @@ def create_drink(payload):
 
     drink.insert()
 
-    return jsonify({
+    return json_response({
         "success": True,
         "drinks": drink.long()
     })
 
 
+'''
+    POST /drinks/batch
+        it should upsert many drinks in a single transaction
+        the drinks are keyed on their unique title, existing drinks are
+            updated and the others are created
+        it should require the 'post:drinks' permission
+        updating an existing drink also requires the 'patch:drinks' permission
+        invalid items are reported without aborting the rest of the batch
+    returns status code 200 and json {"success": True, "results": results}
+        where results has the status of every item, in the request order
+        or appropriate status code indicating reason for failure
+'''
+
+MAX_BATCH_DRINKS = 500
+# the sizes of the title and recipe columns (database/models.py)
+MAX_TITLE_LENGTH = 80
+MAX_RECIPE_LENGTH = 180
+
+'''
+batch_item_error(title, recipe)
+    the reason an item of a batch is invalid, None when it is valid: a title
+    and a recipe of {color, name, parts} ingredients that fit their columns
+'''
+
+
+def batch_item_error(title, recipe):
+    if not isinstance(title, str) or not title.strip() \
+            or not isinstance(recipe, list) or not recipe:
+        return "title and recipe are required"
+
+    if len(title) > MAX_TITLE_LENGTH:
+        return "title is longer than {} characters".format(MAX_TITLE_LENGTH)
+
+    for ingredient in recipe:
+        if not isinstance(ingredient, dict) \
+                or not isinstance(ingredient.get('color'), str) \
+                or not isinstance(ingredient.get('name'), str) \
+                or isinstance(ingredient.get('parts'), bool) \
+                or not isinstance(ingredient.get('parts'), (int, float)):
+            return "every ingredient needs a color, a name and parts"
+
+    if len(json.dumps(recipe)) > MAX_RECIPE_LENGTH:
+        return "recipe is longer than {} characters".format(MAX_RECIPE_LENGTH)
+
+    return None
+
+
+@app.route('/drinks/batch', methods=['POST'])
+@requires_auth('post:drinks')
+def batch_drinks(payload):
+    body = request.get_json()
+    if body is None:
+        abort(400)
+
+    items = body.get('drinks', None)
+    if not isinstance(items, list) or len(items) > MAX_BATCH_DRINKS:
+        abort(400)
+
+    can_patch = 'patch:drinks' in payload.get('permissions', [])
+
+    titles = {item.get('title') for item in items if isinstance(item, dict)
+              and isinstance(item.get('title'), str)}
+    drinks = {drink.title: drink for drink in
+              Drink.query.filter(Drink.title.in_(titles)).all()}
+
+    results = []
+    changed = []
+    for item in items:
+        title = item.get('title', None) if isinstance(item, dict) else None
+        recipe = item.get('recipe', None) if isinstance(item, dict) else None
+
+        # a single ingredient is stored as a recipe of one
+        if type(recipe) is dict:
+            recipe = [recipe]
+
+        error = batch_item_error(title, recipe)
+        if error is not None:
+            results.append({"title": title, "status": "error",
+                            "message": error})
+            continue
+
+        # convert to string to properly store the array
+        recipe = json.dumps(recipe)
+
+        drink = drinks.get(title)
+        if drink is None:
+            drink = Drink(title=title, recipe=recipe)
+            db.session.add(drink)
+            drinks[title] = drink
+            status = "created"
+        elif not can_patch:
+            results.append({"title": title, "status": "error",
+                            "message": "User has no patch:drinks on this resource"})
+            continue
+        else:
+            drink.recipe = recipe
+            status = "updated"
+
+        results.append({"title": title, "status": status})
+        changed.append((results[-1], drink))
+
+    try:
+        # flush to get the ids before the commit expires the instances
+        db.session.flush()
+        for result, drink in changed:
+            result["drink"] = drink.long()
+        db.session.commit()
+    except:
+        db.session.rollback()
+        abort(422)
+
+    return json_response({
+        "success": True,
+        "results": results
+    })
+
+
 '''
     PATCH /drinks/<id>
         where <id> is the existing model id
@@ -141,7 +261,7 @@ def update_drink(payload, drink_id):
     except:
         abort(422)
 
-    return jsonify({
+    return json_response({
         "success": True,
         "drinks": [drink.long()]
     })
@@ -171,7 +291,7 @@ def delete_drink(payload, drink_id):
     except:
         abort(422)
 
-    return jsonify({
+    return json_response({
         "success": True,
         "delete": drink_id
     })
@@ -181,62 +301,62 @@ def delete_drink(payload, drink_id):
 
 @app.errorhandler(401)
 def bad_request(error):
-    return jsonify({
+    return json_response({
         "error": 401,
         "message": "Unauthorized",
         "success": False
-    }), 401
+    }, 401)
 
 
 @app.errorhandler(400)
 def bad_request(error):
-    return jsonify({
+    return json_response({
         "error": 400,
         "message": "Bad request",
         "success": False
-    }), 400
+    }, 400)
 
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return json_response({
         "error": 404,
         "message": "Resource could not be found",
         "success": False
-    }), 404
+    }, 404)
 
 
 @app.errorhandler(405)
 def unprocessable(error):
-    return jsonify({
+    return json_response({
         "error": 405,
         "message": "Method not allowed",
         "success": False
-    }), 405
+    }, 405)
 
 
 @app.errorhandler(422)
 def unprocessable(error):
-    return jsonify({
+    return json_response({
         "error": 422,
         "message": "Request could not be processable",
         "success": False
-    }), 422
+    }, 422)
 
 
 @app.errorhandler(500)
 def unprocessable(error):
-    return jsonify({
+    return json_response({
         "error": 500,
         "message": "Internal server error",
         "success": False
-    }), 500
+    }, 500)
 
 
 @app.errorhandler(AuthError)
 def auth_error(error):
-    return jsonify({
+    return json_response({
         "success": False,
         "error": error.status_code,
         "message": error.error['description']
-    }), error.status_code
+    }, error.status_code)
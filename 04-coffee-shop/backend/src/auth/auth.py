@@ -7,6 +7,8 @@ from urllib.request import urlopen
 
 AUTH0_DOMAIN = environ.get('AUTH0_DOMAIN', 'dev-ehvlmutg.us.auth0.com')
 ALGORITHMS = ['RS256']
+JWKS_URL = environ.get('AUTH0_JWKS_URL',
+                      f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
 API_AUDIENCE = environ.get('AUTH0_AUDIENCE', 'coffee')
 
 '''
@@ -99,7 +101,7 @@ def check_permissions(permission, payload):
 
 # code of https://github.com/udacity/FSND/blob/master/BasicFlaskAuth/app.py
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+    jsonurl = urlopen(JWKS_URL)
     jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
@@ -5,8 +5,8 @@ import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(
-    os.path.join(project_dir, database_filename))
+database_path = os.environ.get('DATABASE_URL', "sqlite:///{}".format(
+    os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
@@ -119,3 +119,30 @@ class Drink(db.Model):
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+'''
+Drink rows
+    columns selected by the list endpoints, the query returns plain row tuples
+    so no Drink instance is hydrated, the format functions have the same
+    output of Drink.short() and Drink.long()
+'''
+drink_columns = (Drink.id, Drink.title, Drink.recipe)
+
+
+def format_drink_row_short(row):
+    short_recipe = [{'color': r['color'], 'parts': r['parts']}
+                    for r in json.loads(row[2])]
+    return {
+        'id': row[0],
+        'title': row[1],
+        'recipe': short_recipe
+    }
+
+
+def format_drink_row_long(row):
+    return {
+        'id': row[0],
+        'title': row[1],
+        'recipe': json.loads(row[2])
+    }
@@ -0,0 +1,79 @@
+from datetime import date, datetime, time
+from flask import current_app
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fallback to the stdlib json
+    orjson = None
+
+
+# dates in ISO 8601, as orjson sends them
+def default(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+
+    return str(value)
+
+
+'''
+JSONProvider
+    the drinks in compact JSON with the stdlib json module
+'''
+
+
+class JSONProvider:
+    mimetype = 'application/json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=default).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def response(self, obj, status=200):
+        return current_app.response_class(
+            self.dumps(obj), status=status, mimetype=self.mimetype)
+
+
+'''
+OrjsonProvider
+    the same output as JSONProvider, serialized by orjson
+'''
+
+
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+'''
+init_json(app, provider=None)
+    binds a JSON provider to the flask application, orjson is used when
+    installed unless a provider is explicitly given
+'''
+
+
+def init_json(app, provider=None):
+    if provider is None:
+        provider = OrjsonProvider() if orjson is not None else JSONProvider()
+
+    app.extensions['json_provider'] = provider
+    return provider
+
+
+'''
+json_response(obj, status=200)
+    drop-in replacement of jsonify using the provider bound to the current app
+'''
+
+
+def json_response(obj, status=200):
+    provider = current_app.extensions.get('json_provider')
+    if provider is None:
+        provider = init_json(current_app)
+
+    return provider.response(obj, status)
@@ -0,0 +1,151 @@
+from os import environ
+import unittest
+import json
+from datetime import date, datetime
+
+from flask import jsonify
+
+from src.api import app, MAX_BATCH_DRINKS
+from src.json_provider import JSONProvider, OrjsonProvider, json_response, \
+    orjson
+from src.database.models import db_drop_and_create_all, Drink
+
+
+class CoffeeShopTestCase(unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        # the database and the tokens come from conftest.py
+        self.client = app.test_client
+        with app.app_context():
+            db_drop_and_create_all()
+            Drink(title='Water', recipe=json.dumps([
+                {'color': 'blue', 'name': 'water', 'parts': 1}])).insert()
+
+        self.recipe = [{'color': 'brown', 'name': 'coffee', 'parts': 2},
+                       {'color': 'white', 'name': 'milk', 'parts': 1}]
+
+    def tearDown(self):
+        """Executed after reach test"""
+        pass
+
+    def headers(self, role):
+        return {'Authorization': 'Bearer ' + environ[role]}
+
+    def batch(self, drinks, role='MANAGER_TOKEN'):
+        return self.client().post('/drinks/batch', json={'drinks': drinks},
+                                  headers=self.headers(role))
+
+    def recipe_of(self, title):
+        with app.app_context():
+            drink = Drink.query.filter_by(title=title).one_or_none()
+            return drink.long()['recipe'] if drink is not None else None
+
+    def test_batch_creates_and_updates_drinks(self):
+        res = self.batch([
+            {'title': 'Latte', 'recipe': self.recipe},
+            {'title': 'Water', 'recipe': {'color': 'blue', 'name': 'water',
+                                          'parts': 2}},
+        ])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'updated'])
+        self.assertEqual(data['results'][0]['drink']['recipe'], self.recipe)
+        self.assertEqual(self.recipe_of('Latte'), self.recipe)
+        self.assertEqual(self.recipe_of('Water'),
+                         [{'color': 'blue', 'name': 'water', 'parts': 2}])
+
+    def test_batch_reports_invalid_items(self):
+        invalid = [
+            {'recipe': self.recipe},
+            {'title': 42, 'recipe': self.recipe},
+            {'title': 'Empty', 'recipe': []},
+            {'title': 'Text', 'recipe': 'coffee and milk'},
+            {'title': 'No parts', 'recipe': [{'color': 'brown',
+                                              'name': 'coffee'}]},
+            {'title': 'Bool parts', 'recipe': [{'color': 'brown',
+                                                'name': 'coffee',
+                                                'parts': True}]},
+            {'title': 'Long', 'recipe': self.recipe * 10},
+            'Espresso',
+        ]
+        res = self.batch(invalid + [{'title': 'Latte', 'recipe': self.recipe}])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['error'] * len(invalid) + ['created'])
+        self.assertTrue(all(result['message']
+                            for result in data['results'][:-1]))
+        self.assertIsNone(self.recipe_of('Empty'))
+        self.assertEqual(self.recipe_of('Latte'), self.recipe)
+
+    def test_400_batch_over_the_limit(self):
+        drinks = [{'title': 'Drink {}'.format(i), 'recipe': self.recipe}
+                  for i in range(MAX_BATCH_DRINKS + 1)]
+        res = self.batch(drinks)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIsNone(self.recipe_of('Drink 0'))
+
+    def test_400_batch_without_drinks(self):
+        res = self.batch({'title': 'Latte', 'recipe': self.recipe})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_batch_update_requires_patch_permission(self):
+        res = self.batch([
+            {'title': 'Water', 'recipe': self.recipe},
+            {'title': 'Latte', 'recipe': self.recipe},
+        ], role='CREATOR_TOKEN')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['error', 'created'])
+        self.assertEqual(self.recipe_of('Water'),
+                         [{'color': 'blue', 'name': 'water', 'parts': 1}])
+
+    def test_401_batch_requires_post_permission(self):
+        res = self.batch([{'title': 'Latte', 'recipe': self.recipe}],
+                         role='BARISTA_TOKEN')
+
+        self.assertEqual(res.status_code, 401)
+        self.assertIsNone(self.recipe_of('Latte'))
+
+    def test_401_batch_without_token(self):
+        res = self.client().post('/drinks/batch', json={'drinks': []})
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_json_response_matches_jsonify(self):
+        payload = {'success': True, 'drinks': [
+            {'id': 1, 'title': 'Café au lait', 'recipe': self.recipe}]}
+        with app.test_request_context():
+            sent = json_response(payload)
+            expected = jsonify(payload)
+
+        self.assertEqual(sent.content_type, expected.content_type)
+        self.assertEqual(json.loads(sent.data), json.loads(expected.data))
+
+    def test_json_providers_send_iso_datetimes(self):
+        payload = {'date': date(2020, 1, 1),
+                   'datetime': datetime(2020, 1, 1, 20, 30, 0, 500),
+                   1: 'integer key'}
+        expected = {'date': '2020-01-01',
+                    'datetime': '2020-01-01T20:30:00.000500',
+                    '1': 'integer key'}
+
+        self.assertEqual(json.loads(JSONProvider().dumps(payload)), expected)
+        if orjson is not None:
+            self.assertEqual(json.loads(OrjsonProvider().dumps(payload)),
+                             expected)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
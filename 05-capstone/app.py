@@ -3,19 +3,63 @@
 # --------------------------------------------------------------------------- #
 from config import setup_db, db
 from models import Actor, Movie, Cast
+from projections import paginate_actors, paginate_movies, actors_long, \
+    movies_long, export_actors, export_movies, ACTORS_PER_PAGE, \
+    MOVIES_PER_PAGE
 from flask_cors import CORS
-from flask import Flask, request, abort, jsonify
-from auth import requires_auth, AuthError
+from flask import Flask, request, abort
+from auth import requires_auth, AuthError, get_jwks
+from unit_of_work import UnitOfWork
+from json_provider import init_json, json_response, ndjson_response, \
+    wants_gzip
+from sqlalchemy.orm import configure_mappers
+from datetime import date
 import sys
 
-ACTORS_PER_PAGE = 5
-MOVIES_PER_PAGE = 5
+'''
+release dates are sent as YYYY-MM-DD strings, parsed here instead of relying
+on the database casting them (SQLite does not)
+'''
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        abort(422)
+
+
+'''
+warm_up(app)
+    builds what the first requests would: the mappers, the baked list
+    queries and the Auth0 JWKS. gunicorn.conf.py calls it in the master
+    before the workers fork, if Auth0 can't be reached the JWKS stays loaded
+    on the first request. gunicorn.conf.py logs the other failures and
+    empties the pool all the same
+'''
+
+
+def warm_up(app):
+    configure_mappers()
+    with app.app_context():
+        actors_long(paginate_actors(1, ACTORS_PER_PAGE).items)
+        movies_long(paginate_movies(1, MOVIES_PER_PAGE).items)
+    try:
+        get_jwks()
+    except (OSError, ValueError) as error:
+        app.logger.warning('JWKS not loaded before fork: %s', error)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is None:
+        setup_db(app)
+    else:
+        app.config.from_mapping(test_config)
+        setup_db(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    UnitOfWork(app)
+    init_json(app)
     CORS(app, resources={r"/*": {"origins": "*"}})
 
     @app.after_request
@@ -29,7 +73,7 @@ def create_app(test_config=None):
     # index for check health
     @app.route('/')
     def index():
-        return jsonify({
+        return json_response({
             "success": True,
             "message": 'healthy'
         })
@@ -45,18 +89,27 @@ def create_app(test_config=None):
     @requires_auth('get:actors')
     def get_actors(payload):
         page = request.args.get('page', 1, type=int)
-        actors = Actor.query.order_by(Actor.id)
 
-        actors = actors.paginate(page=page, per_page=ACTORS_PER_PAGE)
+        actors = paginate_actors(page, ACTORS_PER_PAGE)
         if actors is None:
             abort(404)
 
-        return jsonify({
+        return json_response({
             "success": True,
-            "actors": [actor.long() for actor in actors.items],
+            "actors": actors_long(actors.items),
             "total": actors.total,
         })
 
+    '''
+  Endpoint to export every actor and their movies as newline delimited JSON,
+  since (optional) is the last actor ID already exported
+  '''
+    @app.route('/actors/export')
+    @requires_auth('get:actors')
+    def export_actors_ndjson(payload):
+        since = request.args.get('since', type=int)
+        return ndjson_response(export_actors(since), compress=wants_gzip())
+
     '''
   Endpoint to handle create an actor
   This endpoint return if success the actor ID, otherwise 400 or 422 errors
@@ -83,7 +136,7 @@ def create_app(test_config=None):
             db.session.rollback()
             abort(422)
 
-        return jsonify({
+        return json_response({
             "success": True,
             "actor": actor.id
         })
@@ -123,7 +176,7 @@ def create_app(test_config=None):
             db.session.rollback()
             abort(422)
 
-        return jsonify({
+        return json_response({
             "success": True,
             "actor": actor.short()
         })
@@ -145,7 +198,7 @@ def create_app(test_config=None):
             db.session.rollback()
             abort(422)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'deleted': actor_id
         })
@@ -161,18 +214,27 @@ def create_app(test_config=None):
     @requires_auth('get:movies')
     def get_movies(payload):
         page = request.args.get('page', 1, type=int)
-        movies = Movie.query.order_by(Movie.id)
 
-        movies = movies.paginate(page=page, per_page=MOVIES_PER_PAGE)
+        movies = paginate_movies(page, MOVIES_PER_PAGE)
         if movies is None:
             abort(404)
 
-        return jsonify({
+        return json_response({
             "success": True,
             "total": movies.total,
-            "movies": [movie.long() for movie in movies.items],
+            "movies": movies_long(movies.items),
         })
     '''
+  Endpoint to export every movie and its cast as newline delimited JSON,
+  since (optional) is the last movie ID already exported
+  '''
+    @app.route('/movies/export')
+    @requires_auth('get:movies')
+    def export_movies_ndjson(payload):
+        since = request.args.get('since', type=int)
+        return ndjson_response(export_movies(since), compress=wants_gzip())
+
+    '''
   Endpoint to handle create a new movie
   This endpoint return if success the movie ID, otherwise 400 or 422 errors
   '''
@@ -191,7 +253,7 @@ def create_app(test_config=None):
         if title is None or release_date is None or actors is None:
             abort(400)
 
-        movie = Movie(title=title, release_date=release_date)
+        movie = Movie(title=title, release_date=parse_date(release_date))
         try:
             movie.insert()
         except Exception:
@@ -203,7 +265,7 @@ def create_app(test_config=None):
             cast = Cast(movie_id=movie.id, actor_id=actor)
             cast.insert()
 
-        return jsonify({
+        return json_response({
             "success": True,
             "movie": movie.id
         })
@@ -235,7 +297,7 @@ def create_app(test_config=None):
             movie.title = title
 
         if release_date is not None:
-            movie.release_date = release_date
+            movie.release_date = parse_date(release_date)
 
         if actors is not None:
             movie.actors = actors
@@ -247,7 +309,7 @@ def create_app(test_config=None):
             db.session.rollback()
             abort(422)
 
-        return jsonify({
+        return json_response({
             "success": True,
             "movie": movie.long()
         })
@@ -269,7 +331,7 @@ def create_app(test_config=None):
             db.session.rollback()
             abort(422)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'deleted': movie_id
         })
@@ -281,56 +343,54 @@ def create_app(test_config=None):
 
     @app.errorhandler(400)
     def bad_request(error):
-        return jsonify({
+        return json_response({
             "error": 400,
             "message": "Bad request",
             "success": False
-        }), 400
+        }, 400)
 
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({
+        return json_response({
             "error": 404,
             "message": "Resource could not be found",
             "success": False
-        }), 404
+        }, 404)
 
     @app.errorhandler(405)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 405,
             "message": "Method not allowed",
             "success": False
-        }), 405
+        }, 405)
 
     @app.errorhandler(422)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 422,
             "message": "Request could not be processable",
             "success": False
-        }), 422
+        }, 422)
 
     @app.errorhandler(500)
     def unprocessable(error):
-        return jsonify({
+        return json_response({
             "error": 500,
             "message": "Internal server error",
             "success": False
-        }), 500
+        }, 500)
 
     @app.errorhandler(AuthError)
     def auth_error(error):
-        return jsonify({
+        return json_response({
             "success": False,
             "error": error.status_code,
             "message": error.error['description']
-        }), error.status_code
+        }, error.status_code)
 
     return app
 
 
-app = create_app()
-
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
@@ -0,0 +1,518 @@
+# --------------------------------------------------------------------------- #
+# Async deployment
+# the casting agency routes served by an ASGI application (Starlette) on an
+# async engine (asyncpg). On the list endpoints, once the JWT is verified,
+# the page and count queries and the cast resolution of the page run
+# concurrently, each query on its own pooled connection. The exports stream
+# the table with a server-side cursor, resolving the casts a batch at a time.
+#
+# pip install -r requirements-async.txt
+# gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+# --------------------------------------------------------------------------- #
+from os import environ
+from datetime import date
+import asyncio
+
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from config import database_path
+from models import Actor, Movie, Cast
+from auth import AuthError, parse_auth_header, verify_decode_jwt, \
+    check_permissions
+from projections import ActorRow, MovieRow, actor_short, movie_short, \
+    ACTORS_PER_PAGE, MOVIES_PER_PAGE, EXPORT_BATCH_SIZE
+from json_provider import NdjsonChunks, default_provider
+
+provider = default_provider()
+
+ERROR_MESSAGES = {
+    400: "Bad request",
+    404: "Resource could not be found",
+    405: "Method not allowed",
+    422: "Request could not be processable",
+    500: "Internal server error",
+}
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+# translates the sync database URL (heroku uses postgres://) to its driver
+def async_database_path(path):
+    scheme, _, rest = path.partition('://')
+    return '{}://{}'.format(ASYNC_DRIVERS.get(scheme.split('+')[0], scheme),
+                            rest)
+
+
+def create_engine(path):
+    path = async_database_path(path)
+    # the SQLite engines (tests, local runs) have no pool to size
+    if path.startswith('sqlite'):
+        return create_async_engine(path)
+    return create_async_engine(
+        path, pool_size=int(environ.get('DATABASE_POOL_SIZE', 10)))
+
+
+engine = create_engine(environ.get('ASYNC_DATABASE_URL', database_path))
+
+actors_table = Actor.__table__
+movies_table = Movie.__table__
+cast_table = Cast.__table__
+
+
+def json_response(obj, status=200):
+    return Response(provider.dumps(obj), status_code=status,
+                    media_type=provider.mimetype)
+
+
+def arg_int(request, name, default=None):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def wants_gzip(request):
+    value = request.query_params.get('gzip')
+    if value is not None:
+        return value.lower() in ('1', 'true', 'yes')
+
+    encodings = request.headers.get('accept-encoding', '')
+    return any(encoding.split(';')[0].strip() == 'gzip'
+               for encoding in encodings.split(','))
+
+
+async def get_json(request):
+    if request.headers.get('content-type', '').split(';')[0] != 'application/json':
+        return None
+    try:
+        return await request.json()
+    except ValueError:
+        raise HTTPException(400)
+
+
+'''
+The JWT signature check is CPU bound, it runs in the default executor so the
+event loop keeps serving the queries of the request meanwhile
+'''
+
+
+async def authenticate(request, permission):
+    token = parse_auth_header(request.headers.get('Authorization', None))
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(None, verify_decode_jwt, token)
+    check_permissions(permission, payload)
+    return payload
+
+
+async def fetch_all(query):
+    async with engine.connect() as connection:
+        return (await connection.execute(query)).all()
+
+
+async def fetch_scalar(query):
+    async with engine.connect() as connection:
+        return await connection.scalar(query)
+
+
+'''
+paginated_long(request, permission, ...)
+    the list endpoints, after the authentication the page query (chained
+    with the resolution of the page cast) and the total count run
+    concurrently, a request refused never queries the database. The
+    pagination has the same semantics of flask_sqlalchemy paginate
+'''
+
+
+async def paginated_long(request, permission, query, per_page, resolve):
+    await authenticate(request, permission)
+    page = arg_int(request, 'page', 1)
+    if page < 1:
+        raise HTTPException(404)
+
+    async def page_with_casts():
+        rows = await fetch_all(query.limit(per_page)
+                                    .offset((page - 1) * per_page))
+        return rows, await resolve(rows)
+
+    total_query = select(func.count()).select_from(
+        query.order_by(None).subquery())
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in (
+        page_with_casts(),
+        fetch_scalar(total_query))]
+
+    try:
+        (rows, items), total = await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if not rows and page != 1:
+        raise HTTPException(404)
+
+    return items, total
+
+
+async def resolve_actors(rows):
+    rows = [ActorRow._make(row) for row in rows]
+    movies = {row.id: [] for row in rows}
+
+    if movies:
+        casts = await fetch_all(
+            select(cast_table.c.actor_id, movies_table.c.id,
+                   movies_table.c.title, movies_table.c.release_date)
+            .join(movies_table, cast_table.c.movie_id == movies_table.c.id)
+            .where(cast_table.c.actor_id.in_(list(movies)))
+            .order_by(cast_table.c.id))
+
+        for actor_id, *movie in casts:
+            movies[actor_id].append(movie_short(MovieRow._make(movie)))
+
+    return [dict(actor_short(row), movies=movies[row.id]) for row in rows]
+
+
+async def resolve_movies(rows):
+    rows = [MovieRow._make(row) for row in rows]
+    actors = {row.id: [] for row in rows}
+
+    if actors:
+        casts = await fetch_all(
+            select(cast_table.c.movie_id, actors_table.c.id,
+                   actors_table.c.name, actors_table.c.gender)
+            .join(actors_table, cast_table.c.actor_id == actors_table.c.id)
+            .where(cast_table.c.movie_id.in_(list(actors)))
+            .order_by(cast_table.c.id))
+
+        for movie_id, *actor in casts:
+            actors[movie_id].append(actor_short(ActorRow._make(actor)))
+
+    return [dict(movie_short(row), actors=actors[row.id]) for row in rows]
+
+
+'''
+export_long(request, permission, ...)
+    the exports of projections.py: once authenticated, the rows ordered by ID
+    (after since) are streamed by a server-side cursor and their casts
+    resolved one batch of EXPORT_BATCH_SIZE rows at a time
+'''
+
+
+async def export_long(request, permission, query, column, resolve):
+    await authenticate(request, permission)
+    since = arg_int(request, 'since')
+    compress = wants_gzip(request)
+
+    query = query.order_by(column)
+    if since is not None:
+        query = query.where(column > since)
+
+    async def generate():
+        chunks = NdjsonChunks(provider, compress)
+        async with engine.connect() as connection:
+            result = await connection.stream(
+                query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for rows in result.partitions(EXPORT_BATCH_SIZE):
+                for record in await resolve(rows):
+                    chunk = chunks.write(record)
+                    if chunk:
+                        yield chunk
+
+        chunk = chunks.close()
+        if chunk:
+            yield chunk
+
+    headers = {'Vary': 'Accept-Encoding'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(generate(), media_type='application/x-ndjson',
+                             headers=headers)
+
+
+async def index(request):
+    return json_response({
+        "success": True,
+        "message": 'healthy'
+    })
+
+
+# --------------------------------------------------------------------------- #
+# Actors
+# --------------------------------------------------------------------------- #
+async def get_actors(request):
+    query = select(actors_table.c.id, actors_table.c.name,
+                   actors_table.c.gender).order_by(actors_table.c.id)
+    actors, total = await paginated_long(
+        request, 'get:actors', query, ACTORS_PER_PAGE, resolve_actors)
+
+    return json_response({
+        "success": True,
+        "actors": actors,
+        "total": total,
+    })
+
+
+async def export_actors(request):
+    query = select(actors_table.c.id, actors_table.c.name,
+                   actors_table.c.gender)
+    return await export_long(request, 'get:actors', query,
+                             actors_table.c.id, resolve_actors)
+
+
+async def create_actor(request):
+    await authenticate(request, 'create:actors')
+    body = await get_json(request)
+    if body is None:
+        raise HTTPException(400)
+
+    name = body.get('name', None)
+    gender = body.get('gender', None)
+    if name is None or gender is None:
+        raise HTTPException(400)
+
+    try:
+        async with engine.begin() as connection:
+            result = await connection.execute(
+                insert(actors_table).values(name=name, gender=gender))
+    except Exception:
+        raise HTTPException(422)
+
+    return json_response({
+        "success": True,
+        "actor": result.inserted_primary_key[0]
+    })
+
+
+async def update_actor(request):
+    await authenticate(request, 'update:actors')
+    actor_id = request.path_params['actor_id']
+    body = await get_json(request)
+    if body is None:
+        raise HTTPException(400)
+
+    values = {key: body[key] for key in ('name', 'gender')
+              if body.get(key, None) is not None}
+
+    async with engine.begin() as connection:
+        actor = (await connection.execute(
+            select(actors_table.c.id, actors_table.c.name,
+                   actors_table.c.gender)
+            .where(actors_table.c.id == actor_id))).first()
+        if actor is None:
+            raise HTTPException(404)
+        if not values:
+            raise HTTPException(400)
+
+        try:
+            await connection.execute(
+                update(actors_table).where(actors_table.c.id == actor_id)
+                .values(**values))
+        except Exception:
+            raise HTTPException(422)
+
+    return json_response({
+        "success": True,
+        "actor": actor_short(ActorRow._make(actor)._replace(**values))
+    })
+
+
+async def delete_actor(request):
+    await authenticate(request, 'delete:actors')
+    return await delete_row(actors_table, request.path_params['actor_id'])
+
+
+# --------------------------------------------------------------------------- #
+# Movies
+# --------------------------------------------------------------------------- #
+async def get_movies(request):
+    query = select(movies_table.c.id, movies_table.c.title,
+                   movies_table.c.release_date).order_by(movies_table.c.id)
+    movies, total = await paginated_long(
+        request, 'get:movies', query, MOVIES_PER_PAGE, resolve_movies)
+
+    return json_response({
+        "success": True,
+        "total": total,
+        "movies": movies,
+    })
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(422)
+
+
+async def export_movies(request):
+    query = select(movies_table.c.id, movies_table.c.title,
+                   movies_table.c.release_date)
+    return await export_long(request, 'get:movies', query,
+                             movies_table.c.id, resolve_movies)
+
+
+async def create_movie(request):
+    await authenticate(request, 'create:movies')
+    body = await get_json(request)
+    if body is None:
+        raise HTTPException(400)
+
+    title = body.get('title', None)
+    release_date = body.get('release_date', None)
+    actors = body.get('actors', None)
+    if title is None or release_date is None or actors is None:
+        raise HTTPException(400)
+
+    try:
+        async with engine.begin() as connection:
+            result = await connection.execute(
+                insert(movies_table).values(
+                    title=title, release_date=parse_date(release_date)))
+            movie_id = result.inserted_primary_key[0]
+            if actors:
+                await connection.execute(insert(cast_table), [
+                    {'movie_id': movie_id, 'actor_id': actor}
+                    for actor in actors])
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(422)
+
+    return json_response({
+        "success": True,
+        "movie": movie_id
+    })
+
+
+async def update_movie(request):
+    await authenticate(request, 'update:movies')
+    movie_id = request.path_params['movie_id']
+    body = await get_json(request)
+    if body is None:
+        raise HTTPException(400)
+
+    values = {}
+    if body.get('title', None) is not None:
+        values['title'] = body['title']
+    if body.get('release_date', None) is not None:
+        values['release_date'] = parse_date(body['release_date'])
+    actors = body.get('actors', None)
+
+    async with engine.begin() as connection:
+        movie = (await connection.execute(
+            select(movies_table.c.id, movies_table.c.title,
+                   movies_table.c.release_date)
+            .where(movies_table.c.id == movie_id))).first()
+        if movie is None:
+            raise HTTPException(404)
+        if not values and actors is None:
+            raise HTTPException(400)
+
+        try:
+            if values:
+                await connection.execute(
+                    update(movies_table).where(movies_table.c.id == movie_id)
+                    .values(**values))
+            if actors is not None:
+                await connection.execute(
+                    delete(cast_table).where(cast_table.c.movie_id == movie_id))
+                if actors:
+                    await connection.execute(insert(cast_table), [
+                        {'movie_id': movie_id, 'actor_id': actor}
+                        for actor in actors])
+        except Exception:
+            raise HTTPException(422)
+
+    movie = MovieRow._make(movie)._replace(**values)
+
+    return json_response({
+        "success": True,
+        "movie": (await resolve_movies([movie]))[0]
+    })
+
+
+async def delete_movie(request):
+    await authenticate(request, 'delete:movies')
+    return await delete_row(movies_table, request.path_params['movie_id'])
+
+
+async def delete_row(table, row_id):
+    try:
+        async with engine.begin() as connection:
+            result = await connection.execute(
+                delete(table).where(table.c.id == row_id))
+    except Exception:
+        raise HTTPException(422)
+
+    if result.rowcount == 0:
+        raise HTTPException(404)
+
+    return json_response({
+        'success': True,
+        'deleted': row_id
+    })
+
+
+# --------------------------------------------------------------------------- #
+# Error handlers, same payloads of the sync app
+# --------------------------------------------------------------------------- #
+async def http_error(request, exc):
+    status = exc.status_code if exc.status_code in ERROR_MESSAGES else 500
+    return json_response({
+        "error": status,
+        "message": ERROR_MESSAGES[status],
+        "success": False
+    }, status)
+
+
+async def auth_error(request, error):
+    return json_response({
+        "success": False,
+        "error": error.status_code,
+        "message": error.error['description']
+    }, error.status_code)
+
+
+async def server_error(request, exc):
+    return json_response({
+        "error": 500,
+        "message": ERROR_MESSAGES[500],
+        "success": False
+    }, 500)
+
+
+routes = [
+    Route('/', index),
+    Route('/actors', get_actors, methods=['GET']),
+    Route('/actors', create_actor, methods=['POST']),
+    Route('/actors/export', export_actors, methods=['GET']),
+    Route('/actors/{actor_id:int}', update_actor, methods=['PATCH']),
+    Route('/actors/{actor_id:int}', delete_actor, methods=['DELETE']),
+    Route('/movies', get_movies, methods=['GET']),
+    Route('/movies', create_movie, methods=['POST']),
+    Route('/movies/export', export_movies, methods=['GET']),
+    Route('/movies/{movie_id:int}', update_movie, methods=['PATCH']),
+    Route('/movies/{movie_id:int}', delete_movie, methods=['DELETE']),
+]
+
+middleware = [
+    Middleware(CORSMiddleware, allow_origins=['*'],
+               allow_headers=['Content-Type', 'Authorization', 'true'],
+               allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']),
+]
+
+app = Starlette(routes=routes, middleware=middleware,
+                exception_handlers={HTTPException: http_error,
+                                    AuthError: auth_error,
+                                    Exception: server_error},
+                on_shutdown=[engine.dispose])
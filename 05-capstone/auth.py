@@ -4,6 +4,8 @@
 # --------------------------------------------------------------------------- #
 from os import environ
 import json
+import threading
+import time
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
@@ -11,6 +13,8 @@ from urllib.request import urlopen
 
 AUTH0_DOMAIN = environ.get('AUTH0_DOMAIN', 'dev-ehvlmutg.us.auth0.com')
 ALGORITHMS = environ.get('ALGORITHMS', 'RS256').split(',') # transform into array
+JWKS_URL = environ.get('AUTH0_JWKS_URL',
+                      f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
 API_AUDIENCE = environ.get('AUTH0_AUDIENCE', 'agency')
 
 '''
@@ -37,7 +41,16 @@ class AuthError(Exception):
 
 
 def get_token_auth_header():
-    auth_header = request.headers.get('Authorization', None)
+    return parse_auth_header(request.headers.get('Authorization', None))
+
+
+'''
+    same checks of get_token_auth_header on the raw header value, shared with
+    the async deployment which has no flask request
+'''
+
+
+def parse_auth_header(auth_header):
     if auth_header is None:
         raise AuthError({
             "code": "authorization_missing",
@@ -91,6 +104,51 @@ def check_permissions(permission, payload):
     return True
 
 
+'''
+    the JWKS is fetched on the first token verification instead of at import
+    and cached for the life of the process. A token signed by an unknown key
+    fetches it again (keys rotation), at most every JWKS_MIN_REFRESH seconds.
+    The ASGI app verifies the tokens in executor threads, the lock makes the
+    concurrent cold requests wait for a single fetch
+'''
+JWKS_MIN_REFRESH = 300
+_jwks = None
+_jwks_fetched_at = 0.0
+_jwks_lock = threading.Lock()
+
+
+def _jwks_stale(refresh):
+    return _jwks is None or (refresh and time.monotonic() - _jwks_fetched_at >
+                             JWKS_MIN_REFRESH)
+
+
+def get_jwks(refresh=False):
+    global _jwks, _jwks_fetched_at
+    if _jwks_stale(refresh):
+        with _jwks_lock:
+            # fetched by another thread while this one waited
+            if _jwks_stale(refresh):
+                with urlopen(JWKS_URL) as response:
+                    _jwks = json.loads(response.read())
+                _jwks_fetched_at = time.monotonic()
+
+    return _jwks
+
+
+def find_rsa_key(kid, jwks):
+    for key in jwks['keys']:
+        if key['kid'] == kid:
+            return {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+
+    return {}
+
+
 '''
     @INPUTS
         token: a json web token (string)
@@ -102,31 +160,24 @@ def check_permissions(permission, payload):
     return the decoded payload
 '''
 
-# cache this
-jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-jwks = json.loads(jsonurl.read())
-
 # code of https://github.com/udacity/FSND/blob/master/BasicFlaskAuth/app.py
 
 
 def verify_decode_jwt(token):
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        unverified_header = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = find_rsa_key(unverified_header['kid'], get_jwks())
+    if not rsa_key:
+        rsa_key = find_rsa_key(unverified_header['kid'], get_jwks(refresh=True))
+
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -5,7 +5,9 @@ from os import environ
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
-db = SQLAlchemy()
+# the request is committed once and its session removed before the response
+# is built (unit_of_work.py), the instances keep their loaded state
+db = SQLAlchemy(session_options={'expire_on_commit': False})
 
 database_path = environ.get(
     'DATABASE_URL', 'postgresql://app_user@localhost:5432/casting_agency')
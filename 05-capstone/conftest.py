@@ -0,0 +1,92 @@
+'''
+Test fixtures
+    the schema and the rows of casting_agency.sql are loaded once per run in a
+    template database, every pytest-xdist worker tests against its own copy
+    and every test runs in a SAVEPOINT rolled back at its end.
+    TEST_DATABASE_URL picks the database server, a temporary SQLite database
+    by default:
+
+    TEST_DATABASE_URL=postgresql://app_user@localhost:5432/casting_test pytest -n auto
+
+    Auth0 is replaced by a local JWKS file (AUTH0_JWKS_URL=file://...) and the
+    ASSISTANT_TOKEN, DIRECTOR_TOKEN and PRODUCER_TOKEN of the tests are
+    signed by its key with the permissions of every role
+'''
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.tokens import LocalIssuer, PERMISSIONS  # noqa: E402
+
+# before auth.py is imported by the tests
+ISSUER = LocalIssuer(tempfile.mkdtemp(prefix='jwks-'))
+os.environ.update(ISSUER.environ('capstone'))
+
+from config import db  # noqa: E402
+import models  # noqa: E402,F401
+
+DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    'casting_agency.sql')
+
+ASSISTANT = ['get:actors', 'get:movies']
+DIRECTOR = ASSISTANT + ['create:actors', 'update:actors', 'delete:actors',
+                        'update:movies']
+ROLES = {
+    'ASSISTANT_TOKEN': ASSISTANT,
+    'DIRECTOR_TOKEN': DIRECTOR,
+    'PRODUCER_TOKEN': PERMISSIONS['capstone'],
+}
+
+
+def pytest_configure(config):
+    fixtures.configure(config, db.metadata, DUMP)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    fixtures.configure_node(node)
+
+
+def pytest_unconfigure(config):
+    fixtures.unconfigure(config)
+    shutil.rmtree(os.path.dirname(ISSUER.jwks_path), ignore_errors=True)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def tokens():
+    for name, permissions in ROLES.items():
+        os.environ[name] = ISSUER.token('capstone', permissions)
+
+
+@pytest.fixture(scope='session')
+def database_url(request):
+    url = fixtures.worker_database(request.config)
+    os.environ['TEST_DATABASE_URL'] = url
+    yield url
+    fixtures.drop_database(url)
+
+
+@pytest.fixture(scope='session')
+def engine(database_url):
+    engine = fixtures.test_engine(database_url)
+    yield engine
+    engine.dispose()
+
+
+# flask_sqlalchemy sessions need an application, built once per worker
+@pytest.fixture(scope='session')
+def flask_app(database_url):
+    from app import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+
+
+@pytest.fixture(autouse=True)
+def rollback(flask_app, engine):
+    with fixtures.rollback_session(db, engine) as session:
+        yield session
@@ -0,0 +1,103 @@
+# --------------------------------------------------------------------------- #
+# Gunicorn config, loaded automatically from the working directory
+#   sync:  gunicorn 'app:create_app()'
+#   async: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi:app
+# the app is loaded and warmed up once in the master (preload_app), the
+# workers fork from it and share its memory pages copy-on-write instead of
+# importing and building everything again. Boot time and memory of the master
+# and of every worker are logged. GUNICORN_PRELOAD=0 turns preloading off.
+# --------------------------------------------------------------------------- #
+import gc
+import multiprocessing
+import resource
+import time
+from os import environ
+
+started = time.monotonic()
+
+bind = '0.0.0.0:' + environ.get('PORT', '8000')
+worker_class = environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+# sync workers block on every query, so they need more processes per core
+# than the event loop workers
+default_workers = multiprocessing.cpu_count()
+if worker_class == 'sync':
+    default_workers = default_workers * 2 + 1
+
+workers = int(environ.get('WEB_CONCURRENCY', default_workers))
+keepalive = 5
+preload_app = environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+'''
+memory()
+    (rss, private) in kB of the current process, private is what the process
+    doesn't share with the others (None when /proc is not available)
+'''
+
+
+def memory():
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps
+                          if line.endswith('kB\n'))
+        return (int(fields['Rss'].split()[0]),
+                int(fields['Private_Clean'].split()[0]) +
+                int(fields['Private_Dirty'].split()[0]))
+    except (OSError, KeyError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, None
+
+
+'''
+the pool of the master must be empty when the workers fork, a connection
+shared by two processes mixes up their queries. SQLAlchemy dispose() closes
+the pooled connections, so it is called in the master before forking, even
+when the warm up failed, and in every worker for whatever the fork inherited
+'''
+
+
+def dispose(app):
+    if hasattr(app, 'app_context'):
+        from config import db
+        db.get_engine(app).dispose()
+    else:
+        from asgi import engine
+        engine.sync_engine.dispose()
+
+
+def when_ready(server):
+    if preload_app:
+        app = server.app.wsgi()
+        try:
+            if hasattr(app, 'app_context'):
+                from app import warm_up
+                warm_up(app)
+            else:
+                from auth import get_jwks
+                get_jwks()
+        except Exception:
+            # the workers build what is missing on their first requests
+            server.log.exception('warm up failed before fork')
+        finally:
+            dispose(app)
+        # objects allocated so far are never collected, the collector would
+        # otherwise touch (and copy) their pages in every worker
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    rss, private = memory()
+    server.log.info('master ready in %.0f ms, rss %s kB',
+                    (time.monotonic() - started) * 1000, rss)
+
+
+def post_fork(server, worker):
+    worker.forked = time.monotonic()
+    if preload_app:
+        dispose(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    rss, private = memory()
+    worker.log.info('worker %s booted in %.0f ms, rss %s kB, private %s kB',
+                    worker.pid, (time.monotonic() - worker.forked) * 1000,
+                    rss, private)
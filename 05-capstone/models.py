@@ -9,16 +9,17 @@ Extend the base Model class to add common methods
 class BaseModel(db.Model):
     __abstract__ = True
 
+    # flushed, not committed: the request commits once (unit_of_work.py)
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        db.session.flush()
 
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        db.session.flush()
 
     def update(self):
-        db.session.commit()
+        db.session.flush()
 
 # cast is the many-to-many relationship of actors and movies
 
@@ -93,14 +94,14 @@ class Actor(db.Model):
 
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        db.session.flush()
 
     def update(self):
-        db.session.commit()
+        db.session.flush()
 
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        db.session.flush()
 
     def long(self):
         movies = []
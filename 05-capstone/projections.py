@@ -0,0 +1,139 @@
+# --------------------------------------------------------------------------- #
+# Projections
+# the list endpoints select only the columns they emit into light named
+# tuples, instead of hydrating full models and walking the lazy casts of
+# every row (Movie.long() and Actor.long() run one query per cast). The page
+# and cast queries are baked, see statements.py
+# --------------------------------------------------------------------------- #
+from collections import namedtuple
+
+from sqlalchemy import bindparam, func
+
+from config import db
+from models import Actor, Movie, Cast
+from statements import bakery, paginate
+
+ACTORS_PER_PAGE = 5
+MOVIES_PER_PAGE = 5
+
+ActorRow = namedtuple('ActorRow', ['id', 'name', 'gender'])
+MovieRow = namedtuple('MovieRow', ['id', 'title', 'release_date'])
+
+
+def actor_short(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'gender': row.gender,
+    }
+
+
+def movie_short(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'release_date': row.release_date.strftime("%Y-%m-%d"),
+    }
+
+
+def paginate_actors(page, per_page):
+    items = bakery(lambda session: session.query(
+        Actor.id, Actor.name, Actor.gender))
+    items += lambda query: query.order_by(Actor.id) \
+                                .limit(bindparam('limit')) \
+                                .offset(bindparam('offset'))
+    count = bakery(lambda session: session.query(func.count(Actor.id)))
+    return paginate(items, count, page, per_page)
+
+
+def paginate_movies(page, per_page):
+    items = bakery(lambda session: session.query(
+        Movie.id, Movie.title, Movie.release_date))
+    items += lambda query: query.order_by(Movie.id) \
+                                .limit(bindparam('limit')) \
+                                .offset(bindparam('offset'))
+    count = bakery(lambda session: session.query(func.count(Movie.id)))
+    return paginate(items, count, page, per_page)
+
+
+'''
+Same output of Actor.long() for a page of rows, the movies of every actor
+of the page are resolved with a single query
+'''
+
+
+def actors_long(rows):
+    rows = [ActorRow._make(row) for row in rows]
+    movies = {row.id: [] for row in rows}
+
+    if movies:
+        casts = bakery(lambda session: session.query(
+            Cast.actor_id, Movie.id, Movie.title, Movie.release_date))
+        casts += lambda query: query.join(Movie, Cast.movie_id == Movie.id) \
+            .filter(Cast.actor_id.in_(bindparam('ids', expanding=True))) \
+            .order_by(Cast.id)
+        casts = casts(db.session()).params(ids=list(movies))
+
+        for actor_id, *movie in casts:
+            movies[actor_id].append(movie_short(MovieRow._make(movie)))
+
+    return [dict(actor_short(row), movies=movies[row.id]) for row in rows]
+
+
+'''
+Same output of Movie.long() for a page of rows, the cast of every movie
+of the page is resolved with a single query
+'''
+
+
+def movies_long(rows):
+    rows = [MovieRow._make(row) for row in rows]
+    actors = {row.id: [] for row in rows}
+
+    if actors:
+        casts = bakery(lambda session: session.query(
+            Cast.movie_id, Actor.id, Actor.name, Actor.gender))
+        casts += lambda query: query.join(Actor, Cast.actor_id == Actor.id) \
+            .filter(Cast.movie_id.in_(bindparam('ids', expanding=True))) \
+            .order_by(Cast.id)
+        casts = casts(db.session()).params(ids=list(actors))
+
+        for movie_id, *actor in casts:
+            actors[movie_id].append(actor_short(ActorRow._make(actor)))
+
+    return [dict(movie_short(row), actors=actors[row.id]) for row in rows]
+
+
+'''
+Exports walk the whole table through a server-side cursor (yield_per) and
+resolve the casts one batch of rows at a time, so the memory stays constant.
+since is the last ID already exported by the client.
+'''
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export(query, column, since, formatter):
+    query = query.order_by(column)
+    if since is not None:
+        query = query.filter(column > since)
+
+    batch = []
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield from formatter(batch)
+            batch = []
+
+    if batch:
+        yield from formatter(batch)
+
+
+def export_actors(since=None):
+    query = Actor.query.with_entities(Actor.id, Actor.name, Actor.gender)
+    return _export(query, Actor.id, since, actors_long)
+
+
+def export_movies(since=None):
+    query = Movie.query.with_entities(Movie.id, Movie.title,
+                                      Movie.release_date)
+    return _export(query, Movie.id, since, movies_long)
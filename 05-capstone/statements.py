@@ -0,0 +1,38 @@
+# --------------------------------------------------------------------------- #
+# Statements
+# the list queries of projections.py are baked queries: the Query object is
+# built and its SQL compiled once per process (the cache key is the code of
+# the lambdas), a request only binds its parameters with bindparam
+# --------------------------------------------------------------------------- #
+from flask import abort
+from flask_sqlalchemy import Pagination
+from sqlalchemy.ext import baked
+
+from config import db
+
+bakery = baked.bakery()
+
+
+'''
+paginate(items, count, page, per_page, **params)
+    same result and 404s as BaseQuery.paginate() for a baked items query
+    (with limit and offset bind parameters) and its baked count query
+'''
+
+
+def paginate(items, count, page, per_page, **params):
+    if page < 1:
+        abort(404)
+
+    session = db.session()
+    rows = items(session).params(limit=per_page, offset=(page - 1) * per_page,
+                                 **params).all()
+    if not rows and page != 1:
+        abort(404)
+
+    if page == 1 and len(rows) < per_page:
+        total = len(rows)
+    else:
+        total = count(session).params(**params).scalar()
+
+    return Pagination(None, page, per_page, total, rows)
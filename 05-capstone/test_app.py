@@ -1,10 +1,17 @@
 from os import environ
+from types import SimpleNamespace
+import gc
+import os
+import runpy
 import unittest
+from unittest.mock import patch
 import json
-from flask_sqlalchemy import SQLAlchemy
+import gzip
+
+from sqlalchemy import event
 
 from app import create_app
-from config import setup_db
+from config import db
 from models import Actor, Movie
 
 
@@ -13,13 +20,14 @@ class CastingTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_path = environ.get(
-            'DATABASE_URL_TEST',
-            'postgresql://app_user@localhost:5432/casting_agency')
+            'TEST_DATABASE_URL', environ.get(
+                'DATABASE_URL_TEST',
+                'postgresql://app_user@localhost:5432/casting_agency'))
 
-        setup_db(self.app, self.database_path)
+        # the schema, the rows and the tokens come from conftest.py
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.client = self.app.test_client
 
         self.new_actor = {
             "name": "Elijah Wood",
@@ -36,11 +44,6 @@ class CastingTestCase(unittest.TestCase):
         self.token_director = environ.get('DIRECTOR_TOKEN', '')
         self.token_producer = environ.get('PRODUCER_TOKEN', '')
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-
     def tearDown(self):
         """Executed after reach test"""
         pass
@@ -287,6 +290,43 @@ class CastingTestCase(unittest.TestCase):
         self.assertGreater(len(data['movies']), 0)
         self.assertGreater(data['total'], 0)
 
+    def test_401_if_unauthorized_and_export_movies(self):
+        res = self.client().get('/movies/export')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['message'], 'Authorization is missing')
+
+    def test_200_if_authorized_and_export_movies(self):
+        res = self.client().get(
+            '/movies/export?gzip=false', headers={"Authorization": 'Bearer ' +
+                                                  self.token_assistant})
+        movies = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content_type, 'application/x-ndjson')
+        self.assertGreater(len(movies), 0)
+        self.assertIn('actors', movies[0])
+
+    def test_200_if_authorized_and_export_actors_since(self):
+        res = self.client().get(
+            '/actors/export?gzip=false&since=1',
+            headers={"Authorization": 'Bearer ' + self.token_assistant})
+        actors = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all(actor['id'] > 1 for actor in actors))
+
+    def test_200_if_authorized_and_export_movies_gzip(self):
+        res = self.client().get(
+            '/movies/export?gzip=true', headers={"Authorization": 'Bearer ' +
+                                                 self.token_assistant})
+        lines = gzip.decompress(res.data).splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertGreater(len(lines), 0)
+
     # ----------------------------------------------------------------------- #
     # Deletes test data at the end
     # ----------------------------------------------------------------------- #
@@ -364,6 +404,142 @@ class CastingTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertEqual(data['deleted'], movie.id)
 
+    def test_failed_warm_up_is_logged_and_pool_emptied(self):
+        errors = []
+        disposed = []
+        server = SimpleNamespace(
+            app=SimpleNamespace(wsgi=lambda: self.app),
+            log=SimpleNamespace(exception=errors.append,
+                                info=lambda *args: None))
+        config = runpy.run_path(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+        with self.app.app_context():
+            engine = db.get_engine(self.app)
+
+        def on_dispose(engine):
+            disposed.append(engine)
+        event.listen(engine, 'engine_disposed', on_dispose)
+
+        try:
+            with patch('app.warm_up',
+                       side_effect=RuntimeError('database is down')):
+                config['when_ready'](server)
+        finally:
+            event.remove(engine, 'engine_disposed', on_dispose)
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+
+        self.assertEqual(errors, ['warm up failed before fork'])
+        self.assertEqual(disposed, [engine])
+
+
+class CastingAsgiTestCase(unittest.TestCase):
+    """The async deployment must answer with the same payloads of the sync app"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            from starlette.testclient import TestClient
+        except ImportError:
+            raise unittest.SkipTest('requirements-async.txt is not installed')
+
+        environ.setdefault('ASYNC_DATABASE_URL', environ.get(
+            'TEST_DATABASE_URL',
+            'postgresql://app_user@localhost:5432/casting_agency'))
+
+        import asgi
+        cls.asgi = asgi
+        cls.async_client = TestClient(asgi.app)
+
+    def setUp(self):
+        self.app = create_app(
+            {'SQLALCHEMY_DATABASE_URI': environ['ASYNC_DATABASE_URL']})
+        self.client = self.app.test_client
+        self.token = environ.get('ASSISTANT_TOKEN', '')
+
+    def assertSameResponse(self, path, headers):
+        res = self.async_client.get(path, headers=headers)
+        expected = self.client().get(path, headers=headers)
+
+        self.assertEqual(res.status_code, expected.status_code)
+        self.assertEqual(res.json(), json.loads(expected.data))
+        return res
+
+    def test_same_pages(self):
+        headers = {"Authorization": 'Bearer ' + self.token}
+        for path in ['/actors', '/actors?page=2', '/movies',
+                     '/movies?page=2']:
+            res = self.assertSameResponse(path, headers)
+            self.assertEqual(res.status_code, 200)
+
+    def test_same_pagination_errors(self):
+        headers = {"Authorization": 'Bearer ' + self.token}
+        for path in ['/actors?page=44444', '/movies?page=44444']:
+            res = self.assertSameResponse(path, headers)
+            self.assertEqual(res.status_code, 404)
+
+    def assertSameExport(self, path, headers):
+        res = self.async_client.get(path, headers=headers)
+        expected = self.client().get(path, headers=headers)
+
+        self.assertEqual(res.status_code, expected.status_code)
+        self.assertEqual(res.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [json.loads(line) for line in res.content.splitlines()],
+            [json.loads(line) for line in expected.data.splitlines()])
+        return res
+
+    def test_same_exports(self):
+        headers = {"Authorization": 'Bearer ' + self.token}
+        for path in ['/actors/export?gzip=false', '/movies/export?gzip=false',
+                     '/actors/export?gzip=false&since=1',
+                     '/movies/export?gzip=false&since=1']:
+            self.assertSameExport(path, headers)
+
+    def test_same_export_gzip(self):
+        # the test client decompresses the body of the async response
+        headers = {"Authorization": 'Bearer ' + self.token}
+        res = self.async_client.get('/movies/export?gzip=true',
+                                    headers=headers)
+        expected = self.client().get('/movies/export?gzip=true',
+                                     headers=headers)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(res.content, gzip.decompress(expected.data))
+
+    def test_same_auth_errors(self):
+        # the signature of a token signed by another key does not verify
+        tampered = self.token[:-4] + ('AAAA' if self.token[-4:] != 'AAAA'
+                                      else 'BBBB')
+        for headers in [{}, {"Authorization": 'Basic ' + self.token},
+                        {"Authorization": 'Bearer'},
+                        {"Authorization": 'Bearer not-a-jwt'},
+                        {"Authorization": 'Bearer ' + tampered}]:
+            for path in ['/actors', '/movies', '/actors/export',
+                         '/movies/export']:
+                res = self.assertSameResponse(path, headers)
+                self.assertIn(res.status_code, (400, 401))
+
+    def test_refused_request_does_not_query(self):
+        from sqlalchemy import event
+
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        event.listen(self.asgi.engine.sync_engine, 'before_cursor_execute',
+                     count)
+        try:
+            res = self.async_client.get('/actors')
+        finally:
+            event.remove(self.asgi.engine.sync_engine,
+                         'before_cursor_execute', count)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(statements, [])
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
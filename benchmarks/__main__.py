@@ -0,0 +1,141 @@
+# --------------------------------------------------------------------------- #
+# Benchmark harness
+#
+#   python -m benchmarks run trivia --scale 100k
+#   python -m benchmarks run capstone --database-url postgresql://app_user@localhost/bench
+#   python -m benchmarks compare results/abc123/trivia-10k.json results/def456/trivia-10k.json
+#
+# run seeds the database (SQLite in a temporary directory by default), starts
+# the project under gunicorn with a stand-in JWKS, drives every route with the
+# load generator and writes a JSON report under benchmarks/results/<commit>/
+# --------------------------------------------------------------------------- #
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import loadgen
+from benchmarks.projects import PROJECTS, ROOT
+from benchmarks.reports import RESULTS, percent, write_report
+from benchmarks.scenarios import scenarios, SERVERS
+from benchmarks.datagen import sizes
+from benchmarks.seed import SCALES
+from benchmarks.servers import free_port, serve
+
+def seed_database(project, database_url, scale):
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.seed', project,
+         '--database-url', database_url, '--scale', scale], cwd=ROOT)
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    database_url = args.database_url or 'sqlite:///{}'.format(
+        os.path.join(workdir, '{}.db'.format(args.project)))
+
+    seeded = {}
+    if not args.skip_seed:
+        print('seeding {} ({}) ...'.format(args.project, args.scale))
+        seeded = seed_database(args.project, database_url, args.scale)
+
+    env = {'DATABASE_URL': database_url, 'FLASK_ENV': 'production'}
+    tokens = {}
+    if args.project in ('coffee-shop', 'capstone'):
+        from benchmarks.tokens import LocalIssuer
+        issuer = LocalIssuer(workdir)
+        env.update(issuer.environ(args.project))
+        tokens[args.project] = issuer.token(args.project)
+
+    size = sizes(args.project, SCALES[args.scale])
+    port = free_port()
+    env.update({'PORT': str(port), 'WEB_CONCURRENCY': str(args.workers)})
+    command = ['gunicorn', '--workers', str(args.workers),
+               '--bind', '127.0.0.1:{}'.format(port), SERVERS[args.project]]
+
+    summaries = []
+    with serve(command, PROJECTS[args.project], port, env) as url:
+        for name, requests in scenarios(args.project, size, tokens).items():
+            if args.only and args.only not in name:
+                continue
+            loadgen.run(url, requests, concurrency=args.workers,
+                        duration=args.warmup)
+            stats = loadgen.run(url, requests, concurrency=args.concurrency,
+                                duration=args.duration, name=name)
+            summaries.append(stats.summary())
+            print(loadgen.format_table([summaries[-1]]).splitlines()[-1])
+
+    report = {
+        'project': args.project,
+        'scale': args.scale,
+        'dialect': database_url.split(':')[0],
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'seed': seeded,
+        'scenarios': summaries,
+    }
+    path = write_report(report, '{}-{}.json'.format(args.project, args.scale),
+                        args.output)
+
+    print()
+    print(loadgen.format_table(summaries))
+    print('report written to {}'.format(path))
+
+
+def compare(args):
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        old, new = json.load(baseline), json.load(candidate)
+
+    old_scenarios = {summary['name']: summary for summary in old['scenarios']}
+    print('{} -> {} ({} {})'.format(old['commit'], new['commit'],
+                                    new['project'], new['scale']))
+    print('{:<40} {:>10} {:>10} {:>9} {:>10} {:>10} {:>9}'.format(
+        'scenario', 'req/s old', 'req/s new', 'delta',
+        'p99 old', 'p99 new', 'delta'))
+
+    for summary in new['scenarios']:
+        before = old_scenarios.get(summary['name'])
+        if before is None:
+            continue
+        print('{:<40} {:>10} {:>10} {:>9} {:>10} {:>10} {:>9}'.format(
+            summary['name'], before['throughput'], summary['throughput'],
+            percent(before['throughput'], summary['throughput']),
+            before['p99_ms'], summary['p99_ms'],
+            percent(before['p99_ms'], summary['p99_ms'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='benchmark every route')
+    run_parser.add_argument('project', choices=sorted(PROJECTS))
+    run_parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    run_parser.add_argument('--database-url',
+                            help='defaults to a temporary SQLite database')
+    run_parser.add_argument('--skip-seed', action='store_true',
+                            help='reuse the rows already in --database-url')
+    run_parser.add_argument('-c', '--concurrency', type=int, default=32)
+    run_parser.add_argument('-d', '--duration', type=float, default=10.0)
+    run_parser.add_argument('-w', '--workers', type=int, default=4)
+    run_parser.add_argument('--warmup', type=float, default=1.0)
+    run_parser.add_argument('--only', help='run the scenarios matching it')
+    run_parser.add_argument('--output', default=RESULTS)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare',
+                                         help='compare two run reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# --------------------------------------------------------------------------- #
+# Bulk import benchmark
+# loads synthetic trivia questions through bulk_import.import_questions and
+# compares the throughput with the one-by-one Question.insert() path, it runs
+# against the database configured for the trivia project
+#
+# usage: python -m benchmarks.bulk_import [-n 100000] [--format csv|ndjson]
+# --------------------------------------------------------------------------- #
+import argparse
+import csv
+import io
+import json
+import time
+
+from benchmarks.projects import use_project
+
+
+def synthetic_questions(count, categories):
+    for i in range(count):
+        yield {
+            'question': 'Synthetic question number {}?'.format(i),
+            'answer': str(i),
+            'category': categories[i % len(categories)],
+            'difficulty': i % 5 + 1
+        }
+
+
+def encode(records, fmt):
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(record) + '\n' for record in records) \
+                 .encode('utf-8')
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(
+        buffer, fieldnames=['question', 'answer', 'category', 'difficulty'])
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import benchmark')
+    parser.add_argument('-n', '--rows', type=int, default=100000)
+    parser.add_argument('--baseline-rows', type=int, default=1000)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    use_project('trivia')
+    from flaskr import create_app
+    from models import db, Question, Category
+    from bulk_import import import_questions
+
+    app = create_app()
+    with app.app_context():
+        categories = [category_id for category_id, in
+                      db.session.query(Category.id)]
+        if not categories:
+            raise SystemExit('the categories table is empty, restore trivia.psql first')
+
+        start = time.perf_counter()
+        for record in synthetic_questions(args.baseline_rows, categories):
+            Question(**record).insert()
+        baseline = args.baseline_rows / (time.perf_counter() - start)
+
+        payload = encode(list(synthetic_questions(args.rows, categories)),
+                         args.format)
+        start = time.perf_counter()
+        report = import_questions(io.BytesIO(payload), args.format,
+                                  args.batch_size)
+        bulk = report['inserted'] / (time.perf_counter() - start)
+
+        # removes the synthetic rows so the benchmark can be run again
+        Question.query.filter(Question.question.like('Synthetic question number %')) \
+                      .delete(synchronize_session=False)
+        db.session.commit()
+        dialect = db.engine.dialect.name
+
+    print('trivia questions bulk import ({}, {} dialect)'.format(
+        args.format, dialect))
+    print('  Question.insert(): {:10.1f} rows/s'.format(baseline))
+    print('  import_questions:  {:10.1f} rows/s ({} failed)'.format(
+        bulk, report['failed']))
+    print('  speedup: {:.1f}x'.format(bulk / baseline))
+
+
+if __name__ == '__main__':
+    main()
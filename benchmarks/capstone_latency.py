@@ -0,0 +1,69 @@
+# --------------------------------------------------------------------------- #
+# Capstone sync vs async latency benchmark
+# starts the flask app under gunicorn sync workers and the asgi app under
+# gunicorn uvicorn workers (both with gunicorn.conf.py), then compares the
+# p50/p99 latency of the list endpoints
+#
+# the token must have the get:actors and get:movies permissions, by default
+# the ASSISTANT_TOKEN environment variable of the tests is used
+#
+# usage: python -m benchmarks.capstone_latency [-c 200] [-d 30] [-w 4]
+# --------------------------------------------------------------------------- #
+import argparse
+import json
+from os import environ
+
+from benchmarks import loadgen
+from benchmarks.projects import PROJECTS
+from benchmarks.servers import free_port, serve
+
+
+def routes(token):
+    headers = {'Authorization': 'Bearer ' + token}
+    return [
+        loadgen.request('GET', '/movies?page=1', headers),
+        loadgen.request('GET', '/movies?page=2', headers),
+        loadgen.request('GET', '/actors?page=1', headers),
+        loadgen.request('GET', '/actors?page=2', headers),
+    ]
+
+
+def deployments(workers):
+    yield 'gunicorn sync x{}'.format(workers), 'app:create_app()', 'sync'
+    yield 'gunicorn uvicorn x{}'.format(workers), 'asgi:app', \
+        'uvicorn.workers.UvicornWorker'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capstone sync vs async')
+    parser.add_argument('-c', '--concurrency', type=int, default=200)
+    parser.add_argument('-d', '--duration', type=float, default=30.0)
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('--token', default=environ.get('ASSISTANT_TOKEN'))
+    parser.add_argument('--json', action='store_true',
+                        help='print the summaries as JSON')
+    args = parser.parse_args()
+
+    if not args.token:
+        raise SystemExit('a token is required, use --token or ASSISTANT_TOKEN')
+
+    requests = routes(args.token)
+    summaries = []
+    for name, target, worker_class in deployments(args.workers):
+        port = free_port()
+        env = {'PORT': str(port), 'WEB_CONCURRENCY': str(args.workers),
+               'GUNICORN_WORKER_CLASS': worker_class}
+        with serve(['gunicorn', target], PROJECTS['capstone'], port, env) as url:
+            loadgen.run(url, requests, concurrency=args.workers * 2, duration=2)
+            stats = loadgen.run(url, requests, concurrency=args.concurrency,
+                                duration=args.duration, name=name)
+        summaries.append(stats.summary())
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print(loadgen.format_table(summaries))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------- #
+# Connection hold benchmark
+# how long a request keeps its pooled connection checked out, with the unit
+# of work released before serialization (unit_of_work.py) and released after
+# it like before (the session was removed at the teardown of the request).
+# The requests go through the test client on a seeded SQLite database, the
+# hold times come from the pool checkout/checkin events
+#
+# usage: python -m benchmarks.connection_hold trivia|capstone|fyyur
+#            [-n 500] [--rows 1000]
+# --------------------------------------------------------------------------- #
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.datagen import populate
+from benchmarks.projects import use_project
+
+PATHS = {
+    'trivia': ['/categories', '/questions?page=1', '/questions?page=5',
+               '/categories/2/questions'],
+    'capstone': ['/actors?page=1', '/movies?page=1', '/movies?page=5'],
+    'fyyur': ['/venues', '/artists', '/shows', '/venues/1', '/artists/1'],
+}
+
+
+def create_app(project, url, directory):
+    if project == 'trivia':
+        from flaskr import create_app
+        return create_app({'SQLALCHEMY_DATABASE_URI': url}), {}
+
+    if project == 'capstone':
+        from benchmarks.tokens import LocalIssuer
+        issuer = LocalIssuer(directory)
+        os.environ.update(issuer.environ('capstone'))
+        from app import create_app
+        return create_app({'SQLALCHEMY_DATABASE_URI': url}), {
+            'Authorization': 'Bearer ' + issuer.token('capstone')}
+
+    from app import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': url}), {}
+
+
+def measure(app, path, headers, iterations):
+    unit_of_work = app.extensions['unit_of_work']
+    client = app.test_client()
+    client.get(path, headers=headers)  # warm up the pool and the caches
+
+    before = unit_of_work.stats()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.status_code)
+    elapsed = time.perf_counter() - start
+    after = unit_of_work.stats()
+
+    checkouts = after['checkouts'] - before['checkouts']
+    return {
+        'request_ms': elapsed * 1000 / iterations,
+        'hold_ms': (after['hold_total_ms'] - before['hold_total_ms']) /
+        iterations,
+        'checkouts': checkouts / iterations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Connection hold benchmark')
+    parser.add_argument('project', choices=sorted(PATHS))
+    parser.add_argument('-n', '--iterations', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='connection-hold-')
+    url = 'sqlite:///' + os.path.join(directory, args.project + '.db')
+    os.environ['DATABASE_URL'] = url
+    try:
+        use_project(args.project)
+        populate(args.project, url, args.rows)
+        app, headers = create_app(args.project, url, directory)
+        unit_of_work = app.extensions['unit_of_work']
+
+        print('{:<28} {:>12} {:>12} {:>12}'.format(
+            'path', 'request ms', 'held (late)', 'held (early)'))
+        for path in PATHS[args.project]:
+            unit_of_work.release_early = False
+            late = measure(app, path, headers, args.iterations)
+            unit_of_work.release_early = True
+            early = measure(app, path, headers, args.iterations)
+            print('{:<28} {:>12.3f} {:>12.3f} {:>12.3f}'.format(
+                path, early['request_ms'], late['hold_ms'], early['hold_ms']))
+        print('held: connection hold per request (ms) when the unit of work '
+              'ends after (late) or before (early) serialization')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+# --------------------------------------------------------------------------- #
+# Synthetic data generator
+# deterministic (same seed, same rows) and shaped like real data:
+#   - fyyur: Zipf number of shows per venue and per artist, start times
+#     clustered on evenings and weekends, cities and genres Zipf distributed
+#   - capstone: long tail (Pareto) cast sizes, popular actors in many movies
+#   - trivia: unbalanced categories, difficulty centered on 3
+# the tables come from the models of every project and the rows are loaded
+# with COPY on Postgres (executemany on the other databases)
+#
+#   from benchmarks.datagen import populate
+#   populate('fyyur', 'postgresql://app_user@localhost/fyyur_bench', 1000000)
+# --------------------------------------------------------------------------- #
+import io
+import json
+import os
+import random
+from bisect import bisect
+from datetime import datetime, timedelta, date
+from itertools import accumulate
+
+from benchmarks.projects import use_project
+
+CHUNK_SIZE = 50000
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+GENRES = ['Rock', 'Pop', 'Hip-Hop', 'Jazz', 'Electronic', 'Alternative',
+          'R&B', 'Country', 'Folk', 'Blues', 'Classical', 'Funk', 'Punk',
+          'Soul', 'Reggae', 'Heavy Metal', 'Musical Theatre', 'Instrumental',
+          'Swing']
+CITIES = [('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+          ('Austin', 'TX'), ('Nashville', 'TN'), ('San Francisco', 'CA'),
+          ('Seattle', 'WA'), ('New Orleans', 'LA'), ('Atlanta', 'GA'),
+          ('Boston', 'MA'), ('Denver', 'CO'), ('Portland', 'OR'),
+          ('Philadelphia', 'PA'), ('Miami', 'FL'), ('Detroit', 'MI'),
+          ('Minneapolis', 'MN'), ('Kansas City', 'MO'), ('Memphis', 'TN'),
+          ('Las Vegas', 'NV'), ('Phoenix', 'AZ')]
+COLORS = ['brown', 'white', 'black', 'grey', 'yellow', 'red']
+INGREDIENTS = ['coffee', 'milk', 'foam', 'water', 'chocolate', 'cream',
+               'caramel', 'vanilla']
+# evening shows, 8pm and 9pm are the most common
+HOUR_WEIGHTS = {12: 1, 14: 1, 16: 2, 18: 4, 19: 8, 20: 12, 21: 10, 22: 6,
+                23: 3}
+# monday=0 ... sunday=6, fridays and saturdays book the most shows
+WEEKDAY_WEIGHTS = [2, 2, 3, 4, 8, 9, 4]
+
+
+'''
+Zipf(n, s, rng)
+    samples ranks 1..n with probability proportional to 1 / rank^s in
+    O(log n) per draw, the ranks are mapped to ids through a seeded
+    permutation so the popular rows are not always the first ids
+'''
+
+
+class Zipf:
+    def __init__(self, n, s, rng, shuffle=True):
+        self.cum_weights = list(accumulate(1.0 / rank ** s
+                                           for rank in range(1, n + 1)))
+        self.ids = list(range(1, n + 1))
+        if shuffle:
+            rng.shuffle(self.ids)
+        self.rng = rng
+
+    def __call__(self):
+        total = self.cum_weights[-1]
+        return self.ids[bisect(self.cum_weights, self.rng.random() * total)]
+
+
+def weighted(rng, weights):
+    population = list(weights)
+    cum_weights = list(accumulate(weights.values()))
+    return lambda: rng.choices(population, cum_weights=cum_weights)[0]
+
+
+def sizes(project, rows):
+    return {
+        'trivia': {'questions': rows},
+        'coffee-shop': {'drinks': max(10, rows // 100)},
+        'capstone': {'actors': max(10, rows // 4), 'movies': rows},
+        'fyyur': {'venues': max(10, rows // 100),
+                  'artists': max(10, rows // 20), 'shows': rows},
+    }[project]
+
+
+'''
+Generators, one per project, yielding (table name, row dict)
+'''
+
+
+def trivia_rows(rng, size):
+    for index, category in enumerate(CATEGORIES, start=1):
+        yield 'categories', {'id': index, 'type': category}
+
+    category = Zipf(len(CATEGORIES), 0.8, rng)
+    for index in range(1, size['questions'] + 1):
+        yield 'questions', {
+            'id': index,
+            'question': 'Synthetic question number {}?'.format(index),
+            'answer': str(index),
+            'category': category(),
+            'difficulty': int(round(rng.triangular(1, 5, 3))),
+        }
+
+
+def coffee_shop_rows(rng, size):
+    for index in range(1, size['drinks'] + 1):
+        recipe = [{'name': rng.choice(INGREDIENTS),
+                   'color': rng.choice(COLORS),
+                   'parts': rng.randint(1, 4)}
+                  for _ in range(rng.randint(1, 4))]
+        yield 'drink', {
+            'id': index,
+            'title': 'drink {}'.format(index),
+            'recipe': json.dumps(recipe),
+        }
+
+
+def capstone_rows(rng, size):
+    for index in range(1, size['actors'] + 1):
+        yield 'actors', {
+            'id': index,
+            'name': 'Actor {}'.format(index),
+            'gender': rng.choice(['male', 'female']),
+        }
+
+    for index in range(1, size['movies'] + 1):
+        yield 'movies', {
+            'id': index,
+            'title': 'Movie {}'.format(index),
+            'release_date': date(1950, 1, 1) + timedelta(
+                days=int(27000 * rng.random() ** 0.5)),
+        }
+
+    # most movies have a handful of actors, a few have a cast of hundreds
+    actor = Zipf(size['actors'], 1.0, rng)
+    max_cast = min(size['actors'], 300)
+    cast_id = 0
+    for index in range(1, size['movies'] + 1):
+        cast_size = min(max_cast, int(rng.paretovariate(1.3)) + 1)
+        cast = set()
+        while len(cast) < cast_size:
+            cast.add(actor())
+
+        for actor_id in sorted(cast):
+            cast_id += 1
+            yield 'cast', {'id': cast_id, 'movie_id': index,
+                           'actor_id': actor_id}
+
+
+# relative to the current day so there are always past and upcoming shows,
+# the same seed gives the same rows on the same day
+def show_times(rng, count, past_days=730, future_days=180):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    hour = weighted(rng, HOUR_WEIGHTS)
+    days = list(range(-past_days, future_days))
+    cum_weights = list(accumulate(
+        WEEKDAY_WEIGHTS[(today + timedelta(days=day)).weekday()]
+        for day in days))
+
+    for _ in range(count):
+        day = rng.choices(days, cum_weights=cum_weights)[0]
+        yield today + timedelta(days=day, hours=hour(),
+                                minutes=rng.choice([0, 0, 30]))
+
+
+def fyyur_rows(rng, size):
+    city = Zipf(len(CITIES), 1.0, rng, shuffle=False)
+    genre = Zipf(len(GENRES), 1.1, rng, shuffle=False)
+
+    def genres():
+        return ','.join(sorted({GENRES[genre() - 1]
+                                for _ in range(rng.randint(1, 3))}))
+
+    for index in range(1, size['venues'] + 1):
+        name, state = CITIES[city() - 1]
+        yield 'venues', {
+            'id': index,
+            'name': 'Venue {}'.format(index),
+            'city': name,
+            'state': state,
+            'address': '{} Main Street'.format(rng.randint(1, 9999)),
+            'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999), index % 10000),
+            'image_link': 'https://example.com/venues/{}.jpg'.format(index),
+            'genres': genres(),
+            'seeking_talent': rng.random() < 0.3,
+        }
+
+    for index in range(1, size['artists'] + 1):
+        name, state = CITIES[city() - 1]
+        yield 'artists', {
+            'id': index,
+            'name': 'Artist {}'.format(index),
+            'city': name,
+            'state': state,
+            'genres': genres(),
+            'image_link': 'https://example.com/artists/{}.jpg'.format(index),
+            'seeking_venue': rng.random() < 0.4,
+        }
+
+    venue = Zipf(size['venues'], 1.1, rng)
+    artist = Zipf(size['artists'], 0.9, rng)
+    for index, start_time in enumerate(show_times(rng, size['shows']), 1):
+        yield 'shows', {
+            'id': index,
+            'venue_id': venue(),
+            'artist_id': artist(),
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=2),
+        }
+
+
+GENERATORS = {
+    'trivia': trivia_rows,
+    'coffee-shop': coffee_shop_rows,
+    'capstone': capstone_rows,
+    'fyyur': fyyur_rows,
+}
+
+
+def generate(project, rows, seed=0):
+    return GENERATORS[project](random.Random(seed), sizes(project, rows))
+
+
+'''
+Loaders, the rows are buffered per table and flushed every CHUNK_SIZE rows
+'''
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+                     .replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(engine, table, rows):
+    # the columns the generator leaves out keep their server default
+    columns = [column.name for column in table.columns
+               if column.server_default is None or column.name in rows[0]]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row.get(column))
+                               for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN'.format(
+            table.name, ', '.join('"{}"'.format(c) for c in columns)), buffer)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def executemany_rows(engine, table, rows):
+    with engine.begin() as connection:
+        connection.execute(table.insert(), rows)
+
+
+def reset_sequences(engine, tables):
+    if engine.dialect.name != 'postgresql':
+        return
+
+    with engine.begin() as connection:
+        for table in tables:
+            connection.execute(
+                "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+                "(SELECT MAX(id) FROM \"{0}\"))".format(table))
+
+
+def load(engine, metadata, rows):
+    write = copy_rows if engine.dialect.name == 'postgresql' \
+        else executemany_rows
+    counts = {}
+    chunks = {}
+
+    def flush(table):
+        write(engine, metadata.tables[table], chunks[table])
+        counts[table] = counts.get(table, 0) + len(chunks[table])
+        chunks[table] = []
+
+    for table, row in rows:
+        chunk = chunks.setdefault(table, [])
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            flush(table)
+
+    for table in list(chunks):
+        if chunks[table]:
+            flush(table)
+
+    reset_sequences(engine, counts)
+    return counts
+
+
+def project_metadata(project):
+    use_project(project)
+    if project == 'coffee-shop':
+        from src.database.models import db
+    else:
+        from models import db
+
+    return db.metadata
+
+
+'''
+populate(project, database_url, rows, seed=0, recreate=True)
+    (re)creates the tables of the project from its models and loads the
+    generated rows, returns the number of rows per table. The projects read
+    their database from DATABASE_URL when their models are imported.
+'''
+
+
+def populate(project, database_url, rows, seed=0, recreate=True,
+             metadata=None):
+    from sqlalchemy import create_engine
+
+    os.environ.setdefault('DATABASE_URL', database_url)
+    if metadata is None:
+        metadata = project_metadata(project)
+
+    engine = create_engine(database_url)
+    try:
+        if recreate:
+            metadata.drop_all(engine)
+        metadata.create_all(engine)
+        return load(engine, metadata, generate(project, rows, seed))
+    finally:
+        engine.dispose()
@@ -0,0 +1,95 @@
+# --------------------------------------------------------------------------- #
+# Datetime render benchmark
+# render time of the fyyur page of a venue with 5,000 past shows, the
+# `datetime` filter of datetimes.py (native datetimes, compiled patterns,
+# memoized) vs the former one (str + dateutil parse + babel format_datetime
+# on every call). The fragment cache is invalidated before every request so
+# the whole page is rendered each time
+#
+# usage: python -m benchmarks.datetime_render [-n 20] [--shows 5000]
+# --------------------------------------------------------------------------- #
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.datagen import populate
+from benchmarks.projects import use_project
+
+
+def former_format_datetime(value, format='medium'):
+    import babel.dates
+    import dateutil.parser
+
+    date = dateutil.parser.parse(str(value))
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def add_past_shows(app, venue_id, count):
+    from models import db, Show
+
+    with app.app_context():
+        artist_id = db.session.query(Show.artist_id).limit(1).scalar()
+        start = datetime.now() - timedelta(days=count)
+        db.session.bulk_insert_mappings(Show, [
+            {'venue_id': venue_id, 'artist_id': artist_id,
+             'start_time': start + timedelta(days=i, hours=20)}
+            for i in range(count)])
+        db.session.commit()
+
+
+def measure(app, path, iterations):
+    fragments = app.extensions['fragments']
+    client = app.test_client()
+    client.get(path)  # warm up the pool and the caches
+
+    timings = []
+    for _ in range(iterations):
+        fragments.invalidate('venue')
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, (path, response.status_code)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Datetime render benchmark')
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    parser.add_argument('--shows', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='datetime-render-')
+    url = 'sqlite:///' + os.path.join(directory, 'fyyur.db')
+    os.environ['DATABASE_URL'] = url
+    try:
+        use_project('fyyur')
+        populate('fyyur', url, 100)
+        from app import create_app
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url})
+        add_past_shows(app, 1, args.shows)
+
+        path = '/venues/1'
+        current = app.jinja_env.filters['datetime']
+        app.jinja_env.filters['datetime'] = former_format_datetime
+        former = measure(app, path, args.iterations)
+        app.jinja_env.filters['datetime'] = current
+        memoized = measure(app, path, args.iterations)
+
+        print('{:<28} {:>12} {:>12}'.format('path', 'former ms', 'memoized ms'))
+        print('{:<28} {:>12.1f} {:>12.1f}'.format(path, former, memoized))
+        print('median render time of the page with {} past shows'.format(
+            args.shows))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# --------------------------------------------------------------------------- #
+# Test database fixtures
+# shared by the conftest.py of the trivia, capstone and fyyur test suites:
+#   - the schema and the rows of the project dump (trivia.psql,
+#     casting_agency.sql) or generated rows (fyyur, benchmarks.datagen) are
+#     loaded once per run in a template database
+#   - every pytest-xdist worker clones the template (CREATE DATABASE ...
+#     TEMPLATE on Postgres, a file copy on SQLite)
+#   - every test runs in a SAVEPOINT of a connection whose transaction is
+#     rolled back at the end of the test, nothing is ever committed
+# --------------------------------------------------------------------------- #
+import copy
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import scoped_session
+
+from benchmarks.datagen import load
+
+COPY_START = re.compile(r'^COPY (?:\w+\.)?"?(\w+)"? \(([^)]*)\) FROM stdin;$')
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', '\\': '\\'}
+
+
+'''
+dump_rows(path, metadata)
+    yields (table name, row dict) from the COPY blocks of a pg_dump file,
+    the values are converted to the python types of the columns so the rows
+    load on SQLite as well. Tables unknown to the models (alembic_version)
+    are skipped
+'''
+
+
+def _copy_text(value):
+    if value == '\\N':
+        return None
+    return re.sub(r'\\(.)',
+                  lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)),
+                  value)
+
+
+def _convert(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type is bool:
+        return value in ('t', 'true')
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type in (int, float, str):
+        return python_type(value)
+    return value
+
+
+def dump_rows(path, metadata):
+    table = None
+    with open(path, encoding='utf-8') as dump:
+        for line in dump:
+            line = line.rstrip('\n')
+            if table is None:
+                match = COPY_START.match(line)
+                if match and match.group(1) in metadata.tables:
+                    table = metadata.tables[match.group(1)]
+                    columns = [table.columns[name.strip().strip('"')]
+                               for name in match.group(2).split(',')]
+                continue
+
+            if line == '\\.':
+                table = None
+                continue
+
+            values = [_copy_text(value) for value in line.split('\t')]
+            yield table.name, {column.name: _convert(column, value)
+                               for column, value in zip(columns, values)}
+
+
+'''
+Databases
+    the template and the worker databases are named after the test database:
+    trivia_test_template, trivia_test_gw0... (or files next to it on SQLite)
+'''
+
+
+def _with_database(url, database):
+    if hasattr(url, 'set'):
+        return url.set(database=database)
+    url = copy.copy(url)
+    url.database = database
+    return url
+
+
+def derive_url(url, suffix):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        root, ext = os.path.splitext(url.database)
+        return str(_with_database(url, '{}_{}{}'.format(root, suffix,
+                                                        ext or '.db')))
+    return str(_with_database(url, '{}_{}'.format(url.database, suffix)))
+
+
+def sqlite_url(name):
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix=name + '-'),
+                                       name + '.db')
+
+
+def _postgres(url, *statements):
+    engine = create_engine(_with_database(url, 'postgres'),
+                           isolation_level='AUTOCOMMIT')
+    try:
+        with engine.connect() as connection:
+            for statement in statements:
+                connection.execute(statement)
+    finally:
+        engine.dispose()
+
+
+def drop_database(url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if os.path.exists(url.database):
+            os.remove(url.database)
+    else:
+        _postgres(url, 'DROP DATABASE IF EXISTS "{}"'.format(url.database))
+
+
+def create_database(url, template=None):
+    drop_database(url)
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if template is not None:
+            shutil.copyfile(make_url(template).database, url.database)
+        return str(url)
+
+    statement = 'CREATE DATABASE "{}"'.format(url.database)
+    if template is not None:
+        statement += ' TEMPLATE "{}"'.format(make_url(template).database)
+    _postgres(url, statement)
+    return str(url)
+
+
+def create_template(url, metadata, rows):
+    template = create_database(derive_url(url, 'template'))
+    engine = create_engine(template)
+    try:
+        metadata.create_all(engine)
+        load(engine, metadata, rows)
+    finally:
+        engine.dispose()
+
+    return template
+
+
+'''
+test_engine(url)
+    an engine for the tests of a worker. pysqlite does not emit BEGIN itself
+    and would break the SAVEPOINTs, the foreign keys are enabled so ondelete
+    cascades behave like on Postgres
+'''
+
+
+def test_engine(url):
+    engine = create_engine(url)
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+            dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+        @event.listens_for(engine, 'begin')
+        def begin(connection):
+            connection.execute('BEGIN')
+
+    return engine
+
+
+'''
+rollback_session(db, engine)
+    replaces db.session (flask_sqlalchemy) by a session bound to a connection
+    in a transaction. The session works in a SAVEPOINT restarted every time
+    the application commits or rolls back, and the end of a request only
+    discards the pending changes, so the test sees what its requests did
+    and the rollback of the transaction undoes everything
+'''
+
+
+class RollbackSession(scoped_session):
+    def remove(self):
+        # like close(): the instances are detached as they are, not expired
+        session = self.registry()
+        session.expunge_all()
+        session.rollback()
+
+
+# like the sessions of the apps (expire_on_commit=False) the instances are not
+# expired on commit, a rolled back SAVEPOINT expires what it changed itself
+def _restart_savepoint(session, transaction):
+    if transaction.nested and not transaction._parent.nested:
+        session.begin_nested()
+
+
+@contextmanager
+def rollback_session(db, engine):
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = RollbackSession(db.create_session({'bind': connection,
+                                                 'binds': {}}))
+    event.listen(session, 'after_transaction_end', _restart_savepoint)
+    session.begin_nested()
+
+    original, db.session = db.session, session
+    try:
+        yield session
+    finally:
+        db.session = original
+        event.remove(session, 'after_transaction_end', _restart_savepoint)
+        session.rollback()
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+'''
+pytest hooks, called from the conftest.py of the projects
+    configure(config, metadata, dump)  builds the template on the controller
+                                       (or from rows, generated ones for
+                                       instance, when there is no dump)
+    configure_node(node)               hands it to the xdist workers
+    worker_database(config)            clones it for the current worker
+    unconfigure(config)                drops the template
+'''
+
+
+def configure(config, metadata, dump=None, name=None, rows=None):
+    if hasattr(config, 'workerinput'):
+        return
+
+    if name is None:
+        name = os.path.splitext(os.path.basename(dump))[0]
+    if rows is None:
+        rows = dump_rows(dump, metadata)
+
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        url = sqlite_url(name + '_test')
+        config.temporary_directory = os.path.dirname(make_url(url).database)
+
+    config.test_database_url = url
+    config.template_database_url = create_template(url, metadata, rows)
+
+
+def configure_node(node):
+    node.workerinput['test_database_url'] = node.config.test_database_url
+    node.workerinput['template_database_url'] = \
+        node.config.template_database_url
+
+
+def worker_database(config):
+    workerinput = getattr(config, 'workerinput', {})
+    url = workerinput.get('test_database_url', getattr(
+        config, 'test_database_url', None))
+    template = workerinput.get('template_database_url', getattr(
+        config, 'template_database_url', None))
+
+    return create_database(
+        derive_url(url, workerinput.get('workerid', 'main')), template)
+
+
+def unconfigure(config):
+    template = getattr(config, 'template_database_url', None)
+    if template is not None and not hasattr(config, 'workerinput'):
+        drop_database(template)
+
+    if hasattr(config, 'temporary_directory'):
+        shutil.rmtree(config.temporary_directory, ignore_errors=True)
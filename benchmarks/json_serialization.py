@@ -0,0 +1,94 @@
+# --------------------------------------------------------------------------- #
+# JSON serialization benchmark
+# compares the legacy path (ORM instances + format() + jsonify) with the
+# row tuple serializers + JSON provider for trivia /questions?page=1 and
+# coffee-shop /drinks-detail, it runs against the database configured for
+# the project
+#
+# usage: python -m benchmarks.json_serialization trivia|coffee-shop [-n 2000]
+# --------------------------------------------------------------------------- #
+import argparse
+import time
+
+from benchmarks.projects import use_project
+
+
+def measure(app, path, view, iterations):
+    with app.test_request_context(path):
+        view()  # warm up the connection pool and the mappers
+        start = time.perf_counter()
+        for _ in range(iterations):
+            view()
+        elapsed = time.perf_counter() - start
+
+    return iterations / elapsed
+
+
+def trivia_cases():
+    from flask import jsonify
+    from flaskr import create_app, QUESTIONS_PER_PAGE
+    from models import Question, Category
+
+    app = create_app()
+
+    def before():
+        questions = Question.query.order_by(Question.id) \
+                                  .paginate(page=1, per_page=QUESTIONS_PER_PAGE)
+        categories = Category.query.order_by(Category.id).all()
+        return jsonify({
+            'success': True,
+            'questions': [question.format() for question in questions.items],
+            'total_questions': questions.total,
+            'current_category': None,
+            'categories': {category.id: category.type
+                           for category in categories}
+        })
+
+    return app, '/questions?page=1', before, app.view_functions['get_questions']
+
+
+def coffee_shop_cases():
+    from flask import jsonify
+    from src.api import app
+    from src.database.models import Drink
+
+    def before():
+        drinks = Drink.query.all()
+        return jsonify({
+            'success': True,
+            'drinks': [drink.long() for drink in drinks]
+        })
+
+    # skips the requires_auth decorator, only the handler is measured
+    detail = app.view_functions['get_drinks_detail'].__wrapped__
+
+    return app, '/drinks-detail', before, lambda: detail({})
+
+
+CASES = {
+    'trivia': trivia_cases,
+    'coffee-shop': coffee_shop_cases,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='JSON serialization benchmark')
+    parser.add_argument('project', choices=sorted(CASES))
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    use_project(args.project)
+    app, path, before, after = CASES[args.project]()
+
+    before_rps = measure(app, path, before, args.iterations)
+    after_rps = measure(app, path, after, args.iterations)
+
+    print('{} {}'.format(args.project, path))
+    print('  before: {:10.1f} req/s'.format(before_rps))
+    print('  after:  {:10.1f} req/s'.format(after_rps))
+    print('  speedup: {:.2f}x'.format(after_rps / before_rps))
+
+
+if __name__ == '__main__':
+    main()
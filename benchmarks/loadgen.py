@@ -0,0 +1,190 @@
+# --------------------------------------------------------------------------- #
+# Load generator
+# a small closed-loop HTTP/1.1 load generator on top of asyncio streams, every
+# client keeps its connection alive and sends the next request as soon as the
+# previous response is read, so concurrency is the number of clients
+# --------------------------------------------------------------------------- #
+import asyncio
+import json
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, urlencode
+
+Request = namedtuple('Request', ['method', 'path', 'headers', 'body'])
+
+
+def request(method, path, headers=None, json_body=None, form=None,
+            body=b'', content_type=None):
+    headers = dict(headers or {})
+    if json_body is not None:
+        body = json.dumps(json_body).encode('utf-8')
+        content_type = 'application/json'
+    elif form is not None:
+        body = urlencode(form, doseq=True).encode('utf-8')
+        content_type = 'application/x-www-form-urlencoded'
+
+    if content_type is not None:
+        headers['Content-Type'] = content_type
+
+    return Request(method, path, headers, body)
+
+
+'''
+Scenarios are lists of requests, or of callables returning a request when a
+request must differ every time it is sent (unique titles for instance)
+'''
+
+
+'''
+Stats
+    latencies are kept in seconds, the percentiles are computed on demand
+'''
+
+
+class Stats:
+    def __init__(self, name=''):
+        self.name = name
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def add(self, status, latency):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def percentile(self, value):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(value / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'errors': self.errors,
+            'statuses': {str(status): count
+                         for status, count in sorted(self.statuses.items())},
+            'throughput': round(self.throughput, 1),
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p90_ms': round(self.percentile(90) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+            'max_ms': round(max(self.latencies, default=0) * 1000, 2),
+        }
+
+
+async def _read_body(reader, headers):
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                return
+
+    length = headers.get('content-length')
+    if length is not None:
+        await reader.readexactly(int(length))
+    else:
+        await reader.read()
+
+
+async def _send(reader, writer, host, req):
+    lines = ['{} {} HTTP/1.1'.format(req.method, req.path),
+             'Host: {}'.format(host),
+             'Connection: keep-alive',
+             'Content-Length: {}'.format(len(req.body))]
+    lines.extend('{}: {}'.format(key, value)
+                 for key, value in req.headers.items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + req.body)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed by the server')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+
+    await _read_body(reader, headers)
+    return status, headers.get('connection', '').lower() == 'close'
+
+
+async def _client(base, requests, offset, deadline, stats):
+    reader = writer = None
+    index = offset
+
+    while time.perf_counter() < deadline:
+        req = requests[index % len(requests)]
+        index += 1
+        if callable(req):
+            req = req()
+
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    base.hostname, base.port or 80)
+
+            start = time.perf_counter()
+            status, close = await _send(reader, writer, base.netloc, req)
+            stats.add(status, time.perf_counter() - start)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            close = True
+
+        if close and writer is not None:
+            writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+'''
+run(url, requests, concurrency=50, duration=10.0, name='')
+    sends the requests round-robin from concurrency clients during duration
+    seconds and returns the Stats
+'''
+
+
+async def run_async(url, requests, concurrency=50, duration=10.0, name=''):
+    base = urlsplit(url)
+    stats = Stats(name)
+    deadline = time.perf_counter() + duration
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(base, requests, offset, deadline, stats)
+        for offset in range(concurrency)])
+    stats.elapsed = time.perf_counter() - start
+
+    return stats
+
+
+def run(url, requests, concurrency=50, duration=10.0, name=''):
+    return asyncio.run(run_async(url, requests, concurrency, duration, name))
+
+
+def format_table(summaries):
+    lines = ['{:<40} {:>9} {:>7} {:>10} {:>9} {:>9} {:>9}'.format(
+        'scenario', 'requests', 'errors', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms')]
+    for summary in summaries:
+        lines.append('{name:<40} {requests:>9} {errors:>7} {throughput:>10} '
+                     '{p50_ms:>9} {p90_ms:>9} {p99_ms:>9}'.format(**summary))
+
+    return '\n'.join(lines)
@@ -0,0 +1,28 @@
+# --------------------------------------------------------------------------- #
+# Projects
+# every project is a standalone flask app with top level modules (models,
+# config, app...), so only one of them can be imported per process
+# --------------------------------------------------------------------------- #
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROJECTS = {
+    'fyyur': os.path.join(ROOT, '02-sql-data-modeling-web', 'fyyur-project'),
+    'trivia': os.path.join(ROOT, '03-trivia-api', 'backend'),
+    'coffee-shop': os.path.join(ROOT, '04-coffee-shop', 'backend'),
+    'capstone': os.path.join(ROOT, '05-capstone'),
+}
+
+
+def use_project(name):
+    if name not in PROJECTS:
+        raise SystemExit('unknown project {}, choose one of {}'.format(
+            name, ', '.join(sorted(PROJECTS))))
+
+    path = PROJECTS[name]
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    return path
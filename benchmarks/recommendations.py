@@ -0,0 +1,65 @@
+# --------------------------------------------------------------------------- #
+# Recommendations benchmark
+# the nightly build of the fyyur recommendations (recommendations.py) on a
+# seeded SQLite database: the pass over the shows, the similarity with the
+# SciPy sparse engine and with the plain Python one, and the store of the
+# top-K tables
+#
+# usage: python -m benchmarks.recommendations [--rows 100000] [--top-k 10]
+# --------------------------------------------------------------------------- #
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.datagen import populate
+from benchmarks.projects import use_project
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommendations benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='recommendations-')
+    url = 'sqlite:///' + os.path.join(directory, 'fyyur.db')
+    os.environ['DATABASE_URL'] = url
+    try:
+        use_project('fyyur')
+        counts = populate('fyyur', url, args.rows)
+        from app import create_app
+        from models import db
+        import recommendations
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url})
+
+        with app.app_context():
+            plays, plays_ms = timed(recommendations.plays)
+            print('{} shows, {} artist x venue pairs read in {:.1f} ms'.format(
+                counts['shows'], len(plays), plays_ms))
+
+            engines = ['python']
+            if recommendations.sparse is not None:
+                engines.insert(0, 'scipy')
+            for engine in engines:
+                neighbours, ms = timed(recommendations.compute, plays,
+                                       args.top_k, engine)
+                print('{:<8} similarity {:>10.1f} ms'.format(engine, ms))
+
+            stored, ms = timed(recommendations.store, neighbours)
+            db.session.commit()
+            print('stored {} rows in {:.1f} ms'.format(
+                sum(stored.values()), ms))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# --------------------------------------------------------------------------- #
+# Reports
+# every benchmark writes its JSON report under benchmarks/results/<commit>/ so
+# two commits can be compared
+# --------------------------------------------------------------------------- #
+import json
+import os
+import subprocess
+import time
+
+from benchmarks.projects import ROOT
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percent(old, new):
+    return '{:+.1f}%'.format((new - old) / old * 100) if old else 'n/a'
+
+
+def write_report(report, name, output=RESULTS):
+    report.setdefault('commit', current_commit())
+    report.setdefault('created_at', time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    directory = os.path.join(output, report['commit'])
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    return path
@@ -0,0 +1,207 @@
+# --------------------------------------------------------------------------- #
+# Scenarios
+# one scenario per route of every project, the ids are picked in the range of
+# the seeded rows. DELETE scenarios target ids above the seeded range so the
+# dataset stays the same during a run, the not found path is measured.
+# --------------------------------------------------------------------------- #
+import itertools
+from datetime import datetime, timedelta
+
+from benchmarks.loadgen import request
+
+_unique = itertools.count(1)
+
+
+def unique(prefix):
+    return '{} {}'.format(prefix, next(_unique))
+
+
+def trivia(size, tokens):
+    last = size['questions']
+    csv_body = 'question,answer,category,difficulty\n' + ''.join(
+        'Imported question {}?,{},1,1\n'.format(i, i) for i in range(100))
+
+    return {
+        'GET /categories': [request('GET', '/categories')],
+        'GET /questions first page': [request('GET', '/questions?page=1')],
+        'GET /questions last page': [
+            request('GET', '/questions?page={}'.format(max(1, last // 10)))],
+        'GET /questions by category': [
+            request('GET', '/questions?current_category=1&page=2')],
+        'GET /categories/<id>/questions': [
+            request('GET', '/categories/3/questions?page=1')],
+        'POST /questions search': [
+            request('POST', '/questions', json_body={'searchTerm': 'number 1'})],
+        'POST /questions create': [
+            lambda: request('POST', '/questions', json_body={
+                'question': unique('Benchmark question'), 'answer': '42',
+                'difficulty': 3, 'category': 1})],
+        'DELETE /questions/<id>': [
+            request('DELETE', '/questions/{}'.format(last * 10))],
+        'POST /quizzes': [
+            request('POST', '/quizzes', json_body={
+                'previous_questions': list(range(1, 50)),
+                'quiz_category': {'id': 2, 'type': 'Art'}})],
+        'GET /questions/export tail': [
+            request('GET', '/questions/export?gzip=false&since={}'.format(
+                max(0, last - 1000)))],
+        'POST /questions/import': [
+            request('POST', '/questions/import', body=csv_body.encode('utf-8'),
+                    content_type='text/csv')],
+    }
+
+
+def coffee_shop(size, tokens):
+    auth = {'Authorization': 'Bearer ' + tokens['coffee-shop']}
+    recipe = [{'name': 'milk', 'color': 'grey', 'parts': 1},
+              {'name': 'coffee', 'color': 'brown', 'parts': 2}]
+    last = size['drinks']
+
+    return {
+        'GET /drinks': [request('GET', '/drinks')],
+        'GET /drinks-detail': [request('GET', '/drinks-detail', auth)],
+        'POST /drinks': [
+            lambda: request('POST', '/drinks', auth, json_body={
+                'title': unique('benchmark drink'), 'recipe': recipe})],
+        'PATCH /drinks/<id>': [
+            request('PATCH', '/drinks/{}'.format(last // 2), auth,
+                    json_body={'recipe': recipe})],
+        'DELETE /drinks/<id>': [
+            request('DELETE', '/drinks/{}'.format(last * 10), auth)],
+        'POST /drinks/batch': [
+            request('POST', '/drinks/batch', auth, json_body={'drinks': [
+                {'title': 'drink {}'.format(i), 'recipe': recipe}
+                for i in range(1, min(last, 100) + 1)]})],
+    }
+
+
+def capstone(size, tokens):
+    auth = {'Authorization': 'Bearer ' + tokens['capstone']}
+    last_actor, last_movie = size['actors'], size['movies']
+
+    return {
+        'GET /': [request('GET', '/')],
+        'GET /actors first page': [request('GET', '/actors?page=1', auth)],
+        'GET /actors last page': [
+            request('GET', '/actors?page={}'.format(max(1, last_actor // 5)),
+                    auth)],
+        'GET /movies first page': [request('GET', '/movies?page=1', auth)],
+        'GET /movies last page': [
+            request('GET', '/movies?page={}'.format(max(1, last_movie // 5)),
+                    auth)],
+        'GET /actors/export tail': [
+            request('GET', '/actors/export?gzip=false&since={}'.format(
+                max(0, last_actor - 1000)), auth)],
+        'GET /movies/export tail': [
+            request('GET', '/movies/export?gzip=false&since={}'.format(
+                max(0, last_movie - 1000)), auth)],
+        'POST /actors': [
+            lambda: request('POST', '/actors', auth, json_body={
+                'name': unique('Benchmark actor'), 'gender': 'female'})],
+        'PATCH /actors/<id>': [
+            request('PATCH', '/actors/{}'.format(last_actor // 2), auth,
+                    json_body={'gender': 'female'})],
+        'DELETE /actors/<id>': [
+            request('DELETE', '/actors/{}'.format(last_actor * 10), auth)],
+        'POST /movies': [
+            lambda: request('POST', '/movies', auth, json_body={
+                'title': unique('Benchmark movie'),
+                'release_date': '2001-12-13', 'actors': [1, 2, 3]})],
+        'PATCH /movies/<id>': [
+            request('PATCH', '/movies/{}'.format(last_movie // 2), auth,
+                    json_body={'title': 'Benchmark title'})],
+        'DELETE /movies/<id>': [
+            request('DELETE', '/movies/{}'.format(last_movie * 10), auth)],
+    }
+
+
+def fyyur(size, tokens):
+    venue, artist = size['venues'] // 2, size['artists'] // 2
+    venue_form = {
+        'name': 'Benchmark venue', 'city': 'Austin', 'state': 'TX',
+        'address': '1 Main Street', 'phone': '555-000-0000',
+        'image_link': 'https://example.com/venue.jpg',
+        'genres': ['Jazz', 'Blues'], 'facebook_link': '',
+    }
+    artist_form = {
+        'name': 'Benchmark artist', 'city': 'Austin', 'state': 'TX',
+        'phone': '555-000-0000', 'image_link': 'https://example.com/a.jpg',
+        'genres': ['Jazz'], 'facebook_link': '',
+    }
+
+    return {
+        'GET /': [request('GET', '/')],
+        'GET /venues': [request('GET', '/venues')],
+        'GET /venues/<id>': [request('GET', '/venues/{}'.format(venue))],
+        'GET /venues/nearby': [
+            request('GET', '/venues/nearby?lat=30.27&lng=-97.74&radius=25')],
+        'POST /venues/search': [
+            request('POST', '/venues/search', form={'search_term': 'Venue 1'})],
+        'GET /venues/create': [request('GET', '/venues/create')],
+        'POST /venues/create': [
+            request('POST', '/venues/create', form=venue_form)],
+        'GET /venues/<id>/edit': [
+            request('GET', '/venues/{}/edit'.format(venue))],
+        'POST /venues/<id>/edit': [
+            request('POST', '/venues/{}/edit'.format(venue),
+                    form=dict(venue_form, name='Venue {}'.format(venue)))],
+        'DELETE /venues/<id>': [
+            request('DELETE', '/venues/{}'.format(size['venues'] * 10))],
+        'GET /artists': [request('GET', '/artists')],
+        'GET /artists filtered': [
+            request('GET', '/artists?sort=upcoming&state=CA'),
+            request('GET', '/artists?genre=Jazz', headers={
+                'Accept': 'application/json'})],
+        'GET /artists/<id>': [request('GET', '/artists/{}'.format(artist))],
+        'POST /artists/search': [
+            request('POST', '/artists/search', form={'search_term': 'Artist 1'})],
+        'GET /artists/search city': [
+            request('GET', '/artists/search?search_term=Austin,+TX&page=2')],
+        'GET /artists/create': [request('GET', '/artists/create')],
+        'POST /artists/create': [
+            request('POST', '/artists/create', form=artist_form)],
+        'GET /artists/<id>/edit': [
+            request('GET', '/artists/{}/edit'.format(artist))],
+        'POST /artists/<id>/edit': [
+            request('POST', '/artists/{}/edit'.format(artist),
+                    form=dict(artist_form, name='Artist {}'.format(artist)))],
+        'DELETE /artist/<id>': [
+            request('DELETE', '/artist/{}'.format(size['artists'] * 10))],
+        'GET /shows': [request('GET', '/shows')],
+        'GET /shows/create': [request('GET', '/shows/create')],
+        # a free slot for every request, the double bookings are refused
+        'POST /shows/create': [
+            lambda: request('POST', '/shows/create', form={
+                'artist_id': artist, 'venue_id': venue,
+                'start_time': (datetime(2030, 1, 1) + timedelta(
+                    hours=3 * next(_unique))).isoformat(' ')})],
+        'GET /venues/<id>/availability': [
+            request('GET', '/venues/{}/availability'.format(venue))],
+        'GET /<kind>/<id>/calendar/<year>/<month>': [
+            request('GET', '/venues/{}/calendar/2030/1'.format(venue)),
+            request('GET', '/artists/{}/calendar/2030/1'.format(artist)),
+            request('GET', '/cities/TX/Austin/calendar/2030/1')],
+        'GET /stats': [
+            request('GET', '/stats?year=2030'),
+            request('GET', '/stats?year=2030&genre=Jazz&state=TX', headers={
+                'Accept': 'application/json'})],
+    }
+
+
+SCENARIOS = {
+    'trivia': trivia,
+    'coffee-shop': coffee_shop,
+    'capstone': capstone,
+    'fyyur': fyyur,
+}
+
+SERVERS = {
+    'trivia': 'flaskr:create_app()',
+    'coffee-shop': 'src.api:app',
+    'capstone': 'app:create_app()',
+    'fyyur': 'app:create_app()',
+}
+
+
+def scenarios(project, size, tokens):
+    return SCENARIOS[project](size, tokens)
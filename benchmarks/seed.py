@@ -0,0 +1,40 @@
+# --------------------------------------------------------------------------- #
+# Seed
+# recreates the tables of a project from its own models and loads the rows of
+# the synthetic data generator (benchmarks/datagen.py), the number of rows of
+# the main table is given by the scale and the other tables are sized from it
+#
+# usage: python -m benchmarks.seed trivia --database-url sqlite:////tmp/t.db --scale 10k
+# --------------------------------------------------------------------------- #
+import argparse
+import json
+import time
+
+from benchmarks.datagen import GENERATORS, populate
+
+SCALES = {
+    '10k': 10000,
+    '100k': 100000,
+    '1M': 1000000,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed synthetic data')
+    parser.add_argument('project', choices=sorted(GENERATORS))
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--rows', type=int,
+                        help='number of rows of the main table, overrides --scale')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = populate(args.project, args.database_url,
+                      args.rows or SCALES[args.scale], args.seed)
+    print(json.dumps({'counts': counts,
+                      'seconds': round(time.perf_counter() - start, 2)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# --------------------------------------------------------------------------- #
+# Servers
+# starts a project server (gunicorn, uvicorn...) in a subprocess for the
+# duration of a benchmark and waits for its port to accept connections
+# --------------------------------------------------------------------------- #
+import os
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError('server did not start on port {}'.format(port))
+
+
+@contextmanager
+def serve(command, cwd, port, env=None):
+    environ = dict(os.environ)
+    environ.update(env or {})
+
+    process = subprocess.Popen(command, cwd=cwd, env=environ)
+    try:
+        wait_for_port(port)
+        yield 'http://127.0.0.1:{}'.format(port)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
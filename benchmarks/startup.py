@@ -0,0 +1,158 @@
+# --------------------------------------------------------------------------- #
+# Startup benchmark
+# cold start of every project in a fresh interpreter with -X importtime: the
+# time to import the app module, the time of its factory and the slowest top
+# level imports. The report goes to benchmarks/results/<commit>/startup.json,
+# --baseline compares it with an older report and exits with an error when a
+# project got slower than --max-regression, so it can run in CI
+#
+# usage: python -m benchmarks.startup [trivia capstone ...] [-n 5]
+#            [--baseline benchmarks/results/abc123/startup.json]
+# --------------------------------------------------------------------------- #
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.projects import PROJECTS
+from benchmarks.reports import RESULTS, percent, write_report
+
+# (imports, factory) of every project, nothing may touch the network or the
+# database: DATABASE_URL points to an in-memory SQLite database
+ENTRY_POINTS = {
+    'trivia': ('from flaskr import create_app', 'create_app()'),
+    'coffee-shop': ('from src.api import app', ''),
+    'capstone': ('from app import create_app', 'create_app()'),
+    'fyyur': ('from app import create_app', 'create_app()'),
+}
+
+SNIPPET = '''
+import json, time
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{factory}
+done = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - start) * 1000,
+                  'factory_ms': (done - imported) * 1000}}))
+'''
+
+
+'''
+parse_importtime(stderr)
+    returns {package: ms} from the -X importtime output, the self time of
+    every module is added to its root package (sqlalchemy.orm.query counts
+    for sqlalchemy) so the report names the dependencies worth deferring
+'''
+
+
+def parse_importtime(stderr):
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+
+    return packages
+
+
+def measure(project, env=None):
+    imports, factory = ENTRY_POINTS[project]
+    environ = dict(os.environ, DATABASE_URL='sqlite://')
+    environ.update(env or {})
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         SNIPPET.format(imports=imports, factory=factory)],
+        cwd=PROJECTS[project], env=environ,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError('{} failed to start:\n{}'.format(
+            project, process.stderr[-2000:]))
+
+    timings = json.loads(process.stdout.splitlines()[-1])
+    timings['imports'] = parse_importtime(process.stderr)
+    return timings
+
+
+def run(project, repeat, top=10):
+    samples = [measure(project) for _ in range(repeat)]
+    import_ms = statistics.median(sample['import_ms'] for sample in samples)
+    factory_ms = statistics.median(sample['factory_ms'] for sample in samples)
+
+    modules = {}
+    for sample in samples:
+        for name, ms in sample['imports'].items():
+            modules.setdefault(name, []).append(ms)
+    slowest = sorted(((name, round(statistics.median(values), 2))
+                      for name, values in modules.items()),
+                     key=lambda item: -item[1])[:top]
+
+    return {
+        'import_ms': round(import_ms, 2),
+        'factory_ms': round(factory_ms, 2),
+        'startup_ms': round(import_ms + factory_ms, 2),
+        'slowest_imports': slowest,
+    }
+
+
+def compare(baseline, report, max_regression):
+    regressions = []
+    print('{:<14} {:>12} {:>12} {:>9}'.format('project', 'old ms', 'new ms',
+                                              'delta'))
+    for project, result in report['projects'].items():
+        before = baseline['projects'].get(project)
+        if before is None:
+            continue
+        print('{:<14} {:>12} {:>12} {:>9}'.format(
+            project, before['startup_ms'], result['startup_ms'],
+            percent(before['startup_ms'], result['startup_ms'])))
+        if result['startup_ms'] > before['startup_ms'] * (1 + max_regression):
+            regressions.append(project)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup benchmark')
+    parser.add_argument('projects', nargs='*', choices=sorted(ENTRY_POINTS),
+                        default=sorted(ENTRY_POINTS))
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('--baseline', help='a previous startup.json report')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed slowdown, 0.2 is 20%%')
+    parser.add_argument('--output', default=RESULTS)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    report = {'repeat': args.repeat, 'projects': {}}
+    for project in args.projects:
+        result = run(project, args.repeat)
+        report['projects'][project] = result
+        print('{:<14} import {:>8.1f} ms  factory {:>7.1f} ms  slowest: {}'
+              .format(project, result['import_ms'], result['factory_ms'],
+                      ', '.join('{} {:.0f}ms'.format(name, ms) for name, ms
+                                in result['slowest_imports'][:3])))
+
+    print('report written to {}'.format(
+        write_report(report, 'startup.json', args.output)))
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.max_regression)
+        if regressions:
+            raise SystemExit('startup regression: {}'.format(
+                ', '.join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# --------------------------------------------------------------------------- #
+# Statement cache benchmark
+# Python side cost per request of the hottest queries, built on every call
+# (Query construction + SQL compilation) versus baked (statements.py):
+# trivia /questions, capstone /movies and fyyur /venues. The rows are seeded
+# into a small SQLite database so the time left is mostly Python, for fyyur
+# the original query per city and count per venue is measured as well
+#
+# usage: python -m benchmarks.statements trivia|capstone|fyyur [-n 2000]
+#            [--rows 1000]
+# --------------------------------------------------------------------------- #
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.datagen import populate
+from benchmarks.projects import use_project
+
+
+def measure(app, function, iterations):
+    with app.app_context():
+        function()  # warm up the pool, the mappers and the bakery
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        elapsed = time.perf_counter() - start
+
+    return elapsed / iterations * 1e6
+
+
+def trivia_cases(url):
+    from flaskr import create_app, QUESTIONS_PER_PAGE
+    from models import Question, question_columns
+    from statements import questions_page
+
+    def built():
+        return Question.query.with_entities(*question_columns) \
+                             .order_by(Question.id) \
+                             .paginate(page=2, per_page=QUESTIONS_PER_PAGE)
+
+    return create_app({'SQLALCHEMY_DATABASE_URI': url}), {
+        'built': built,
+        'baked': lambda: questions_page(2, QUESTIONS_PER_PAGE),
+    }
+
+
+def capstone_cases(url):
+    from app import create_app
+    from config import db
+    from models import Actor, Movie, Cast
+    from projections import paginate_movies, movies_long, MOVIES_PER_PAGE, \
+        MovieRow, ActorRow, movie_short, actor_short
+
+    def built():
+        movies = Movie.query.with_entities(Movie.id, Movie.title,
+                                           Movie.release_date) \
+                            .order_by(Movie.id) \
+                            .paginate(page=2, per_page=MOVIES_PER_PAGE)
+        rows = [MovieRow._make(row) for row in movies.items]
+        actors = {row.id: [] for row in rows}
+        casts = db.session.query(Cast.movie_id, Actor.id, Actor.name,
+                                 Actor.gender) \
+                          .join(Actor, Cast.actor_id == Actor.id) \
+                          .filter(Cast.movie_id.in_(list(actors))) \
+                          .order_by(Cast.id)
+        for movie_id, *actor in casts:
+            actors[movie_id].append(actor_short(ActorRow._make(actor)))
+        return [dict(movie_short(row), actors=actors[row.id]) for row in rows]
+
+    def baked():
+        return movies_long(paginate_movies(2, MOVIES_PER_PAGE).items)
+
+    return create_app({'SQLALCHEMY_DATABASE_URI': url}), {
+        'built': built,
+        'baked': baked,
+    }
+
+
+def fyyur_cases(url):
+    from datetime import datetime
+    from sqlalchemy import and_, func
+    from app import create_app
+    from models import db, Venue, Show
+    from statements import venue_areas
+
+    def per_venue():
+        now = datetime.now()
+        areas = db.session.query(Venue.city, Venue.state) \
+                          .group_by(Venue.city, Venue.state).all()
+        for city, state in areas:
+            for venue in Venue.query.filter_by(city=city, state=state).all():
+                venue.artists.filter(Show.start_time > now).count()
+
+    def built():
+        return db.session.query(Venue.city, Venue.state, Venue.id,
+                                Venue.name, func.count(Show.id)) \
+            .outerjoin(Show, and_(Show.venue_id == Venue.id,
+                                  Show.start_time > datetime.now())) \
+            .group_by(Venue.id, Venue.city, Venue.state, Venue.name) \
+            .order_by(Venue.state, Venue.city, Venue.id).all()
+
+    return create_app({'SQLALCHEMY_DATABASE_URI': url}), {
+        'per venue': per_venue,
+        'built': built,
+        'baked': lambda: venue_areas(datetime.now()),
+    }
+
+
+CASES = {
+    'trivia': trivia_cases,
+    'capstone': capstone_cases,
+    'fyyur': fyyur_cases,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statement cache benchmark')
+    parser.add_argument('project', choices=sorted(CASES))
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='statements-')
+    url = 'sqlite:///' + os.path.join(directory, args.project + '.db')
+    os.environ['DATABASE_URL'] = url
+    try:
+        use_project(args.project)
+        populate(args.project, url, args.rows)
+        app, cases = CASES[args.project](url)
+
+        print('{} ({} rows, {} iterations)'.format(
+            args.project, args.rows, args.iterations))
+        timings = {}
+        for name, function in cases.items():
+            timings[name] = measure(app, function, args.iterations)
+            print('  {:<10} {:10.1f} us/request'.format(name, timings[name]))
+        print('  saving: {:.1f} us/request ({:.2f}x)'.format(
+            timings['built'] - timings['baked'],
+            timings['built'] / timings['baked']))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# --------------------------------------------------------------------------- #
+# Local JWTs
+# a stand-in for Auth0: an RSA key is generated, its public part is written as
+# a JWKS file (served to the apps with AUTH0_JWKS_URL=file://...) and the
+# tokens are signed with the private part, the same claims Auth0 issues
+# --------------------------------------------------------------------------- #
+import base64
+import json
+import os
+import time
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+DOMAIN = 'benchmarks.local'
+KID = 'benchmarks'
+
+PERMISSIONS = {
+    'coffee-shop': ['get:drinks-detail', 'post:drinks', 'patch:drinks',
+                    'delete:drinks'],
+    'capstone': ['get:actors', 'create:actors', 'update:actors',
+                 'delete:actors', 'get:movies', 'create:movies',
+                 'update:movies', 'delete:movies'],
+}
+
+AUDIENCES = {
+    'coffee-shop': 'coffee',
+    'capstone': 'agency',
+}
+
+
+def _b64_int(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class LocalIssuer:
+    def __init__(self, directory, bits=2048):
+        self.key = RSA.generate(bits)
+        self.private_pem = self.key.export_key('PEM').decode('ascii')
+        self.jwks_path = os.path.join(directory, 'jwks.json')
+
+        with open(self.jwks_path, 'w') as jwks:
+            json.dump({'keys': [{
+                'kty': 'RSA',
+                'kid': KID,
+                'use': 'sig',
+                'alg': 'RS256',
+                'n': _b64_int(self.key.n),
+                'e': _b64_int(self.key.e),
+            }]}, jwks)
+
+    def environ(self, project):
+        return {
+            'AUTH0_DOMAIN': DOMAIN,
+            'AUTH0_AUDIENCE': AUDIENCES[project],
+            'AUTH0_JWKS_URL': 'file://' + os.path.abspath(self.jwks_path),
+        }
+
+    def token(self, project, permissions=None, ttl=3600):
+        now = int(time.time())
+        claims = {
+            'iss': 'https://{}/'.format(DOMAIN),
+            'sub': 'benchmarks|local',
+            'aud': AUDIENCES[project],
+            'iat': now,
+            'exp': now + ttl,
+            'permissions': PERMISSIONS[project]
+            if permissions is None else permissions,
+        }
+        return jwt.encode(claims, self.private_pem, algorithm='RS256',
+                          headers={'kid': KID})
@@ -0,0 +1,63 @@
+# --------------------------------------------------------------------------- #
+# Trivia sync vs async benchmark
+# starts the WSGI app under gunicorn sync workers and the ASGI app
+# (flaskr.asgi) under uvicorn with the same number of workers, then drives
+# both with the same route mix at 500 concurrent clients
+#
+# usage: python -m benchmarks.trivia_async [-c 500] [-d 30] [-w 4]
+# --------------------------------------------------------------------------- #
+import argparse
+import json
+
+from benchmarks import loadgen
+from benchmarks.projects import PROJECTS
+from benchmarks.servers import free_port, serve
+
+ROUTES = [
+    loadgen.request('GET', '/categories'),
+    loadgen.request('GET', '/questions?page=1'),
+    loadgen.request('GET', '/questions?page=2'),
+    loadgen.request('GET', '/categories/1/questions'),
+    loadgen.request('POST', '/questions', json_body={'searchTerm': 'title'}),
+    loadgen.request('POST', '/quizzes', json_body={'previous_questions': []}),
+]
+
+
+def deployments(workers):
+    port = free_port()
+    yield 'gunicorn sync x{}'.format(workers), port, [
+        'gunicorn', '--workers', str(workers), '--bind',
+        '127.0.0.1:{}'.format(port), 'flaskr:create_app()']
+
+    port = free_port()
+    yield 'uvicorn asgi x{}'.format(workers), port, [
+        'uvicorn', 'flaskr.asgi:app', '--workers', str(workers),
+        '--port', str(port), '--no-access-log']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trivia sync vs async')
+    parser.add_argument('-c', '--concurrency', type=int, default=500)
+    parser.add_argument('-d', '--duration', type=float, default=30.0)
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('--json', action='store_true',
+                        help='print the summaries as JSON')
+    args = parser.parse_args()
+
+    summaries = []
+    for name, port, command in deployments(args.workers):
+        with serve(command, PROJECTS['trivia'], port) as url:
+            # warm up the workers and their connection pools
+            loadgen.run(url, ROUTES, concurrency=args.workers * 2, duration=2)
+            stats = loadgen.run(url, ROUTES, concurrency=args.concurrency,
+                                duration=args.duration, name=name)
+        summaries.append(stats.summary())
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print(loadgen.format_table(summaries))
+
+
+if __name__ == '__main__':
+    main()